@@ -0,0 +1,215 @@
+# analytics.py
+#
+# Builds the typed, column-oriented listing table and a per-district market report, without the
+# network. Sources: the raw page archive (default), the raw columns saved by an earlier build, or
+# normalised records (scraped_data.jsonl, scraped_data.json):
+#   python analytics.py --workers 8
+#   python analytics.py --source records --records scraped_data.jsonl --parquet listings.parquet
+
+import argparse
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from columnar import ColumnTable, RawColumns, table_from_records
+from config import (ARCHIVE_DIR, FIELDS_TO_FETCH, EXPOSE_READY_SELECTOR, SEARCH_CONFIGS, COLUMNAR_RAW_PATH,
+                    COLUMNAR_TABLE_PATH, MARKET_REPORT_PATH, COLUMNAR_BATCH_SIZE, MIN_DISTRICT_LISTINGS,
+                    JSONL_OUTPUT_PATH)
+from discovery import equipment_info
+from extraction import expose_id_from_url
+from page_archive import PageArchive, load_object
+from reextract import load_equipment_flags
+from static_html import parse_html, extract_raw_fields_html, classify_html
+
+
+def raw_fields_page(job):
+    url, sha256, archive_root = job
+    root = parse_html(load_object(archive_root, sha256))
+    if classify_html(url, root, EXPOSE_READY_SELECTOR).verdict != "normal":
+        return url, None
+    return url, extract_raw_fields_html(root, FIELDS_TO_FETCH)["texts"]
+
+
+def raw_from_archive(archive_root, workers):
+    archive = PageArchive(archive_root)
+    jobs = [(url, sha256, archive_root) for url, sha256, _ in archive.latest('expose')]
+    archive.close()
+    print(f"Reading the raw fields of {len(jobs)} archived exposés with {workers} workers...")
+    flags = load_equipment_flags()
+    raw = RawColumns()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for url, texts in executor.map(raw_fields_page, jobs, chunksize=64):
+            if texts is None:
+                continue
+            info = flags.get(expose_id_from_url(url), {})
+            raw.append(url, texts, info.get("parking"), info.get("balcony"))
+    return raw
+
+
+def normalise_raw(raw, batch_size):
+    table = ColumnTable()
+    for batch in raw.batches(batch_size):
+        table.extend(batch.normalise())
+    return table
+
+
+def read_records(path):
+    # JSONL is streamed line by line; the JSON array export has to be loaded whole
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def record_key(record, position):
+    url = record.get("url")
+    return expose_id_from_url(url) if url else position
+
+
+def latest_positions(paths):
+    # Position of the last record per exposé. Later lines of an append-only file are newer, and so are
+    # later files; only the IDs are held in memory.
+    latest = {}
+    for path_index, path in enumerate(paths):
+        for record_index, record in enumerate(read_records(path)):
+            latest[record_key(record, (path_index, record_index))] = (path_index, record_index)
+    return set(latest.values())
+
+
+def table_from_files(paths, batch_size):
+    # A listing that was written more than once counts once, with its latest values
+    keep = latest_positions(paths)
+    table = ColumnTable()
+    batch = []
+    skipped = 0
+    for path_index, path in enumerate(paths):
+        for record_index, record in enumerate(read_records(path)):
+            if (path_index, record_index) not in keep:
+                skipped += 1
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                table.extend(table_from_records(batch))
+                batch = []
+    table.extend(table_from_records(batch))
+    if skipped:
+        print(f"Left out {skipped} older copies of listings that appear more than once.")
+    return table
+
+
+def finite(values):
+    return [value for value in values if value == value]
+
+
+def rounded(function, values):
+    return round(function(values), 2) if values else None
+
+
+def summarise(table, indices):
+    price_per_sqm = finite(table["price_per_sqm"][index] for index in indices)
+    total_per_sqm = finite(table["total_rent_per_sqm"][index] for index in indices)
+    ratios = finite(table["warm_cold_ratio"][index] for index in indices)
+    total_rent = finite(table["total_rent"][index] for index in indices)
+    sizes = finite(table["size"][index] for index in indices)
+
+    return {
+        "listings": len(indices),
+        "median_price_per_sqm": rounded(statistics.median, price_per_sqm),
+        "mean_price_per_sqm": rounded(statistics.fmean, price_per_sqm),
+        "median_total_rent_per_sqm": rounded(statistics.median, total_per_sqm),
+        "mean_warm_cold_ratio": rounded(statistics.fmean, ratios),
+        "median_total_rent": rounded(statistics.median, total_rent),
+        "median_size": rounded(statistics.median, sizes),
+    }
+
+
+def matches_equipment(table, index, required):
+    # A listing belongs to a search configuration if it has every equipment flag the search filters on
+    return all(table[flag][index] == 1 for flag, wanted in required.items() if wanted)
+
+
+def config_label(config):
+    wanted = [flag for flag, value in equipment_info(config).items() if value]
+    return ",".join(wanted) if wanted else "all"
+
+
+def market_report(table, configs=SEARCH_CONFIGS, min_listings=MIN_DISTRICT_LISTINGS):
+    by_district = {}
+    for index, district in enumerate(table["district"]):
+        by_district.setdefault(district or "unknown", []).append(index)
+
+    report = {"listings": len(table), "overall": summarise(table, range(len(table))), "configs": {}}
+    for config in configs:
+        required = equipment_info(config)
+        matching = {index for index in range(len(table)) if matches_equipment(table, index, required)}
+        districts = {}
+        for district, indices in sorted(by_district.items()):
+            selected = [index for index in indices if index in matching]
+            if len(selected) >= min_listings:
+                districts[district] = summarise(table, selected)
+        report["configs"][config_label(config)] = {"search": config, "listings": len(matching),
+                                                   "districts": districts}
+    return report
+
+
+def print_report(report):
+    overall = report["overall"]
+    print(f"{report['listings']} listings; median {overall['median_price_per_sqm']} EUR/m² cold, "
+          f"{overall['median_total_rent_per_sqm']} EUR/m² warm, warm/cold ratio {overall['mean_warm_cold_ratio']}")
+    for label, config in report["configs"].items():
+        print(f"\n{label} ({config['listings']} listings):")
+        for district, summary in sorted(config["districts"].items(),
+                                        key=lambda item: -(item[1]["median_price_per_sqm"] or 0)):
+            print(f"  {district}: {summary['listings']} listings, median {summary['median_price_per_sqm']} EUR/m² "
+                  f"cold, {summary['median_total_rent']} EUR warm")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar listing table and the market report.")
+    parser.add_argument('--source', choices=["archive", "raw", "records", "table"], default="archive",
+                        help="archive: raw page archive; raw: saved raw columns; records: normalised JSON/JSONL "
+                             "records; table: an existing listing table")
+    parser.add_argument('--archive', default=ARCHIVE_DIR, help="archive directory")
+    parser.add_argument('--records', nargs='+', default=[JSONL_OUTPUT_PATH], help="record files for --source records")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument('--batch-size', type=int, default=COLUMNAR_BATCH_SIZE, help="rows normalised per batch")
+    parser.add_argument('--raw', default=COLUMNAR_RAW_PATH, help="raw column file")
+    parser.add_argument('--table', default=COLUMNAR_TABLE_PATH, help="listing table file")
+    parser.add_argument('--parquet', default=None, help="also export the table as Parquet (needs pyarrow)")
+    parser.add_argument('--report', default=MARKET_REPORT_PATH, help="JSON file for the market report")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.source == "archive":
+        raw = raw_from_archive(args.archive, args.workers)
+        raw.save(args.raw)
+        print(f"Saved the raw columns of {len(raw)} exposés to '{args.raw}'")
+        table = normalise_raw(raw, args.batch_size)
+    elif args.source == "raw":
+        table = normalise_raw(RawColumns.load(args.raw), args.batch_size)
+    elif args.source == "records":
+        table = table_from_files(args.records, args.batch_size)
+    else:
+        table = ColumnTable.load(args.table)
+
+    if args.source != "table":
+        table.save(args.table)
+        print(f"Saved {len(table)} listings to '{args.table}' in {time.perf_counter() - started:.1f}s")
+    if args.parquet:
+        table.write_parquet(args.parquet)
+        print(f"Exported the table to '{args.parquet}'")
+
+    report = market_report(table)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_report(report)
+    print(f"\nMarket report saved to '{args.report}'")
+
+
+if __name__ == "__main__":
+    main()
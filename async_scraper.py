@@ -0,0 +1,534 @@
+# async_scraper.py
+
+import asyncio
+import contextlib
+import threading
+import time
+from urllib.parse import urlparse
+
+from playwright.async_api import async_playwright
+
+from config import (FIELDS_TO_FETCH, SCRAPE_CONCURRENCY, EXPOSE_READY_SELECTOR,
+                    CARD_FIELDS_TO_FETCH, LIMIT_INT, SEARCH_CONFIGS, SEARCH_READY_SELECTOR,
+                    SEARCH_PAGE_CONCURRENCY, RESULT_COUNT_SELECTOR, MAX_SEARCH_PAGE_FAILURES, DERIVE_EQUIPMENT_FLAGS,
+                    HEADLESS_WORKERS, ARCHIVE_PAGES, MEMORY_SAMPLE_INTERVAL, CAPTCHA_MODE, CAPTCHA_MAX_ATTEMPTS,
+                    MAX_RETRIES)
+from discovery import (SEARCH_META_JS, EXTRACT_CARDS_JS, links_from_cards, card_expose_ids, search_page_url, equipment_info, pages_to_fetch, plan_search_configs,
+                       merge_link_info, derive_equipment_flags)
+from extraction import EXTRACT_FIELDS_JS, normalise_listing
+from navigation import navigate_async, wait_for_solution_async
+from page_state import page_state_classifier
+from session_pool import SessionPool, load_storage_state
+from http_fetcher import fast_path
+from page_archive import page_archive
+from network_routes import install_network_routes_async, fast_path_active
+from metrics import run_metrics
+from memory_watchdog import browser_governor
+from captcha_queue import captcha_queue, CaptchaChallenge, POLL_SECONDS
+from rate_control import rate_controller, circuit_breaker, retry_delay, BLOCK_OUTCOMES
+
+
+class SlotAttempt:
+    # Outcome of the work done inside a HostLimiter slot; callers mark pages that came back blocked
+    def __init__(self):
+        self.outcome = "ok"
+
+
+class HostLimiter:
+    # Caps in-flight navigations per host and spaces their start times. Both limits come from the
+    # adaptive rate controller, which learns from the outcome and latency of every slot; the outcome
+    # also feeds the circuit breaker of breaker_key.
+    def __init__(self, controller=rate_controller, breaker=circuit_breaker):
+        self.controller = controller
+        self.breaker = breaker
+        self._conditions = {}
+        self._in_flight = {}
+        self._locks = {}
+        self._next_slot = {}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, url, breaker_key=None):
+        host = urlparse(url).netloc
+        condition = self._conditions.setdefault(host, asyncio.Condition())
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight.get(host, 0) < self.controller.concurrency_limit)
+            self._in_flight[host] = self._in_flight.get(host, 0) + 1
+        try:
+            async with lock:
+                now = asyncio.get_running_loop().time()
+                start = max(now, self._next_slot.get(host, now))
+                self._next_slot[host] = start + self.controller.interval
+            if start > now:
+                await asyncio.sleep(start - now)
+
+            attempt = SlotAttempt()
+            started = time.perf_counter()
+            try:
+                yield attempt
+            except (CaptchaChallenge, HeadfulRequired):
+                attempt.outcome = "captcha"
+                raise
+            except asyncio.CancelledError:
+                attempt.outcome = None
+                raise
+            except Exception:
+                if attempt.outcome == "ok":
+                    attempt.outcome = "error"
+                raise
+            finally:
+                if attempt.outcome:
+                    self.controller.record((time.perf_counter() - started) * 1000, attempt.outcome)
+                    if breaker_key is not None:
+                        self.breaker.record(breaker_key, attempt.outcome)
+        finally:
+            async with condition:
+                self._in_flight[host] -= 1
+                condition.notify_all()
+
+
+class OrderedCollector:
+    # Accepts results in completion order and releases them in input order. Records are
+    # only kept in memory when there is no on_record callback to stream them to.
+    def __init__(self, on_record=None):
+        self.on_record = on_record
+        self.records = []
+        self._pending = {}
+        self._next_index = 0
+
+    def add(self, index, record):
+        self._pending[index] = record
+        while self._next_index in self._pending:
+            record = self._pending.pop(self._next_index)
+            self._next_index += 1
+            if record is None:
+                continue
+            if self.on_record:
+                with run_metrics.span("output"):
+                    self.on_record(record)
+            else:
+                self.records.append(record)
+
+
+class HeadfulRequired(Exception):
+    # Raised when a headless session hits a CAPTCHA that only a human in the headful browser can solve
+    pass
+
+
+async def scrape_listing_async(session, url, captcha_lock):
+    if fast_path_active():
+        # The blocking HTTP fetch and parse run in a thread so the other workers keep going
+        handled, data = await asyncio.to_thread(fast_path.scrape_listing, url)
+        if handled:
+            return data
+
+    page = session.page
+    ready = await navigate_async(page, url, EXPOSE_READY_SELECTOR)
+
+    if not ready:
+        state = await page_state_classifier.classify_async(page, EXPOSE_READY_SELECTOR)
+        if state.verdict in ("captcha", "blocked"):
+            # Either way this context is burnt and gets rotated once the listing is done
+            session.blocked = True
+        if state.verdict == "captcha":
+            if CAPTCHA_MODE == "park":
+                raise CaptchaChallenge(url)
+            if session.headless:
+                raise HeadfulRequired(url)
+            # Only one prompt at a time; the other workers keep going meanwhile
+            async with captcha_lock:
+                print(f"CAPTCHA detected on {url}. Please solve the CAPTCHA manually.")
+                await asyncio.to_thread(input, "Press Enter when you've solved the CAPTCHA...")
+            session.blocked = False
+            ready = await navigate_async(page, url, EXPOSE_READY_SELECTOR, reload=True)
+        elif state.verdict in ("blocked", "error"):
+            print(f"Page {url} is in state '{state.verdict}' ({state.title}).")
+
+    if not ready:
+        print(f"Timeout while waiting for {EXPOSE_READY_SELECTOR} on {url}. The page might not have loaded correctly.")
+        return None
+
+    if ARCHIVE_PAGES:
+        page_archive.store(url, await page.content(), 'expose')
+
+    with run_metrics.span("extraction"):
+        raw = await page.evaluate(EXTRACT_FIELDS_JS, FIELDS_TO_FETCH)
+    with run_metrics.span("parsing"):
+        return normalise_listing(url, raw)
+
+
+def requeue(queue, item):
+    # Puts a listing back that was held out of the queue without being marked done
+    queue.put_nowait(item)
+    queue.task_done()
+
+
+async def scrape_worker(session, pool, queue, collector, limiter, captcha_lock, store=None):
+    while True:
+        cooldown = captcha_queue.cooldown_remaining(session)
+        if cooldown:
+            await asyncio.sleep(cooldown)
+        await circuit_breaker.wait_async(session.name)
+        index, link, info, needs_headful, retry = await queue.get()
+        if needs_headful and session.headless:
+            # Leave it for a headful session
+            queue.put_nowait((index, link, info, needs_headful, retry))
+            queue.task_done()
+            await asyncio.sleep(0.5)
+            continue
+
+        data = None
+        try:
+            async with limiter.slot(link, session.name) as attempt:
+                data = await scrape_listing_async(session, link, captcha_lock)
+                if session.blocked:
+                    attempt.outcome = "blocked"
+            if data:
+                # Add parking and balcony info to the scraped data
+                data['parking'] = info['parking']
+                data['balcony'] = info['balcony']
+                if store:
+                    store.mark_scraped(link, data)
+                run_metrics.count("listings_scraped")
+                print(f"Scraped {link}: {data.get('title')} ({data.get('total_rent')} EUR warm)")
+            else:
+                if store:
+                    store.mark_skipped(link)
+                run_metrics.count("listings_skipped")
+                print(f"Skipped or failed to scrape data for {link}")
+        except CaptchaChallenge:
+            # The session cools down in a fresh context while the listing waits for its retry.
+            # A parked listing stays unfinished in the queue until requeue_parked puts it back.
+            captcha_queue.cool_down(session)
+            await pool.release(session)
+            if captcha_queue.park(link, (index, link, info)) is None:
+                run_metrics.count("listings_failed")
+                if store:
+                    store.mark_failed(link, "captcha")
+                collector.add(index, None)
+                queue.task_done()
+            continue
+        except HeadfulRequired:
+            await pool.release(session)
+            if pool.has_headful():
+                print(f"CAPTCHA on a headless session for {link}. Handing it to the headful browser.")
+                queue.put_nowait((index, link, info, True, retry))
+                queue.task_done()
+                continue
+            print(f"CAPTCHA on {link} and no headful session to solve it.")
+            run_metrics.count("listings_failed")
+            if store:
+                store.mark_failed(link, "captcha")
+            collector.add(index, None)
+            queue.task_done()
+            continue
+        except Exception as e:
+            print(f"An unexpected error occurred while scraping {link}: {e}")
+            screenshot = f'error_screenshot_{link.split("/")[-1]}.png'
+            try:
+                await session.page.screenshot(path=screenshot)
+                print(f"Screenshot saved as '{screenshot}'")
+            except Exception:
+                pass
+            await pool.replace_page(session)
+            if retry < MAX_RETRIES:
+                # Held out of the queue, still unfinished, until its backoff has passed
+                delay = retry_delay(retry + 1)
+                run_metrics.count("retries")
+                print(f"Retrying {link} in {delay:.1f} s (retry {retry + 1}/{MAX_RETRIES}).")
+                asyncio.get_running_loop().call_later(delay, requeue, queue, (index, link, info, False, retry + 1))
+                await pool.release(session)
+                continue
+            run_metrics.count("listings_failed")
+            if store:
+                store.mark_failed(link, e)
+
+        collector.add(index, data)
+        if MEMORY_SAMPLE_INTERVAL and (session.pages_served + 1) % MEMORY_SAMPLE_INTERVAL == 0:
+            await browser_governor.measure_async(session.page, session.browser)
+            if browser_governor.verdict():
+                # Past either limit: the pool does not restart browsers, a fresh context releases most of it
+                session.over_memory = True
+                browser_governor.memory_mb = None
+        await pool.release(session)
+        queue.task_done()
+
+
+async def requeue_parked(queue):
+    while True:
+        for entry in captcha_queue.pop_due():
+            index, link, info = entry.payload
+            requeue(queue, (index, link, info, False, 0))
+        await asyncio.sleep(min(POLL_SECONDS, captcha_queue.next_due_in()) or POLL_SECONDS)
+
+
+async def scrape_data_stage_async(pool, links_with_info, on_record=None, store=None):
+    queue = asyncio.Queue()
+    seen_links = set()
+    index = 0
+    for link, info in links_with_info:
+        if link in seen_links:
+            print(f"Duplicate link detected: {link}")
+            continue
+        seen_links.add(link)
+        queue.put_nowait((index, link, info, False, 0))
+        index += 1
+
+    collector = OrderedCollector(on_record)
+    limiter = HostLimiter()
+    captcha_lock = asyncio.Lock()
+    workers = [
+        asyncio.create_task(scrape_worker(session, pool, queue, collector, limiter, captcha_lock, store))
+        for session in pool.sessions
+    ]
+    workers.append(asyncio.create_task(requeue_parked(queue)))
+    join = asyncio.create_task(queue.join())
+    try:
+        # Workers loop forever; the stage is done once every queued listing has been handled.
+        # A worker only finishes early if it crashed, and then its error is raised here.
+        done, _ = await asyncio.wait([join] + workers, return_when=asyncio.FIRST_COMPLETED)
+        if join not in done:
+            for worker in done:
+                worker.result()
+    finally:
+        join.cancel()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    return collector.records
+
+
+async def extract_links_async(page, has_parking, has_balcony):
+    # Same as main.extract_links
+    cards = await page.evaluate(EXTRACT_CARDS_JS, CARD_FIELDS_TO_FETCH)
+    return links_from_cards(cards, has_parking, has_balcony), card_expose_ids(cards)
+
+
+async def load_search_page_async(page, page_url, page_number, captcha_lock):
+    ready = await navigate_async(page, page_url, SEARCH_READY_SELECTOR)
+
+    if not ready:
+        state = await page_state_classifier.classify_async(page, SEARCH_READY_SELECTOR)
+        if state.verdict == "captcha" and CAPTCHA_MODE == "park":
+            ready = await wait_out_search_captcha_async(page, page_url)
+        elif state.verdict == "captcha":
+            async with captcha_lock:
+                print(f"CAPTCHA detected on search page {page_number}. Please solve the CAPTCHA manually.")
+                await asyncio.to_thread(input, "Press Enter when you've solved the CAPTCHA...")
+            ready = await navigate_async(page, page_url, SEARCH_READY_SELECTOR, reload=True)
+        elif state.verdict in ("blocked", "error"):
+            raise Exception(f"Search page {page_number} is in state '{state.verdict}' ({state.title})")
+
+    if not ready:
+        raise Exception(f"No search result articles appeared on {page_url}")
+
+    if ARCHIVE_PAGES:
+        page_archive.store(page_url, await page.content(), 'search')
+
+
+async def page_outcome_async(page, ready_selector):
+    # Same as main.page_outcome
+    try:
+        verdict = (await page_state_classifier.classify_async(page, ready_selector)).verdict
+    except Exception:
+        return "error"
+    return verdict if verdict in BLOCK_OUTCOMES else "error"
+
+
+async def wait_out_search_captcha_async(page, page_url):
+    # Same as main.wait_out_search_captcha; the other result pages keep loading meanwhile
+    for attempt in range(1, CAPTCHA_MAX_ATTEMPTS + 1):
+        captcha_queue.notify(page_url, attempt, captcha_queue.cooldown, True)
+        if await wait_for_solution_async(page, SEARCH_READY_SELECTOR, captcha_queue.cooldown):
+            run_metrics.count("captchas_solved")
+            return True
+        if await navigate_async(page, page_url, SEARCH_READY_SELECTOR, reload=True):
+            return True
+        if not (await page_state_classifier.classify_async(page, SEARCH_READY_SELECTOR)).captcha:
+            return False
+    return False
+
+
+async def fetch_search_page(page, base_url, page_number, limiter, captcha_lock):
+    info = equipment_info(base_url)
+    page_url = search_page_url(base_url, page_number)
+    for retry in range(MAX_RETRIES + 1):
+        if retry:
+            delay = retry_delay(retry)
+            run_metrics.count("retries")
+            print(f"Retrying page {page_number} in {delay:.1f} s (retry {retry}/{MAX_RETRIES}).")
+            await asyncio.sleep(delay)
+        await circuit_breaker.wait_async(base_url)
+        print(f"Navigating to page {page_number}: {page_url}")
+        try:
+            async with limiter.slot(page_url, base_url) as attempt:
+                with run_metrics.span("search_page", base_url):
+                    try:
+                        await load_search_page_async(page, page_url, page_number, captcha_lock)
+                    except Exception:
+                        attempt.outcome = await page_outcome_async(page, SEARCH_READY_SELECTOR)
+                        raise
+            break
+        except Exception as e:
+            if retry == MAX_RETRIES:
+                raise
+            print(f"An error occurred on page {page_number}: {e}")
+    with run_metrics.span("card_extraction", base_url):
+        links, page_ids = await extract_links_async(page, info['parking'], info['balcony'])
+    run_metrics.count("cards_found", len(links), base_url)
+    return links, page_ids
+
+
+async def extract_links_for_config_async(pages, base_url, limiter, captcha_lock, limit=LIMIT_INT):
+    # The first page that loads tells how many pages there are; the rest is fetched in windows of len(pages)
+    all_links = {}
+    seen_ids = set()
+    failures = 0
+
+    def add_links(result, page_number):
+        # Filtered cards count too: a page whose cards all fail CARD_FILTERS is not the end of the results
+        links, page_ids = result
+        new_ids = page_ids - seen_ids
+        seen_ids.update(new_ids)
+        merge_link_info(all_links, links)
+        print(f"Found {len(links)} links on page {page_number}. Total unique links: {len(all_links)}")
+        return bool(new_ids)
+
+    def page_failed(page_number, error):
+        nonlocal failures
+        failures += 1
+        run_metrics.count("search_page_failures", config=base_url)
+        print(f"An error occurred on page {page_number}: {error}")
+        if failures >= MAX_SEARCH_PAGE_FAILURES:
+            print(f"{failures} result pages failed in a row. Stopping pagination.")
+            return True
+        return False
+
+    # Like the sync loop, a failed page counts against MAX_SEARCH_PAGE_FAILURES and the next one is tried;
+    # pages are read one at a time until one loads and tells how many there are
+    next_page = 1
+    while True:
+        try:
+            first = await fetch_search_page(pages[0], base_url, next_page, limiter, captcha_lock)
+            meta = await pages[0].evaluate(SEARCH_META_JS, RESULT_COUNT_SELECTOR)
+            break
+        except Exception as e:
+            if page_failed(next_page, e):
+                return []
+            print("Attempting to proceed to the next page...")
+            next_page += 1
+    failures = 0
+    page_count = pages_to_fetch(meta)
+    print(f"Search reports {meta.get('totalHits')} hits; loading up to page {page_count or '?'}.")
+    if not add_links(first, next_page):
+        print("No new exposés on this page. Stopping pagination.")
+        return list(all_links.items())[:limit]
+
+    next_page += 1
+    while len(all_links) < limit and (page_count is None or next_page <= page_count):
+        last_page = next_page + len(pages) - 1
+        if page_count is not None:
+            last_page = min(last_page, page_count)
+        window = list(range(next_page, last_page + 1))
+        results = await asyncio.gather(
+            *(fetch_search_page(page, base_url, number, limiter, captcha_lock) for page, number in zip(pages, window)),
+            return_exceptions=True,
+        )
+
+        stop = False
+        for page_number, result in zip(window, results):
+            if isinstance(result, Exception):
+                if page_failed(page_number, result):
+                    stop = True
+                    break
+                continue
+            failures = 0
+            if not add_links(result, page_number):
+                print("No new exposés on this page. Stopping pagination.")
+                stop = True
+                break
+        if stop:
+            break
+        next_page = last_page + 1
+
+    return list(all_links.items())[:limit]
+
+
+async def discover_links_async(context, concurrency=SEARCH_PAGE_CONCURRENCY):
+    limiter = HostLimiter()
+    captcha_lock = asyncio.Lock()
+    pages = [await context.new_page() for _ in range(max(1, concurrency))]
+
+    async def collect(config):
+        print(f"\nExtracting links for configuration: {config}")
+        try:
+            links_with_info = await extract_links_for_config_async(pages, config, limiter, captcha_lock)
+            print(f"Found {len(links_with_info)} links for this configuration.")
+            return links_with_info
+        except Exception as e:
+            print(f"An error occurred while processing configuration {config}: {e}")
+            print("Proceeding to the next configuration...")
+            return []
+
+    try:
+        plan = plan_search_configs(SEARCH_CONFIGS) if DERIVE_EQUIPMENT_FLAGS else None
+        if plan:
+            broad_config, flag_configs = plan
+            broad_links = await collect(broad_config)
+            flag_links = {flag: await collect(config) for flag, config in flag_configs.items()}
+            return derive_equipment_flags(broad_links, flag_links)
+
+        all_unique_links = {}
+        for config in SEARCH_CONFIGS:
+            merge_link_info(all_unique_links, await collect(config))
+        return list(all_unique_links.items())
+    finally:
+        for page in pages:
+            await page.close()
+
+
+def run_async(coroutine):
+    # The sync Playwright driver keeps an event loop running on the calling thread, so asyncio.run would
+    # refuse to start there. The coroutine gets a thread and a loop of its own; its result or error is
+    # handed back to the caller.
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = asyncio.run(coroutine)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, name="async-stage", daemon=True)
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("result")
+
+
+async def run_concurrent_discovery(cdp_endpoint, concurrency=SEARCH_PAGE_CONCURRENCY):
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.connect_over_cdp(cdp_endpoint)
+        context = await browser.new_context(storage_state=load_storage_state())
+        await install_network_routes_async(context)
+        try:
+            return await discover_links_async(context, concurrency)
+        finally:
+            await context.close()
+
+
+async def run_concurrent_scrape(cdp_endpoint, links_with_info, concurrency=SCRAPE_CONCURRENCY, store=None,
+                                sink=None):
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.connect_over_cdp(cdp_endpoint)
+        headless_browser = await playwright.chromium.launch(headless=True) if HEADLESS_WORKERS else None
+        pool = SessionPool(load_storage_state())
+        try:
+            await pool.start(browser, headless_browser, max(1, concurrency), HEADLESS_WORKERS)
+            on_record = sink.write if sink else None
+            return await scrape_data_stage_async(pool, links_with_info, on_record, store=store)
+        finally:
+            await pool.close()
+            if headless_browser:
+                await headless_browser.close()
@@ -0,0 +1,317 @@
+# benchmark.py
+
+import argparse
+import builtins
+import json
+import math
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from playwright.sync_api import sync_playwright
+
+import network_routes
+from main import extract_links_for_config, scrape_data_stage
+from async_scraper import run_concurrent_scrape, run_async
+from captcha_queue import captcha_queue
+from rate_control import rate_controller
+from http_fetcher import fast_path
+from mock_site import MockListingSite
+from metrics import run_metrics
+from navigation import navigation_log
+from output_sinks import JsonlSink
+from page_archive import page_archive
+from config import SCRAPE_CONCURRENCY
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return round(ordered[index], 1)
+
+
+def process_tree(root_pid):
+    # The scraper plus every process below it (Playwright driver, browser, renderers), read from /proc
+    children = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        parent = int(stat.rsplit(')', 1)[1].split()[1])
+        children.setdefault(parent, []).append(int(name))
+    pids = [root_pid]
+    for pid in pids:
+        pids.extend(children.get(pid, []))
+    return pids
+
+
+def process_usage(pid):
+    # (cpu seconds, rss bytes) of one process, or None once it is gone
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    # utime and stime are fields 14 and 15 of stat, rss is field 24 (in pages)
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, int(fields[21]) * PAGE_SIZE
+
+
+class ResourceMonitor:
+    # Samples CPU time and RSS of the process tree in the background; the peak RSS is what the
+    # browser and the scraper held together at the busiest moment
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.available = os.path.isdir('/proc')
+        self.cpu = {}
+        self.peak_rss = 0
+        self.rss_samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        rss = 0
+        for pid in process_tree(os.getpid()):
+            usage = process_usage(pid)
+            if usage is None:
+                continue
+            cpu_seconds, process_rss = usage
+            # Processes that exit keep their last reading, so their CPU time is not lost
+            self.cpu[pid] = cpu_seconds
+            rss += process_rss
+        self.peak_rss = max(self.peak_rss, rss)
+        self.rss_samples.append(rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if self.available:
+            self.sample()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def cpu_seconds(self):
+        return sum(self.cpu.values())
+
+    def stop(self):
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self.sample()
+
+    def report(self, cpu_before, wall_seconds):
+        if not self.available:
+            return {"available": False}
+        cpu = self.cpu_seconds() - cpu_before
+        return {
+            "cpu_seconds": round(cpu, 2),
+            "cpu_utilisation": round(cpu / wall_seconds, 2) if wall_seconds else None,
+            "peak_rss_mb": round(self.peak_rss / 2 ** 20, 1),
+            "avg_rss_mb": round(sum(self.rss_samples) / len(self.rss_samples) / 2 ** 20, 1),
+        }
+
+
+class CountingSink:
+    def __init__(self, sink):
+        self.sink = sink
+        self.records = 0
+
+    def write(self, record):
+        self.records += 1
+        self.sink.write(record)
+
+    def close(self):
+        self.sink.close()
+
+
+def latency_report(entries, http_timings=()):
+    # Browser navigations count until the page is ready, fast-path fetches until they are parsed
+    latencies = [entry["load_ms"] + entry["ready_ms"] for entry in entries]
+    latencies += [timing["fetch_ms"] + timing["parse_ms"] for timing in http_timings]
+    return {
+        "navigations": len(entries),
+        "http_fetches": len(http_timings),
+        "not_ready": sum(1 for entry in entries if not entry["ready"]),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "max_ms": round(max(latencies), 1) if latencies else None,
+    }
+
+
+def stage_report(name, pages, started, finished, entries, monitor, cpu_before, http_timings=()):
+    wall = finished - started
+    report = {
+        "stage": name,
+        "pages": pages,
+        "wall_seconds": round(wall, 2),
+        "pages_per_second": round(pages / wall, 2) if wall else None,
+        "latency": latency_report(entries, http_timings),
+    }
+    report.update(monitor.report(cpu_before, wall))
+    return report
+
+
+def unpace(controller, concurrency):
+    # The benchmark measures the scraper, not the politeness limits: no spacing between requests, no
+    # adaptive changes, and as many navigations in flight per host as there are workers. Returns what
+    # restore_pacing needs.
+    saved = (controller.rate, controller.concurrency, controller.max_concurrency, controller.adaptive,
+             controller._next_slot)
+    controller.adaptive = False
+    controller.rate = 0
+    controller._next_slot = 0.0
+    controller.concurrency = controller.max_concurrency = max(1, concurrency)
+    return saved
+
+
+def restore_pacing(controller, saved):
+    (controller.rate, controller.concurrency, controller.max_concurrency, controller.adaptive,
+     controller._next_slot) = saved
+
+
+def pacing_report(args):
+    if not args.paced:
+        return {"paced": False}
+    # With the configured pacing, throughput cannot exceed the controller's maximum rate
+    return {"paced": True, "bound_pages_per_second": rate_controller.max_rate,
+            "concurrency_limit": rate_controller.max_concurrency}
+
+
+def run_benchmark(args):
+    site = MockListingSite(args.listings, args.per_page, args.latency_ms, args.jitter_ms, args.failure_rate,
+                           args.captcha_rate, args.consent).start()
+    # The CAPTCHA pages of the mock site clear on the next request, so parked URLs come back right
+    # away and the manual prompt of CAPTCHA_MODE "prompt" is answered automatically
+    captcha_queue.cooldown = 0
+    captcha_queue.base_backoff = 0.5
+    builtins.input = lambda prompt='': ''
+    network_routes.FAST_PATH_ENABLED = args.fast_path
+    workdir = tempfile.mkdtemp(prefix='scraper_benchmark_')
+    page_archive.root = os.path.join(workdir, 'page_archive')
+    navigation_log.entries = []
+    sink = CountingSink(JsonlSink(os.path.join(workdir, 'scraped_data.jsonl')))
+    cdp_port = free_port()
+
+    pacing = pacing_report(args)
+    saved_pacing = None if args.paced else unpace(rate_controller, args.concurrency)
+    monitor = ResourceMonitor().start()
+    stages = []
+    try:
+        with sync_playwright() as playwright:
+            browser = playwright.chromium.launch(headless=not args.headful, args=[
+                f'--remote-debugging-port={cdp_port}',
+                '--no-sandbox',
+                '--disable-setuid-sandbox'
+            ])
+            context = browser.new_context()
+            network_routes.install_network_routes(context)
+            search_page = context.new_page()
+
+            cpu_before = monitor.cpu_seconds()
+            started = time.perf_counter()
+            links = extract_links_for_config(search_page, site.search_url(), limit=args.limit)
+            finished = time.perf_counter()
+            discovery_entries = list(navigation_log.entries)
+            stages.append(stage_report("discovery", len(discovery_entries), started, finished, discovery_entries,
+                                       monitor, cpu_before))
+            search_page.close()
+
+            cpu_before = monitor.cpu_seconds()
+            started = time.perf_counter()
+            if args.concurrency > 1:
+                run_async(run_concurrent_scrape(f"http://127.0.0.1:{cdp_port}", links, args.concurrency,
+                                                sink=sink))
+            else:
+                scrape_data_stage(context, links, sink=sink)
+            finished = time.perf_counter()
+            scrape_entries = navigation_log.entries[len(discovery_entries):]
+            scrape = stage_report("scrape", len(links), started, finished, scrape_entries, monitor, cpu_before,
+                                  fast_path.timings)
+            scrape["records"] = sink.records
+            stages.append(scrape)
+
+            context.close()
+            browser.close()
+        rate_control = rate_controller.summary()
+    finally:
+        if saved_pacing:
+            restore_pacing(rate_controller, saved_pacing)
+        monitor.stop()
+        sink.close()
+        fast_path.close()
+        page_archive.close()
+        site.stop()
+
+    return {
+        "settings": {
+            "listings": args.listings,
+            "per_page": args.per_page,
+            "limit": args.limit,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "failure_rate": args.failure_rate,
+            "captcha_rate": args.captcha_rate,
+            "consent": args.consent,
+            "concurrency": args.concurrency,
+            "fast_path": args.fast_path,
+        },
+        "pacing": pacing,
+        "stages": stages,
+        "fast_path": fast_path.summary(),
+        "mock_site": site.stats(),
+        "captchas": captcha_queue.summary(),
+        "rate_control": rate_control,
+        "run_report": run_metrics.report(),
+        "peak_rss_mb": round(monitor.peak_rss / 2 ** 20, 1) if monitor.available else None,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark discovery and scraping against a local mock site.")
+    parser.add_argument('--listings', type=int, default=200, help="Listings generated by the mock site")
+    parser.add_argument('--per-page', type=int, default=20, help="Result cards per search page")
+    parser.add_argument('--limit', type=int, default=100, help="Listings discovered and scraped")
+    parser.add_argument('--latency-ms', type=float, default=50, help="Mean server latency per request")
+    parser.add_argument('--jitter-ms', type=float, default=20, help="Uniform jitter around the latency")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument('--captcha-rate', type=float, default=0.0, help="Share of pages first shown as a CAPTCHA")
+    parser.add_argument('--consent', action='store_true', help="Put a consent wall in front of the content")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help=f"Pages scraping in parallel; above 1 the async pool is used (config: {SCRAPE_CONCURRENCY})")
+    parser.add_argument('--no-fast-path', dest='fast_path', action='store_false', help="Scrape with the browser only")
+    parser.add_argument('--headful', action='store_true', help="Show the benchmark browser")
+    parser.add_argument('--paced', action='store_true',
+                        help="Keep the adaptive rate control; throughput is then bounded by MAX_RATE")
+    parser.add_argument('--output', help="Also write the JSON report to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_benchmark(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Benchmark report saved to {args.output}")
@@ -4,9 +4,17 @@ from playwright.sync_api import sync_playwright
 import json
 import os
 import atexit
+import shutil
+import time
+
+from browser_registry import BROWSER_FLAG_FILE, register_browser, unregister_browser, registry_entry, is_alive
+from config import BROWSER_COUNT
 
-BROWSER_FLAG_FILE = 'browser_running.flag'
 CDP_PORT = 9222
+# How long a closed browser gets to exit before its temporary profile is removed (seconds)
+PROFILE_RELEASE_SECONDS = 10
+# (port, browser) of every browser launched by this process
+browsers = []
 
 
 def load_cookies(context):
@@ -19,11 +27,12 @@ def load_cookies(context):
         print("No saved cookies found.")
 
 
-def launch_browser():
+def launch_browser(port=CDP_PORT):
     global playwright, browser
-    playwright = sync_playwright().start()
+    if 'playwright' not in globals():
+        playwright = sync_playwright().start()
     browser = playwright.chromium.launch(headless=False, args=[
-        f'--remote-debugging-port={CDP_PORT}',
+        f'--remote-debugging-port={port}',
         '--no-sandbox',
         '--disable-setuid-sandbox'
     ])
@@ -31,28 +40,56 @@ def launch_browser():
     load_cookies(context)
     page = context.new_page()
 
-    # Create a flag file to indicate the browser is running
-    with open(BROWSER_FLAG_FILE, 'w') as f:
-        f.write(f'running on port {CDP_PORT}')
+    if port == CDP_PORT:
+        # Create a flag file to indicate the browser is running
+        with open(BROWSER_FLAG_FILE, 'w') as f:
+            f.write(f'running on port {port}')
+    register_browser(f"http://localhost:{port}", f"browser {port - CDP_PORT + 1}")
+    browsers.append((port, browser))
 
-    print(f"Browser launched with CDP on port {CDP_PORT}. Flag file created: {BROWSER_FLAG_FILE}")
+    print(f"Browser launched with CDP on port {port} and registered.")
     return playwright, browser, context, page
 
 
+def launch_browsers(count=BROWSER_COUNT):
+    # One browser per CDP port; main.py and the distributed workers find them in the registry
+    for port in range(CDP_PORT, CDP_PORT + count):
+        launch_browser(port)
+    return browsers
+
+
 def close_browser():
-    if 'browser' in globals():
-        browser.close()
-    if 'playwright' in globals():
-        playwright.stop()
+    # Taken out of the module globals, so the atexit call after an explicit close has nothing left to stop
+    driver = globals().pop('playwright', None)
+    while browsers:
+        port, launched = browsers.pop()
+        endpoint = f"http://localhost:{port}"
+        launched.close()
+        profile_dir = registry_entry(endpoint).get("profile_dir")
+        if is_alive(endpoint):
+            # The memory watchdog of a scraper run restarted this one; close its replacement too
+            try:
+                driver.chromium.connect_over_cdp(endpoint).new_browser_cdp_session().send("Browser.close")
+            except Exception:
+                pass
+            deadline = time.time() + PROFILE_RELEASE_SECONDS
+            while is_alive(endpoint, timeout=1) and time.time() < deadline:
+                time.sleep(0.5)
+        if profile_dir:
+            # The temporary profile the watchdog started the replacement with
+            shutil.rmtree(profile_dir, ignore_errors=True)
+        unregister_browser(endpoint)
+    if driver:
+        driver.stop()
     if os.path.exists(BROWSER_FLAG_FILE):
         os.remove(BROWSER_FLAG_FILE)
     print("Browser closed and flag file removed.")
 
 
 def manage_browser():
-    global playwright, browser
-    playwright, browser, _, _ = launch_browser()
-    print(f"Browser launched with CDP enabled on port {CDP_PORT}. You can now run your main script.")
+    launch_browsers()
+    print(f"{len(browsers)} browser(s) launched with CDP enabled from port {CDP_PORT}. "
+          f"You can now run your main script.")
     print("To close the browser, enter 'q' and press Enter.")
 
     while True:
@@ -0,0 +1,94 @@
+# browser_registry.py
+
+import json
+import os
+import time
+import urllib.request
+
+from config import BROWSER_REGISTRY_PATH, REMOTE_CDP_ENDPOINTS
+
+# browser_manager writes it for its first browser, so scripts that only know the flag file keep working
+BROWSER_FLAG_FILE = 'browser_running.flag'
+
+
+def load_registry(path=BROWSER_REGISTRY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_registry(entries, path=BROWSER_REGISTRY_PATH):
+    # Written to a temporary file first so a reader never sees half a registry
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(entries, f, indent=2)
+    os.replace(temporary, path)
+
+
+def register_browser(endpoint, name=None, path=BROWSER_REGISTRY_PATH, profile_dir=None):
+    # profile_dir is the temporary profile of a browser restarted by the memory watchdog; whoever
+    # closes that browser removes it
+    entries = [entry for entry in load_registry(path) if entry['endpoint'] != endpoint]
+    entry = {
+        "name": name or endpoint,
+        "endpoint": endpoint,
+        "pid": os.getpid(),
+        "registered_at": time.time(),
+    }
+    if profile_dir:
+        entry["profile_dir"] = profile_dir
+    entries.append(entry)
+    save_registry(entries, path)
+
+
+def registry_entry(endpoint, path=BROWSER_REGISTRY_PATH):
+    return next((entry for entry in load_registry(path) if entry['endpoint'] == endpoint), {})
+
+
+def unregister_browser(endpoint, path=BROWSER_REGISTRY_PATH):
+    entries = [entry for entry in load_registry(path) if entry['endpoint'] != endpoint]
+    if entries:
+        save_registry(entries, path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def flag_file_endpoint():
+    if not os.path.exists(BROWSER_FLAG_FILE):
+        return None
+    with open(BROWSER_FLAG_FILE, 'r') as f:
+        port = f.read().strip().split()[-1]
+    return f"http://localhost:{port}"
+
+
+def is_alive(endpoint, timeout=3):
+    # Every CDP endpoint answers /json/version while its browser is up
+    try:
+        with urllib.request.urlopen(f"{endpoint.rstrip('/')}/json/version", timeout=timeout) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+
+def registered_browsers(check=True):
+    # Local browsers from browser_manager, the legacy flag file and the remote endpoints in the
+    # config, without duplicates; unreachable ones are left out when check is set
+    browsers = [{"name": entry['name'], "endpoint": entry['endpoint']} for entry in load_registry()]
+    legacy = flag_file_endpoint()
+    if legacy:
+        browsers.append({"name": "browser_manager", "endpoint": legacy})
+    for number, endpoint in enumerate(REMOTE_CDP_ENDPOINTS, 1):
+        browsers.append({"name": f"remote {number}", "endpoint": endpoint})
+
+    unique = []
+    seen = set()
+    for browser in browsers:
+        if browser['endpoint'] in seen:
+            continue
+        seen.add(browser['endpoint'])
+        if check and not is_alive(browser['endpoint']):
+            print(f"Browser '{browser['name']}' at {browser['endpoint']} is not reachable. Skipping it.")
+            continue
+        unique.append(browser)
+    return unique
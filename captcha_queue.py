@@ -0,0 +1,152 @@
+# captcha_queue.py
+
+import json
+import random
+import threading
+import time
+import urllib.request
+
+from config import (CAPTCHA_COOLDOWN_SECONDS, CAPTCHA_RETRY_BACKOFF_SECONDS, CAPTCHA_MAX_BACKOFF_SECONDS,
+                    CAPTCHA_MAX_ATTEMPTS, CAPTCHA_MAX_PARKED_TABS, CAPTCHA_NOTIFY_URL)
+from metrics import run_metrics
+
+# How often a crawl with nothing but parked URLs left checks for solved tabs and due retries (seconds)
+POLL_SECONDS = 5
+
+
+class CaptchaChallenge(Exception):
+    # Raised instead of prompting when a page shows a CAPTCHA and CAPTCHA_MODE is "park"
+    def __init__(self, url):
+        super().__init__(url)
+        self.url = url
+
+
+class ParkedUrl:
+    def __init__(self, url, payload, attempt, due_at, page=None):
+        self.url = url
+        self.payload = payload
+        self.attempt = attempt
+        self.due_at = due_at
+        # Tab left on the challenge for a human to solve, if one was kept open
+        self.page = page
+
+
+def post_event(url, event):
+    request = urllib.request.Request(url, data=json.dumps(event).encode('utf-8'),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        urllib.request.urlopen(request, timeout=10).close()
+    except Exception as e:
+        print(f"CAPTCHA notification to {url} failed: {e}")
+
+
+class CaptchaQueue:
+    # URLs that hit a CAPTCHA wait here while the crawl goes on with other URLs. Each one is
+    # retried once its backoff has passed, and given up after max_attempts CAPTCHAs.
+    def __init__(self, cooldown=CAPTCHA_COOLDOWN_SECONDS, base_backoff=CAPTCHA_RETRY_BACKOFF_SECONDS,
+                 max_backoff=CAPTCHA_MAX_BACKOFF_SECONDS, max_attempts=CAPTCHA_MAX_ATTEMPTS,
+                 max_tabs=CAPTCHA_MAX_PARKED_TABS, notify_url=CAPTCHA_NOTIFY_URL):
+        self.cooldown = cooldown
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.max_tabs = max_tabs
+        self.notify_url = notify_url
+        self.entries = []
+        self.attempts = {}
+        self.cooldowns = {}
+        self.listeners = []
+        self.parked_total = 0
+        self.solved = 0
+        self.given_up = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def backoff(self, attempt):
+        # Exponential with +-20 % jitter so parked URLs do not all come back at once
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempt - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def park(self, url, payload=None, page=None):
+        # Returns the entry, or None once the URL has used up its attempts
+        attempt = self.attempts.get(url, 0) + 1
+        self.attempts[url] = attempt
+        if attempt > self.max_attempts:
+            self.given_up += 1
+            run_metrics.count("captchas_given_up")
+            print(f"Giving up on {url} after {self.max_attempts} CAPTCHAs.")
+            return None
+        delay = self.backoff(attempt)
+        entry = ParkedUrl(url, payload, attempt, time.time() + delay, page)
+        self.entries.append(entry)
+        self.parked_total += 1
+        run_metrics.count("captchas_parked")
+        self.notify(url, attempt, delay, page is not None)
+        return entry
+
+    def can_keep_tab(self):
+        return len(self.tabs()) < self.max_tabs
+
+    def tabs(self):
+        return [entry for entry in self.entries if entry.page is not None]
+
+    def resolve(self, entry):
+        # A human got past the challenge in the parked tab
+        self.entries.remove(entry)
+        self.solved += 1
+        run_metrics.count("captchas_solved")
+
+    def pop_due(self):
+        now = time.time()
+        due = [entry for entry in self.entries if entry.due_at <= now]
+        self.entries = [entry for entry in self.entries if entry.due_at > now]
+        if due:
+            run_metrics.count("captcha_retries", len(due))
+        return due
+
+    def next_due_in(self):
+        if not self.entries:
+            return 0.0
+        return max(0.0, min(entry.due_at for entry in self.entries) - time.time())
+
+    def cool_down(self, key, seconds=None):
+        self.cooldowns[key] = time.time() + (self.cooldown if seconds is None else seconds)
+
+    def cooldown_remaining(self, key):
+        return max(0.0, self.cooldowns.get(key, 0.0) - time.time())
+
+    def add_listener(self, callback):
+        # callback(event) is called for every parked URL, e.g. to page someone
+        self.listeners.append(callback)
+
+    def notify(self, url, attempt, retry_in, tab_open):
+        hint = " Solve it in the open browser tab to finish sooner." if tab_open else ""
+        print(f"CAPTCHA on {url} (attempt {attempt}/{self.max_attempts}). "
+              f"Continuing with other URLs; retrying in {retry_in:.0f} s.{hint}")
+        event = {
+            "event": "captcha",
+            "url": url,
+            "attempt": attempt,
+            "retry_at": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(time.time() + retry_in)),
+            "tab_open": tab_open,
+            "parked": len(self.entries),
+        }
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"CAPTCHA listener failed: {e}")
+        if self.notify_url:
+            threading.Thread(target=post_event, args=(self.notify_url, event), daemon=True).start()
+
+    def summary(self):
+        return {
+            "parked_total": self.parked_total,
+            "still_parked": len(self.entries),
+            "solved_in_tab": self.solved,
+            "given_up": self.given_up,
+        }
+
+
+captcha_queue = CaptchaQueue()
@@ -0,0 +1,312 @@
+# columnar.py
+
+import gzip
+import json
+import re
+import struct
+from array import array
+
+from extraction import MONEY_FIELDS, expose_id_from_url
+
+NAN = float('nan')
+
+# First German-formatted number on each line: "1.234,50 €" -> "1.234,50". Whole columns are joined
+# with newlines and parsed in one pass, one match per line.
+NUMBER_LINES = re.compile(r'^[^\d\n]*(\d[\d.]*(?:,\d+)?)?.*$', re.M)
+# Number plus the unit that follows it, e.g. "65,5 m²"
+SIZE_LINES = re.compile(r'^[^\d\n]*(\d[\d.]*(?:,\d+)?)?[ \t]*(\S*).*$', re.M)
+# "3 von 5"; "EG" is the ground floor
+STORIES_LINES = re.compile(r'^[ \t]*(EG|-?\d+)?(?:[^\n]*?von[ \t]*(\d+))?[^\n]*$', re.M)
+POSTCODE = re.compile(r'\b(\d{5})\b')
+
+# Raw text columns as they come out of the page; the equipment flags from discovery are kept alongside
+RAW_COLUMNS = ["url", "title", "price", "size", "rooms", "stories", "address", "additional_costs",
+               "heating_expenses_excluded", "total_rent", "deposit"]
+
+# Typed columns of the normalised table: "d" float64 with NaN for missing values, "b" int8 flags with
+# -1 for unknown, "s" strings
+TABLE_COLUMNS = {
+    "url": "s",
+    "expose_id": "s",
+    "title": "s",
+    "price": "d",
+    "size": "d",
+    "size_unit": "s",
+    "rooms": "d",
+    "story": "d",
+    "total_stories": "d",
+    "address": "s",
+    "postcode": "s",
+    "district": "s",
+    "additional_costs": "d",
+    "heating_expenses_excluded": "b",
+    "heating_costs": "d",
+    "total_rent": "d",
+    "total_rent_estimated": "b",
+    "deposit": "d",
+    "parking": "b",
+    "balcony": "b",
+    "price_per_sqm": "d",
+    "total_rent_per_sqm": "d",
+    "warm_cold_ratio": "d",
+}
+
+TABLE_MAGIC = b'IS24COLS1\n'
+
+
+def empty_column(kind):
+    return [] if kind == "s" else array(kind)
+
+
+def column_lines(texts):
+    # One line per value, so a MULTILINE pattern yields exactly one match per row
+    return "\n".join((text or "").replace("\n", " ") for text in texts)
+
+
+def german_float(match):
+    return float(match.replace('.', '').replace(',', '.')) if match else NAN
+
+
+def parse_german_numbers(texts):
+    return array('d', map(german_float, NUMBER_LINES.findall(column_lines(texts))))
+
+
+def parse_sizes(texts):
+    matches = SIZE_LINES.findall(column_lines(texts))
+    sizes = array('d', (german_float(number) for number, _ in matches))
+    units = [unit if number and unit else "N/A" for number, unit in matches]
+    return sizes, units
+
+
+def parse_stories(texts):
+    story = array('d')
+    total = array('d')
+    for floor, total_floors in STORIES_LINES.findall(column_lines(texts)):
+        story.append(0.0 if floor == "EG" else float(floor) if floor else NAN)
+        total.append(float(total_floors) if total_floors else NAN)
+    return story, total
+
+
+def flag(value):
+    return -1 if value is None else int(bool(value))
+
+
+def split_address(text):
+    # "Musterstraße 1, 70176 Stuttgart, West" -> ("Musterstraße 1, 70176 Stuttgart, West", "70176", "West").
+    # The district follows the postcode and city; without one the city stands in.
+    if not text:
+        return None, None, None
+    parts = [part.strip() for part in text.replace("\n", ",").split(",") if part.strip()]
+    address = ", ".join(parts)
+    for index, part in enumerate(parts):
+        match = POSTCODE.search(part)
+        if match:
+            city = part.replace(match.group(1), "").strip() or None
+            district = parts[index + 1] if index + 1 < len(parts) else city
+            return address, match.group(1), district
+    return address, None, None
+
+
+def ratio(numerators, denominators):
+    # NaN wherever either side is missing or the denominator is not positive
+    return array('d', (n / d if d > 0 else NAN for n, d in zip(numerators, denominators)))
+
+
+class ColumnTable:
+    # Typed, column-oriented listing table. Float columns are array('d'), so a column converts to a
+    # NumPy array without copying (numpy.frombuffer) and a table of a few hundred thousand listings
+    # stays in the tens of megabytes.
+    def __init__(self, columns=None):
+        self.columns = columns or {name: empty_column(kind) for name, kind in TABLE_COLUMNS.items()}
+
+    def __len__(self):
+        return len(self.columns["url"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def extend(self, other):
+        for name, values in other.columns.items():
+            self.columns[name].extend(values)
+
+    def derive(self):
+        # Derived metrics, recomputed over whole columns
+        self.columns["price_per_sqm"] = ratio(self["price"], self["size"])
+        self.columns["total_rent_per_sqm"] = ratio(self["total_rent"], self["size"])
+        self.columns["warm_cold_ratio"] = ratio(self["total_rent"], self["price"])
+
+    def rows(self):
+        names = list(self.columns)
+        for values in zip(*(self.columns[name] for name in names)):
+            yield dict(zip(names, values))
+
+    def save(self, path):
+        # Header line with the column layout, then every column as one contiguous block
+        blocks = []
+        layout = []
+        for name, values in self.columns.items():
+            kind = TABLE_COLUMNS.get(name, "s")
+            block = json.dumps(values, ensure_ascii=False).encode('utf-8') if kind == "s" else values.tobytes()
+            layout.append({"name": name, "kind": kind, "bytes": len(block)})
+            blocks.append(block)
+        with gzip.open(path, 'wb') as f:
+            f.write(TABLE_MAGIC)
+            header = json.dumps({"rows": len(self), "columns": layout}).encode('utf-8')
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            for block in blocks:
+                f.write(block)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rb') as f:
+            if f.read(len(TABLE_MAGIC)) != TABLE_MAGIC:
+                raise Exception(f"'{path}' is not a listing table.")
+            header = json.loads(f.read(struct.unpack('<I', f.read(4))[0]))
+            columns = {}
+            for column in header["columns"]:
+                block = f.read(column["bytes"])
+                if column["kind"] == "s":
+                    columns[column["name"]] = json.loads(block)
+                else:
+                    values = array(column["kind"])
+                    values.frombytes(block)
+                    columns[column["name"]] = values
+        return cls(columns)
+
+    def to_arrow(self):
+        try:
+            import pyarrow
+        except ImportError:
+            raise Exception("Arrow and Parquet export need pyarrow. Install it with 'pip install pyarrow'.")
+        arrays = {}
+        for name, values in self.columns.items():
+            kind = TABLE_COLUMNS.get(name, "s")
+            if kind == "d":
+                arrays[name] = pyarrow.array(values, type=pyarrow.float64(), from_pandas=True)
+            elif kind == "b":
+                arrays[name] = pyarrow.array([None if value < 0 else bool(value) for value in values],
+                                             type=pyarrow.bool_())
+            else:
+                arrays[name] = pyarrow.array(values, type=pyarrow.string())
+        return pyarrow.table(arrays)
+
+    def write_parquet(self, path):
+        table = self.to_arrow()
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(table, path)
+
+
+class RawColumns:
+    # The raw field texts of a batch of exposés, one list per field
+    def __init__(self):
+        self.columns = {name: [] for name in RAW_COLUMNS}
+        self.parking = []
+        self.balcony = []
+
+    def __len__(self):
+        return len(self.columns["url"])
+
+    def batches(self, size):
+        for start in range(0, len(self), size):
+            batch = RawColumns()
+            batch.columns = {name: values[start:start + size] for name, values in self.columns.items()}
+            batch.parking = self.parking[start:start + size]
+            batch.balcony = self.balcony[start:start + size]
+            yield batch
+
+    def append(self, url, texts, parking=None, balcony=None):
+        self.columns["url"].append(url)
+        for name in RAW_COLUMNS[1:]:
+            self.columns[name].append(texts.get(name))
+        self.parking.append(parking)
+        self.balcony.append(balcony)
+
+    def normalise(self):
+        # Same rules as extraction.normalise_listing, applied a column at a time
+        raw = self.columns
+        table = ColumnTable()
+        columns = table.columns
+        columns["url"] = list(raw["url"])
+        columns["expose_id"] = [expose_id_from_url(url) for url in raw["url"]]
+        columns["title"] = [text.strip() if text else None for text in raw["title"]]
+        for field in MONEY_FIELDS:
+            columns[field] = parse_german_numbers(raw[field])
+        columns["size"], columns["size_unit"] = parse_sizes(raw["size"])
+        columns["rooms"] = parse_german_numbers(raw["rooms"])
+        columns["story"], columns["total_stories"] = parse_stories(raw["stories"])
+        addresses = [split_address(text) for text in raw["address"]]
+        columns["address"] = [address for address, _, _ in addresses]
+        columns["postcode"] = [postcode for _, postcode, _ in addresses]
+        columns["district"] = [district for _, _, district in addresses]
+
+        heating = [(text or "").lower() for text in raw["heating_expenses_excluded"]]
+        excluded = ["nicht in nebenkosten enthalten" in text for text in heating]
+        columns["heating_expenses_excluded"] = array('b', (int(value) if text else -1
+                                                           for text, value in zip(heating, excluded)))
+        costs = parse_german_numbers(heating)
+        columns["heating_costs"] = array('d', (NAN if value else cost for value, cost in zip(excluded, costs)))
+        columns["total_rent_estimated"] = array('b', (flag("~" in text) if text is not None else -1
+                                                      for text in raw["total_rent"]))
+        columns["parking"] = array('b', map(flag, self.parking))
+        columns["balcony"] = array('b', map(flag, self.balcony))
+        table.derive()
+        # A parser that dropped or merged a line would shift every later value onto the wrong listing
+        uneven = [name for name, values in columns.items() if len(values) != len(raw["url"])]
+        if uneven:
+            raise Exception(f"Columns {uneven} do not have one value per listing ({len(raw['url'])}).")
+        return table
+
+    def save(self, path):
+        # Gzip-compressed JSON object of columns; repeated strings compress well column by column
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(dict(self.columns, parking=self.parking, balcony=self.balcony), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        raw = cls()
+        raw.parking = data.pop("parking")
+        raw.balcony = data.pop("balcony")
+        raw.columns = data
+        return raw
+
+
+def number_or_nan(value):
+    if isinstance(value, bool) or value is None:
+        return NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def table_from_records(records):
+    # For records that were normalised at scrape time (scraped_data.jsonl and friends)
+    table = ColumnTable()
+    columns = table.columns
+    for record in records:
+        address, postcode, district = split_address(record.get("address") or None)
+        url = record.get("url")
+        for name, kind in TABLE_COLUMNS.items():
+            if name in ("price_per_sqm", "total_rent_per_sqm", "warm_cold_ratio"):
+                continue
+            if name == "expose_id":
+                value = expose_id_from_url(url) if url else None
+            elif name == "postcode":
+                value = postcode
+            elif name == "district":
+                value = district
+            elif name == "address":
+                value = address
+            else:
+                value = record.get(name)
+            if kind == "d":
+                columns[name].append(number_or_nan(value))
+            elif kind == "b":
+                columns[name].append(flag(value) if value in (True, False, None) else -1)
+            else:
+                columns[name].append(value if isinstance(value, str) else None)
+    table.derive()
+    return table
@@ -25,4 +25,223 @@ SEARCH_CONFIGS = [
 BASE_URL = "https://www.immobilienscout24.de"
 
 # Limit for the number of listings to scrape
-LIMIT_INT = 150
\ No newline at end of file
+LIMIT_INT = 150
+
+# Concurrent scraping mode (Playwright async API)
+CONCURRENT_SCRAPING = False
+# Number of reusable pages working through the expose links in parallel
+SCRAPE_CONCURRENCY = 4
+# Maximum number of in-flight requests per host
+PER_HOST_CONCURRENCY = 4
+# Maximum number of navigations per second per host
+PER_HOST_RATE = 2.0
+
+# Navigation and readiness
+# Timeout for the navigation itself (until DOMContentLoaded), in milliseconds
+NAVIGATION_TIMEOUT = 30000
+# Timeout for the readiness predicate after the document has loaded, in milliseconds
+READY_TIMEOUT = 30000
+# Elements whose presence means the page content is ready to be read
+EXPOSE_READY_SELECTOR = "#expose-title"
+SEARCH_READY_SELECTOR = 'article[data-item="result"]'
+# Elements that end a readiness wait early because a CAPTCHA is shown instead
+CAPTCHA_MARKER_SELECTOR = ".g-recaptcha, iframe[src*='google.com/recaptcha'], #captcha-box"
+# Where the per-URL navigation timings of a run are written
+NAVIGATION_TIMINGS_PATH = 'navigation_timings.json'
+
+# Resource blocking, applied through route interception to every context the scraper creates
+BLOCK_RESOURCES = True
+# Playwright resource types that are never downloaded
+BLOCKED_RESOURCE_TYPES = ["image", "media", "font"]
+# Requests whose URL contains one of these patterns are blocked (analytics, trackers, ads)
+BLOCKED_URL_PATTERNS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "adservice.google",
+    "facebook.net",
+    "hotjar.com",
+    "criteo",
+    "adnxs.com",
+    "tiqcdn.com",
+    "/ads/",
+]
+# Requests whose URL contains one of these patterns are always let through (CAPTCHA widgets need them)
+ALLOWED_URL_PATTERNS = [
+    "google.com/recaptcha",
+    "gstatic.com/recaptcha",
+    "captcha",
+]
+# Rough average transfer size per blocked request, by resource type, used for the savings report (bytes)
+BLOCKED_BYTES_ESTIMATE = {
+    "image": 40000,
+    "media": 250000,
+    "font": 30000,
+    "script": 60000,
+    "stylesheet": 20000,
+    "other": 5000,
+}
+
+# Persistent crawl state
+CRAWL_DB_PATH = 'crawl_state.db'
+# Listings scraped more recently than this are not fetched again (hours)
+FRESHNESS_WINDOW_HOURS = 24
+
+# Output sinks that receive every record as soon as it is scraped: "jsonl", "json", "csv", "parquet"
+OUTPUT_SINKS = ["jsonl", "json"]
+JSONL_OUTPUT_PATH = 'scraped_data.jsonl'
+# Rotate the JSONL file into a gzip archive once it grows past this many bytes (None disables rotation)
+JSONL_ROTATE_BYTES = None
+JSON_OUTPUT_PATH = 'scraped_data.json'
+CSV_OUTPUT_PATH = 'scraped_data.csv'
+# Parquet export needs pyarrow installed
+PARQUET_OUTPUT_PATH = 'scraped_data.parquet'
+PARQUET_BATCH_SIZE = 500
+
+# Search-result discovery
+# Element holding the total number of hits on the first results page
+RESULT_COUNT_SELECTOR = '[data-is24-qa="resultlist-resultCount"], [data-testid="resultlist-resultCount"]'
+# Number of result pages fetched at the same time in concurrent mode
+SEARCH_PAGE_CONCURRENCY = 3
+# Pagination of a configuration stops after this many failed result pages in a row
+MAX_SEARCH_PAGE_FAILURES = 3
+# Query the broadest configuration plus one configuration per equipment filter and derive the
+# equipment flags from their exposé ID sets, instead of also paginating the combined filters
+DERIVE_EQUIPMENT_FLAGS = True
+
+# Fields read from each search result card, relative to its article element
+CARD_FIELDS_TO_FETCH = {
+    "price": "dl.result-list-entry__primary-criterion:nth-of-type(1) dd",
+    "size": "dl.result-list-entry__primary-criterion:nth-of-type(2) dd",
+    "rooms": "dl.result-list-entry__primary-criterion:nth-of-type(3) dd",
+}
+# Listings whose card fails one of these filters are never opened (None disables a filter)
+CARD_FILTERS = {
+    "max_price": None,
+    "min_size": None,
+    "min_rooms": None,
+}
+
+# Session pool for the concurrent mode
+# Cookies and localStorage saved by cookie-saver.py, loaded into every scraper context
+STORAGE_STATE_PATH = 'storage_state.json'
+# A session gets a fresh context after this many pages, or right away when it gets blocked
+SESSION_MAX_PAGES = 100
+# Number of pool sessions that run in a local headless browser instead of the headful CDP browser.
+# CAPTCHAs hit by headless sessions are handed over to the headful ones.
+HEADLESS_WORKERS = 0
+
+# HTTP fast path: fetch exposés with a plain keep-alive HTTP client and parse them without a browser.
+# Responses that look like a CAPTCHA, a consent wall or a JavaScript-only shell fall back to the browser.
+FAST_PATH_ENABLED = True
+# Timeout per HTTP request in seconds
+HTTP_TIMEOUT = 20
+HTTP_USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                   "Chrome/125.0.0.0 Safari/537.36")
+
+# Raw page archive: every loaded search page and exposé is kept gzip-compressed and deduplicated
+ARCHIVE_PAGES = True
+ARCHIVE_DIR = 'page_archive'
+# Output of reextract.py, which re-runs the field extraction over the archive
+REEXTRACT_OUTPUT_PATH = 'reextracted_data.jsonl'
+
+# Columnar post-processing (analytics.py): the raw field texts, the typed listing table and the market report
+COLUMNAR_RAW_PATH = 'listings_raw.json.gz'
+COLUMNAR_TABLE_PATH = 'listings.cols'
+MARKET_REPORT_PATH = 'market_report.json'
+# Rows normalised per batch
+COLUMNAR_BATCH_SIZE = 50000
+
+# Monitoring mode (monitor.py): exposé IDs or URLs to watch, one per line
+WATCHLIST_PATH = 'watchlist.txt'
+# Seconds between two passes over the watchlist
+MONITOR_INTERVAL_SECONDS = 3600
+# Price drops, rent changes, removals and other field changes are appended here as JSON lines
+MONITOR_EVENTS_PATH = 'monitor_events.jsonl'
+# Conditional requests in flight at the same time; pacing still follows the adaptive rate control
+MONITOR_CONCURRENCY = 8
+# Exposés whose server sends no ETag or Last-Modified are first looked up on the result cards of
+# SEARCH_CONFIGS, reading up to this many result pages per configuration (0 disables the card probe)
+MONITOR_CARD_PAGES = 5
+# The cards only show price, size and rooms, so such exposés are still fully extracted this often
+MONITOR_FULL_CHECK_HOURS = 24
+# Districts with fewer listings than this are left out of the market report
+MIN_DISTRICT_LISTINGS = 5
+
+# Network mode: "live" talks to the site, "record" also captures all browser traffic as HAR files,
+# "replay" serves the recorded traffic from disk and aborts every request that was not recorded
+NETWORK_MODE = "live"
+HAR_DIR = 'recordings'
+
+# Run report: time per stage (navigation, readiness waits, page-state checks, extraction, parsing,
+# output) and per search configuration, plus counters and browser memory, written after every run
+RUN_REPORT_PATH = 'run_report.json'
+# Serve the live metrics in Prometheus text format on this port (None disables the endpoint)
+METRICS_PORT = None
+# Sample the browser's memory via CDP after every this many exposés opened in the browser (0 disables it)
+MEMORY_SAMPLE_INTERVAL = 25
+# Memory watchdog: the scraping context is replaced after CONTEXT_MAX_PAGES exposés or once the browser
+# uses more than MEMORY_SOFT_LIMIT_MB (RSS of all its processes, or the JS heap where that cannot be read).
+# Past MEMORY_HARD_LIMIT_MB a local browser is restarted on its CDP port with the session cookies carried
+# over. None disables a limit.
+CONTEXT_MAX_PAGES = 200
+MEMORY_SOFT_LIMIT_MB = 1500
+MEMORY_HARD_LIMIT_MB = 3000
+# Level of the logging output; DEBUG includes every connection step
+LOG_LEVEL = "DEBUG"
+
+# CAPTCHA handling: "park" keeps crawling and retries challenged URLs later, "prompt" stops the crawl
+# until Enter is pressed after solving the CAPTCHA by hand
+CAPTCHA_MODE = "park"
+# Browser navigations of the affected session pause this long after a CAPTCHA (seconds)
+CAPTCHA_COOLDOWN_SECONDS = 120
+# A parked URL is retried after this many seconds, doubling with every further CAPTCHA up to the maximum
+CAPTCHA_RETRY_BACKOFF_SECONDS = 300
+CAPTCHA_MAX_BACKOFF_SECONDS = 3600
+# A URL is marked as failed after this many CAPTCHAs
+CAPTCHA_MAX_ATTEMPTS = 3
+# Challenged exposé tabs that stay open for a human to solve; a solved tab is read in place
+CAPTCHA_MAX_PARKED_TABS = 3
+# Every parked URL is POSTed as a JSON event to this webhook (None disables it)
+CAPTCHA_NOTIFY_URL = None
+
+# Adaptive rate control (AIMD), starting from PER_HOST_RATE and PER_HOST_CONCURRENCY: every fast page
+# without errors raises the navigation rate by RATE_INCREASE per second, while an error, a CAPTCHA,
+# a block or a page slower than SLOW_PAGE_MS multiplies rate and concurrency by RATE_DECREASE_FACTOR
+ADAPTIVE_RATE = True
+MIN_RATE = 0.2
+MAX_RATE = 4.0
+RATE_INCREASE = 0.05
+RATE_DECREASE_FACTOR = 0.5
+SLOW_PAGE_MS = 8000
+# Failed exposés and search pages are retried up to this many times, after a jittered exponential
+# backoff starting at RETRY_BASE_DELAY seconds
+MAX_RETRIES = 2
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+# Circuit breaker: a session (or search configuration) is paused for BREAKER_OPEN_SECONDS once at least
+# BREAKER_BLOCK_RATE of its last BREAKER_WINDOW pages were CAPTCHAs or blocks
+BREAKER_WINDOW = 20
+BREAKER_MIN_SAMPLES = 5
+BREAKER_BLOCK_RATE = 0.3
+BREAKER_OPEN_SECONDS = 300
+
+# Distributed mode: the exposés to scrape go into a SQLite work queue and one worker.py process per
+# registered browser leases them in batches. Workers store their records in the crawl store; the
+# output sinks are written from it once the queue is drained.
+DISTRIBUTED = False
+# Number of browsers browser_manager.py launches, on consecutive CDP ports starting at 9222
+BROWSER_COUNT = 1
+# Local browsers register themselves here; main.py and the coordinator read it
+BROWSER_REGISTRY_PATH = 'browsers.json'
+# Browsers on other machines, started with --remote-debugging-port and --remote-debugging-address
+REMOTE_CDP_ENDPOINTS = []
+WORK_QUEUE_PATH = 'work_queue.db'
+# A worker holds its leased exposés this long without a heartbeat before they go back to the queue (seconds)
+LEASE_SECONDS = 300
+# Exposés a worker leases at a time
+LEASE_BATCH = 10
+# An exposé is given up after this many leases that ended in a failure or an expired lease
+MAX_JOB_ATTEMPTS = 3
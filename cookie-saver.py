@@ -1,5 +1,6 @@
 from playwright.sync_api import sync_playwright
 import json
+from config import STORAGE_STATE_PATH
 
 def save_cookies(context):
     cookies = context.cookies()
@@ -19,8 +20,10 @@ def main():
         print("Please manually accept the cookie terms in the browser window.")
         input("Press Enter when you have accepted the terms...")
 
-        # Save the cookies
+        # Save the cookies, plus the full storage state (cookies + localStorage) for the session pool
         save_cookies(context)
+        context.storage_state(path=STORAGE_STATE_PATH)
+        print(f"Storage state saved to '{STORAGE_STATE_PATH}'.")
 
         browser.close()
 
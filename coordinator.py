@@ -0,0 +1,61 @@
+# coordinator.py
+
+import os
+import subprocess
+import sys
+import time
+
+from browser_registry import registered_browsers, is_alive
+from metrics import run_metrics
+from work_queue import WorkQueue
+
+# How often the coordinator reports progress and hands expired leases back to the queue (seconds)
+PROGRESS_SECONDS = 10
+
+
+def start_worker(browser):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worker.py')
+    return subprocess.Popen([sys.executable, script, '--endpoint', browser['endpoint'],
+                             '--name', browser['name']])
+
+
+def run_distributed_scrape(links_with_info, browsers=None):
+    # Queues the exposés and runs one worker process per browser until the queue is drained.
+    # A worker that dies is started again while its browser still answers; its leased exposés
+    # go to whichever worker asks next once the lease has run out.
+    browsers = browsers if browsers is not None else registered_browsers()
+    if not browsers:
+        raise Exception("No reachable browsers registered. Please run browser_manager.py first.")
+
+    queue = WorkQueue()
+    try:
+        queue.enqueue(links_with_info)
+        print(f"Queued {len(links_with_info)} exposés for {len(browsers)} browser(s): "
+              f"{', '.join(browser['name'] for browser in browsers)}")
+        workers = {browser['name']: (browser, start_worker(browser)) for browser in browsers}
+
+        while queue.unfinished():
+            time.sleep(PROGRESS_SECONDS)
+            queue.requeue_expired()
+            for name, (browser, process) in list(workers.items()):
+                if process.poll() is None:
+                    continue
+                if is_alive(browser['endpoint']):
+                    print(f"Worker for '{name}' exited with code {process.returncode}. Restarting it.")
+                    run_metrics.count("worker_restarts")
+                    workers[name] = (browser, start_worker(browser))
+                else:
+                    print(f"Browser '{name}' is gone. Its leased exposés go to the other workers.")
+                    del workers[name]
+            counts = queue.counts()
+            print(f"Work queue: {counts['done']} done, {counts['leased']} leased, {counts['queued']} queued, "
+                  f"{counts['failed']} failed; {len(workers)} worker(s) running")
+            if not workers:
+                print("No workers left. The remaining exposés stay queued for the next run.")
+                break
+
+        for _, process in workers.values():
+            process.wait()
+        return queue.counts()
+    finally:
+        queue.close()
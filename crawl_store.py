@@ -0,0 +1,163 @@
+# crawl_store.py
+
+import hashlib
+import json
+import sqlite3
+import time
+
+from extraction import expose_id_from_url
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    expose_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    parking INTEGER NOT NULL DEFAULT 0,
+    balcony INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    discovered_at REAL NOT NULL,
+    last_seen_at REAL NOT NULL,
+    last_scraped_at REAL,
+    content_hash TEXT,
+    error TEXT,
+    data TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    last_checked_at REAL,
+    last_extracted_at REAL
+);
+CREATE INDEX IF NOT EXISTS listings_status ON listings (status);
+"""
+
+# Columns added after the first release, with their types, for databases created before them
+ADDED_COLUMNS = {
+    "etag": "TEXT",
+    "last_modified": "TEXT",
+    "last_checked_at": "REAL",
+    "last_extracted_at": "REAL",
+}
+
+# pending: discovered, not scraped yet; scraped: data stored; skipped: page loaded but no
+# usable record (invalid stories, missing title); failed: unexpected error, retried next run;
+# delisted: the monitor found the exposé gone
+DONE_STATUSES = ('scraped', 'skipped')
+
+
+def content_hash(data):
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CrawlStore:
+    def __init__(self, path):
+        self.path = path
+        # Distributed workers write to the same file; wait for their locks instead of failing. The
+        # concurrent stages use the store from their own thread while the main thread waits for them.
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self._add_missing_columns()
+
+    def _add_missing_columns(self):
+        existing = {row['name'] for row in self.conn.execute("PRAGMA table_info(listings)")}
+        with self.conn:
+            for name, column_type in ADDED_COLUMNS.items():
+                if name not in existing:
+                    self.conn.execute(f"ALTER TABLE listings ADD COLUMN {name} {column_type}")
+
+    def close(self):
+        self.conn.close()
+
+    def record_discovered(self, links_with_info):
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO listings (expose_id, url, parking, balcony, discovered_at, last_seen_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (expose_id) DO UPDATE SET
+                    url = excluded.url,
+                    parking = excluded.parking,
+                    balcony = excluded.balcony,
+                    last_seen_at = excluded.last_seen_at
+                """,
+                [(expose_id_from_url(link), link, int(info['parking']), int(info['balcony']), now, now)
+                 for link, info in links_with_info],
+            )
+
+    def pending_links(self, freshness_hours):
+        # Listings that dropped out of the search results a while ago are not worth resuming
+        cutoff = time.time() - freshness_hours * 3600
+        rows = self.conn.execute(
+            "SELECT url, parking, balcony FROM listings "
+            "WHERE status IN ('pending', 'failed') AND last_seen_at >= ? ORDER BY discovered_at",
+            (cutoff,),
+        ).fetchall()
+        return [(row['url'], {"parking": bool(row['parking']), "balcony": bool(row['balcony'])}) for row in rows]
+
+    def equipment_flags(self):
+        rows = self.conn.execute("SELECT expose_id, parking, balcony FROM listings").fetchall()
+        return {row['expose_id']: {"parking": bool(row['parking']), "balcony": bool(row['balcony'])} for row in rows}
+
+    def split_by_freshness(self, links_with_info, freshness_hours):
+        # Returns the links that need fetching and the stored records of the ones that are still fresh
+        cutoff = time.time() - freshness_hours * 3600
+        to_scrape = []
+        fresh_records = {}
+        for link, info in links_with_info:
+            row = self.conn.execute(
+                "SELECT status, last_scraped_at, data FROM listings WHERE expose_id = ?",
+                (expose_id_from_url(link),),
+            ).fetchone()
+            if row and row['status'] in DONE_STATUSES and (row['last_scraped_at'] or 0) >= cutoff:
+                if row['data']:
+                    record = json.loads(row['data'])
+                    # Equipment flags come from the latest discovery
+                    record['parking'] = info['parking']
+                    record['balcony'] = info['balcony']
+                    fresh_records[link] = record
+                continue
+            to_scrape.append((link, info))
+        return to_scrape, fresh_records
+
+    def _update(self, link, **fields):
+        fields.setdefault('last_scraped_at', time.time())
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.conn:
+            self.conn.execute(
+                f"UPDATE listings SET {assignments} WHERE expose_id = ?",
+                list(fields.values()) + [expose_id_from_url(link)],
+            )
+
+    def mark_scraped(self, link, data):
+        self._update(link, status='scraped', error=None, content_hash=content_hash(data),
+                     data=json.dumps(data, ensure_ascii=False), last_extracted_at=time.time())
+
+    def mark_skipped(self, link):
+        self._update(link, status='skipped', error=None)
+
+    def mark_failed(self, link, error):
+        self._update(link, status='failed', error=str(error))
+
+    def watched_listings(self, expose_ids=None):
+        # Stored state of the given exposés (all scraped ones when None), keyed by exposé ID
+        if expose_ids is None:
+            rows = self.conn.execute("SELECT * FROM listings WHERE status IN ('scraped', 'delisted')").fetchall()
+        else:
+            rows = []
+            for expose_id in expose_ids:
+                row = self.conn.execute("SELECT * FROM listings WHERE expose_id = ?", (expose_id,)).fetchone()
+                if row:
+                    rows.append(row)
+        return {row['expose_id']: row for row in rows}
+
+    def record_check(self, link, etag=None, last_modified=None):
+        # A freshness probe found the exposé unchanged; the stored record counts as just scraped
+        self._update(link, etag=etag, last_modified=last_modified, last_checked_at=time.time())
+
+    def mark_checked(self, link, data, etag=None, last_modified=None):
+        self._update(link, status='scraped', error=None, content_hash=content_hash(data),
+                     data=json.dumps(data, ensure_ascii=False), etag=etag, last_modified=last_modified,
+                     last_checked_at=time.time(), last_extracted_at=time.time())
+
+    def mark_delisted(self, link):
+        self._update(link, status='delisted', etag=None, last_modified=None, last_checked_at=time.time())
@@ -0,0 +1,168 @@
+# discovery.py
+
+import math
+from urllib.parse import urlparse, parse_qs
+
+from config import LIMIT_INT, CARD_FILTERS
+from extraction import expose_id_from_url, parse_german_number
+
+EQUIPMENT_FLAGS = ["parking", "balcony"]
+
+# Runs inside the first results page: total hit count, highest linked page number and results per page
+SEARCH_META_JS = """
+(countSelector) => {
+    let totalHits = null;
+    const countElement = document.querySelector(countSelector);
+    if (countElement) {
+        const match = countElement.innerText.match(/\\d[\\d.]*/);
+        if (match) totalHits = parseInt(match[0].replace(/\\./g, ''), 10);
+    }
+    let maxPage = null;
+    for (const link of document.querySelectorAll('a[href*="pagenumber="]')) {
+        const match = link.href.match(/pagenumber=(\\d+)/);
+        if (match) maxPage = Math.max(maxPage || 0, parseInt(match[1], 10));
+    }
+    const perPage = document.querySelectorAll('article[data-item="result"]').length;
+    return {totalHits, maxPage, perPage};
+}
+"""
+
+
+# Runs inside a results page and returns every result card with its link, exposé ID, address and
+# the configured card fields, replacing several round trips per card with one evaluation
+EXTRACT_CARDS_JS = """
+(cardFields) => Array.from(document.querySelectorAll('article[data-item="result"]')).map(article => {
+    const link = article.querySelector('a[data-exp-id]');
+    const addressElement = article.querySelector('button.result-list-entry__map-link');
+    const card = {
+        href: link ? link.getAttribute('href') : null,
+        url: link ? link.href : null,
+        expose_id: link ? link.getAttribute('data-exp-id') : null,
+        address: addressElement ? addressElement.innerText.trim() : null,
+    };
+    for (const [field, selector] of Object.entries(cardFields)) {
+        const element = article.querySelector(selector);
+        card[field] = element ? element.innerText.trim() : null;
+    }
+    return card;
+})
+"""
+
+
+def is_valid_address(address):
+    # Check if the address contains a street name or number
+    return ',' in address and any(char.isdigit() for char in address.split(',')[0])
+
+
+def card_values(card):
+    return {
+        "price": parse_german_number(card.get("price")),
+        "size": parse_german_number(card.get("size")),
+        "rooms": parse_german_number(card.get("rooms")),
+        "address": card.get("address"),
+    }
+
+
+def card_passes_filters(values, filters=CARD_FILTERS):
+    # Unknown values pass; only a value that is known to be out of range rejects the card
+    checks = [
+        ("max_price", "price", lambda value, limit: value <= limit),
+        ("min_size", "size", lambda value, limit: value >= limit),
+        ("min_rooms", "rooms", lambda value, limit: value >= limit),
+    ]
+    for filter_name, field, check in checks:
+        limit = filters.get(filter_name)
+        if limit is not None and values.get(field) is not None and not check(values[field], limit):
+            return False
+    return True
+
+
+def card_expose_ids(cards):
+    # Every exposé on a result page, including the ones the card filters reject; pagination goes by these
+    return {expose_id_from_url(card["url"]) for card in cards
+            if card.get("url") and urlparse(card["url"]).path.startswith('/expose/')}
+
+
+def links_from_cards(cards, has_parking, has_balcony, limit=LIMIT_INT):
+    extracted_links = {}
+    filtered = 0
+    for card in cards:
+        url = card.get("url")
+        address = card.get("address")
+        if not url or not address or not is_valid_address(address):
+            continue
+        if not urlparse(url).path.startswith('/expose/'):
+            continue
+        values = card_values(card)
+        if not card_passes_filters(values):
+            filtered += 1
+            continue
+        # Associate parking and balcony info with the link here
+        extracted_links.setdefault(url, {"parking": has_parking, "balcony": has_balcony, "card": values})
+        if len(extracted_links) >= limit:
+            break
+    if filtered:
+        print(f"Skipped {filtered} listings that fail the card filters.")
+    return list(extracted_links.items())
+
+
+def search_page_url(base_url, page_number):
+    return f"{base_url}&pagenumber={page_number}" if '?' in base_url else f"{base_url}?pagenumber={page_number}"
+
+
+def equipment_of(config):
+    equipment = parse_qs(urlparse(config).query).get('equipment', [])
+    return {item for value in equipment for item in value.split(',') if item}
+
+
+def equipment_info(config):
+    equipment = equipment_of(config)
+    return {flag: flag in equipment for flag in EQUIPMENT_FLAGS}
+
+
+def pages_to_fetch(meta):
+    # Number of result pages this configuration has, or None when unknown. Not capped by LIMIT_INT: cards
+    # that fail the address check or CARD_FILTERS leave pages short, so the link count ends pagination.
+    per_page = meta.get("perPage") or 0
+    page_count = meta.get("maxPage") or 0
+    if meta.get("totalHits") and per_page:
+        page_count = max(page_count, math.ceil(meta["totalHits"] / per_page))
+    return page_count or None
+
+
+def plan_search_configs(configs):
+    # Returns the broadest configuration and one configuration per equipment flag, or None when
+    # the flags cannot be derived from the configured searches
+    broad = [config for config in configs if not equipment_of(config)]
+    if not broad:
+        return None
+    flag_configs = {}
+    for config in configs:
+        equipment = equipment_of(config)
+        if len(equipment) == 1:
+            flag_configs.setdefault(next(iter(equipment)), config)
+    if any(flag not in flag_configs for flag in EQUIPMENT_FLAGS):
+        return None
+    return broad[0], flag_configs
+
+
+def merge_link_info(all_links, links_with_info):
+    for link, info in links_with_info:
+        if link not in all_links:
+            all_links[link] = dict(info)
+        else:
+            for flag in EQUIPMENT_FLAGS:
+                all_links[link][flag] |= info[flag]
+
+
+def derive_equipment_flags(broad_links, flag_links):
+    # flag_links maps each equipment flag to the links found by that equipment's search
+    id_sets = {flag: {expose_id_from_url(link) for link, _ in links} for flag, links in flag_links.items()}
+    all_links = {}
+    for links in [broad_links] + list(flag_links.values()):
+        for link, info in links:
+            expose_id = expose_id_from_url(link)
+            if link not in all_links:
+                all_links[link] = {flag: expose_id in id_sets[flag] for flag in EQUIPMENT_FLAGS}
+                all_links[link]["card"] = info.get("card")
+    return list(all_links.items())
@@ -0,0 +1,139 @@
+# extraction.py
+
+import re
+
+from config import FIELDS_TO_FETCH
+
+# Runs inside the page and resolves the whole field map in a single round trip.
+# Missing elements come back as null; selectors that throw are reported per field.
+EXTRACT_FIELDS_JS = """
+(fields) => {
+    const texts = {};
+    const errors = {};
+    for (const [field, selector] of Object.entries(fields)) {
+        try {
+            const element = document.querySelector(selector);
+            texts[field] = element ? element.innerText : null;
+        } catch (e) {
+            errors[field] = String(e);
+        }
+    }
+    return {texts, errors};
+}
+"""
+
+MONEY_FIELDS = ["price", "additional_costs", "total_rent", "deposit"]
+NUMERIC_FIELDS = MONEY_FIELDS + ["heating_costs"]
+
+
+def extract_raw_fields(page, fields=FIELDS_TO_FETCH):
+    return page.evaluate(EXTRACT_FIELDS_JS, fields)
+
+
+def numeric_chars(text):
+    # Remove any non-numeric characters except , and .
+    return ''.join(filter(lambda x: x.isdigit() or x in [',', '.'], text))
+
+
+def parse_german_number(text):
+    # "1.234,50 €" -> 1234.5; None when the text holds no number
+    match = re.search(r'[0-9][0-9.]*(?:,[0-9]+)?', text or "")
+    if not match:
+        return None
+    return float(match.group(0).replace('.', '').replace(',', '.'))
+
+
+def normalise_field(data, field, text):
+    if field == "size":
+        size_text = text.strip()
+        # Extract numeric value and unit using regex
+        size_match = re.search(r'(\d+(?:,\d+)?)\s*(\S+)?', size_text)
+        if size_match:
+            # Replace comma with dot and convert to float
+            data[field] = float(size_match.group(1).replace(',', '.'))
+            # Store the unit in a separate field
+            data['size_unit'] = size_match.group(2) if size_match.group(2) else "N/A"
+        else:
+            data[field] = None
+            data['size_unit'] = "N/A"
+    elif field == "address":
+        address = text.replace("\n", ", ").strip()
+        # Remove any duplicate commas and extra spaces
+        address = ", ".join(part.strip() for part in address.split(",") if part.strip())
+        data[field] = address
+    elif field == "heating_expenses_excluded":
+        heizkosten_text = text.strip().lower()
+        data[field] = "nicht in nebenkosten enthalten" in heizkosten_text
+        if data[field]:
+            data['heating_costs'] = None
+        else:
+            # Extract numeric value if present
+            numeric_value = numeric_chars(heizkosten_text)
+            data['heating_costs'] = numeric_value if numeric_value else None
+    elif field in MONEY_FIELDS:
+        text = text.strip()
+        numeric_value = numeric_chars(text)
+        data[field] = numeric_value if numeric_value else None
+        if field == "total_rent":
+            data["total_rent_estimated"] = "~" in text
+    elif field == "stories":
+        stories_text = text.strip()
+        if "von" in stories_text:
+            story, total_stories = stories_text.split("von")
+            data["story"] = story.strip()
+            data["total_stories"] = total_stories.strip()
+        else:
+            data["story"] = stories_text
+            data["total_stories"] = None
+    else:
+        data[field] = text.strip()
+
+
+def normalise_listing(url, raw, fields=FIELDS_TO_FETCH):
+    texts = raw.get("texts", {})
+    errors = raw.get("errors", {})
+
+    data = {"url": url}
+    for field in fields:
+        if field in errors:
+            print(f"Error extracting {field} from {url}: {errors[field]}")
+            data[field] = "Error"
+            continue
+        text = texts.get(field)
+        if text is None:
+            data[field] = None
+            continue
+        try:
+            normalise_field(data, field, text)
+        except Exception as e:
+            print(f"Error extracting {field} from {url}: {e}")
+            data[field] = "Error"
+
+    # Convert price and other numeric fields to float
+    for field in NUMERIC_FIELDS:
+        if field in data and data[field] not in [None, "Error"]:
+            try:
+                data[field] = float(data[field].replace('.', '').replace(',', '.'))
+            except ValueError:
+                print(f"Error converting {field}: {data[field]}")
+                data[field] = None
+
+    # Convert story and total_stories to integers if possible
+    for field in ["story", "total_stories"]:
+        if data.get(field) and data[field] != "Error":
+            try:
+                data[field] = int(data[field])
+            except ValueError:
+                print(f"Could not convert {field} to integer: {data[field]}")
+
+    # Check if the listing should be skipped based on the "stories" field
+    if data.get("story") is None or data.get("total_stories") is None:
+        print(f"Skipping listing {url} due to invalid 'stories' field: {data.get('stories')}")
+        return None
+
+    return data
+
+
+def expose_id_from_url(url):
+    match = re.search(r'/expose/(\d+)', url)
+    return match.group(1) if match else url
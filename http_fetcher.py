@@ -0,0 +1,239 @@
+# http_fetcher.py
+
+import gzip
+import http.client
+import queue
+import threading
+import time
+import zlib
+from collections import Counter
+from http.cookies import SimpleCookie
+from urllib.parse import urlparse, urljoin
+
+from config import FIELDS_TO_FETCH, EXPOSE_READY_SELECTOR, HTTP_TIMEOUT, HTTP_USER_AGENT, ARCHIVE_PAGES
+from extraction import normalise_listing
+from metrics import run_metrics
+from page_archive import page_archive
+from session_pool import load_storage_state
+from static_html import parse_html, extract_raw_fields_html, classify_html
+
+MAX_REDIRECTS = 5
+
+
+class HttpResponse:
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def text(self):
+        charset = 'utf-8'
+        content_type = self.headers.get('content-type', '')
+        if 'charset=' in content_type:
+            charset = content_type.split('charset=')[-1].split(';')[0].strip()
+        return self.body.decode(charset, errors='replace')
+
+
+class HttpClient:
+    # Keep-alive connections pooled per host, shared by all threads, with the browser session's cookies
+    def __init__(self, storage_state=None, timeout=HTTP_TIMEOUT, user_agent=HTTP_USER_AGENT):
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.cookies = list((storage_state or {}).get("cookies", []))
+        self._pools = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes_received = 0
+
+    def _pool(self, scheme, host):
+        with self._lock:
+            return self._pools.setdefault((scheme, host), queue.LifoQueue())
+
+    def _connection(self, scheme, host, fresh=False):
+        if not fresh:
+            try:
+                return self._pool(scheme, host).get_nowait()
+            except queue.Empty:
+                pass
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, timeout=self.timeout)
+
+    def cookie_header(self, url):
+        parsed = urlparse(url)
+        host = parsed.hostname or ''
+        now = time.time()
+        pairs = []
+        with self._lock:
+            for cookie in self.cookies:
+                domain = cookie.get('domain', '').lstrip('.')
+                if not (host == domain or host.endswith('.' + domain)):
+                    continue
+                if not (parsed.path or '/').startswith(cookie.get('path', '/')):
+                    continue
+                if cookie.get('secure') and parsed.scheme != 'https':
+                    continue
+                expires = cookie.get('expires', -1)
+                if expires not in (None, -1) and expires < now:
+                    continue
+                pairs.append(f"{cookie['name']}={cookie['value']}")
+        return "; ".join(pairs)
+
+    def _remember_cookies(self, url, headers):
+        host = urlparse(url).hostname or ''
+        for header in headers:
+            parsed = SimpleCookie()
+            try:
+                parsed.load(header)
+            except Exception:
+                continue
+            with self._lock:
+                for name, morsel in parsed.items():
+                    domain = morsel['domain'] or host
+                    self.cookies = [cookie for cookie in self.cookies
+                                    if not (cookie['name'] == name and cookie.get('domain', '').lstrip('.') ==
+                                            domain.lstrip('.'))]
+                    self.cookies.append({"name": name, "value": morsel.value, "domain": domain,
+                                         "path": morsel['path'] or '/', "secure": bool(morsel['secure']),
+                                         "expires": -1})
+
+    def _request_once(self, method, url, headers, fresh=False):
+        parsed = urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        connection = self._connection(parsed.scheme, parsed.netloc, fresh)
+        try:
+            connection.request(method, path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        except Exception:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._pool(parsed.scheme, parsed.netloc).put(connection)
+        return response, body
+
+    def request(self, url, method='GET', headers=None):
+        for _ in range(MAX_REDIRECTS + 1):
+            request_headers = {
+                "User-Agent": self.user_agent,
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "de-DE,de;q=0.9,en;q=0.8",
+                "Accept-Encoding": "gzip, deflate",
+                "Connection": "keep-alive",
+            }
+            cookie = self.cookie_header(url)
+            if cookie:
+                request_headers["Cookie"] = cookie
+            request_headers.update(headers or {})
+            try:
+                response, body = self._request_once(method, url, request_headers)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # A pooled keep-alive connection may have been closed by the server; retry on a fresh one
+                run_metrics.count("retries")
+                response, body = self._request_once(method, url, request_headers, fresh=True)
+
+            self.requests += 1
+            self.bytes_received += len(body)
+            run_metrics.count("http_requests")
+            run_metrics.count("http_bytes", len(body))
+            self._remember_cookies(url, response.headers.get_all('Set-Cookie') or [])
+
+            encoding = response.headers.get('Content-Encoding', '').lower()
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif encoding == 'deflate':
+                body = zlib.decompress(body)
+
+            location = response.headers.get('Location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                continue
+            response_headers = {name.lower(): value for name, value in response.headers.items()}
+            return HttpResponse(url, response.status, response_headers, body)
+        raise Exception(f"Too many redirects for {url}")
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+        for pool in pools:
+            while not pool.empty():
+                pool.get_nowait().close()
+
+
+class FastPath:
+    # Fetches exposés over plain HTTP and parses them statically; anything that does not look
+    # like a complete exposé is left to the browser
+    def __init__(self, client=None):
+        self.client = client
+        self.hits = 0
+        self.fallbacks = Counter()
+        # Per-exposé fetch and parse times of the responses that were parsed
+        self.timings = []
+        self._lock = threading.Lock()
+
+    def _client(self):
+        with self._lock:
+            if self.client is None:
+                self.client = HttpClient(load_storage_state())
+            return self.client
+
+    def scrape_listing(self, url):
+        # Returns (handled, data); handled is False when the browser has to take over
+        started = time.perf_counter()
+        try:
+            response = self._client().request(url)
+        except Exception as e:
+            self.fallbacks["network"] += 1
+            print(f"HTTP fetch failed for {url} ({e}). Falling back to the browser.")
+            return False, None
+
+        if response.status != 200:
+            self.fallbacks[f"status_{response.status}"] += 1
+            return False, None
+
+        fetched = time.perf_counter()
+        html = response.text
+        root = parse_html(html)
+        state = classify_html(url, root, EXPOSE_READY_SELECTOR)
+        parsed = time.perf_counter()
+        self.timings.append({
+            "url": url,
+            "fetch_ms": round((fetched - started) * 1000, 1),
+            "parse_ms": round((parsed - fetched) * 1000, 1),
+            "verdict": state.verdict,
+        })
+        run_metrics.observe("http_fetch", (fetched - started) * 1000)
+        run_metrics.observe("http_parse", (parsed - fetched) * 1000)
+        if state.verdict != "normal":
+            self.fallbacks[state.verdict] += 1
+            return False, None
+
+        if ARCHIVE_PAGES:
+            page_archive.store(url, html, 'expose')
+
+        self.hits += 1
+        with run_metrics.span("extraction"):
+            raw = extract_raw_fields_html(root, FIELDS_TO_FETCH)
+        with run_metrics.span("parsing"):
+            return True, normalise_listing(url, raw)
+
+    def summary(self):
+        return {
+            "http_hits": self.hits,
+            "browser_fallbacks": dict(self.fallbacks),
+            "http_requests": self.client.requests if self.client else 0,
+            "http_bytes": self.client.bytes_received if self.client else 0,
+        }
+
+    def close(self):
+        if self.client:
+            self.client.close()
+
+
+fast_path = FastPath()
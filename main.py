@@ -1,30 +1,56 @@
 # main.py
 
+import heapq
+import itertools
 import time
+from collections import deque
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
-import json
-import os
-from config import FIELDS_TO_FETCH, BASE_URL, LIMIT_INT, SEARCH_CONFIGS
+from config import (LIMIT_INT, SEARCH_CONFIGS, CONCURRENT_SCRAPING, EXPOSE_READY_SELECTOR,
+                    SEARCH_READY_SELECTOR, NAVIGATION_TIMINGS_PATH, BLOCK_RESOURCES, CRAWL_DB_PATH,
+                    FRESHNESS_WINDOW_HOURS, OUTPUT_SINKS, RESULT_COUNT_SELECTOR, MAX_SEARCH_PAGE_FAILURES,
+                    DERIVE_EQUIPMENT_FLAGS, CARD_FIELDS_TO_FETCH, ARCHIVE_PAGES, RUN_REPORT_PATH, METRICS_PORT,
+                    LOG_LEVEL, CAPTCHA_MODE, CAPTCHA_MAX_ATTEMPTS, MAX_RETRIES,
+                    DISTRIBUTED)
+from async_scraper import run_concurrent_scrape, run_concurrent_discovery, run_async
+from browser_registry import registered_browsers
+from coordinator import run_distributed_scrape
+from crawl_store import CrawlStore
+from discovery import (SEARCH_META_JS, EXTRACT_CARDS_JS, links_from_cards, card_expose_ids, card_values, search_page_url, equipment_info, pages_to_fetch, plan_search_configs,
+                       merge_link_info, derive_equipment_flags)
+from output_sinks import build_sink
+from extraction import extract_raw_fields, normalise_listing
+from navigation import navigate, wait_until_ready, wait_for_solution, navigation_log
+from page_state import page_state_classifier
+from session_pool import load_storage_state
+from http_fetcher import fast_path
+from page_archive import page_archive
+from resource_blocker import resource_blocker
+from metrics import run_metrics
+from memory_watchdog import browser_governor
+from captcha_queue import captcha_queue, CaptchaChallenge, POLL_SECONDS
+from rate_control import rate_controller, circuit_breaker, retry_delay, BLOCK_OUTCOMES
+from network_routes import install_network_routes, fast_path_active
 import logging
-import re
-from urllib.parse import urlparse, parse_qs
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=getattr(logging, LOG_LEVEL), format='%(asctime)s - %(levelname)s - %(message)s')
 
-BROWSER_FLAG_FILE = 'browser_running.flag'
-CDP_PORT = 9222
+def get_cdp_endpoint():
+    # The first reachable browser from the registry, the flag file or the remote endpoints
+    browsers = registered_browsers()
+    if not browsers:
+        raise Exception("No running browser found. Please run browser_manager.py first.")
+    return browsers[0]['endpoint']
 
-def connect_to_browser():
+def connect_to_browser(cdp_endpoint=None):
     logging.debug("Connecting to browser")
-    if not os.path.exists(BROWSER_FLAG_FILE):
-        raise Exception("Browser flag file not found. Please run browser_manager.py first.")
-    
-    with open(BROWSER_FLAG_FILE, 'r') as f:
-        port = f.read().strip().split()[-1]
-    
+    cdp_endpoint = cdp_endpoint or get_cdp_endpoint()
+
     playwright = sync_playwright().start()
-    browser = playwright.chromium.connect_over_cdp(f"http://localhost:{port}")
-    context = browser.new_context()
+    browser = playwright.chromium.connect_over_cdp(cdp_endpoint)
+    # Start from the saved session so consent dialogs and fresh-visitor checks are skipped
+    context = browser.new_context(storage_state=load_storage_state())
+    install_network_routes(context)
+    browser_governor.attach(browser, context, cdp_endpoint)
     logging.debug("Successfully connected to browser")
     return playwright, browser, context
 
@@ -34,14 +60,12 @@ def safe_extract(page, selector):
         return element.inner_text().strip()
     return "N/A"
 
+def classify_page(page, ready_selector=None):
+    # One in-page probe per navigation: normal / captcha / consent / blocked / error
+    return page_state_classifier.classify(page, ready_selector)
+
 def is_cookie_consent_present(page):
-    consent_selectors = [
-        "#uc-fading-wrapper",
-        "[data-testid='uc-header-wrapper']",
-        "text=Wir verwenden Cookies",
-        "button:has-text('Alle akzeptieren')"
-    ]
-    return any(page.query_selector(selector) for selector in consent_selectors)
+    return classify_page(page).consent
 
 def accept_cookies(page):
     if is_cookie_consent_present(page):
@@ -50,7 +74,9 @@ def accept_cookies(page):
             if accept_button:
                 accept_button.click()
                 print("Cookies accepted automatically.")
-                page.wait_for_load_state('networkidle')
+                # Wait for the banner to go away instead of for the whole network to idle
+                page.wait_for_selector("#uc-fading-wrapper", state="detached", timeout=10000)
+                page_state_classifier.invalidate(page)
             else:
                 print("Accept button not found. Cookie consent may require manual interaction.")
         except Exception as e:
@@ -58,279 +84,385 @@ def accept_cookies(page):
 
 
 def is_captcha_present(page):
-    # Check for visible CAPTCHA elements
-    visible_captcha_selectors = [
-        ".g-recaptcha",  # Common class for reCAPTCHA
-        "iframe[src*='google.com/recaptcha']",  # reCAPTCHA iframe
-        "#captcha-box",  # Custom CAPTCHA element
-        "[id*='captcha']:not([style*='display: none'])",  # Any visible element with 'captcha' in its ID
-    ]
-
-    for selector in visible_captcha_selectors:
-        element = page.query_selector(selector)
-        if element and element.is_visible():
-            return True
-
-    # Check for CAPTCHA-related text in the page content
-    captcha_keywords = ["captcha", "verify you're not a robot", "human verification"]
-    page_text = page.inner_text('body').lower()
-
-    if any(keyword in page_text for keyword in captcha_keywords):
-        # Additional check: Is this text actually visible?
-        for keyword in captcha_keywords:
-            elements = page.query_selector_all(f"text=/{keyword}/i")
-            for element in elements:
-                if element.is_visible():
-                    return True
-
-    return False
-
-def wait_for_page_load(page, timeout=60000):
-    try:
-        page.wait_for_load_state('networkidle', timeout=timeout)
-        return True
-    except PlaywrightTimeoutError:
-        return False
-
-
-def is_valid_address(address):
-    # Check if the address contains a street name or number
-    return ',' in address and any(char.isdigit() for char in address.split(',')[0])
-
+    return classify_page(page).captcha
 
 def extract_links(page, has_parking, has_balcony):
-    links = page.query_selector_all('article[data-item="result"]')
-    extracted_links = set()  # Use a set to ensure uniqueness
-    for article in links:
-        link_element = article.query_selector('a[data-exp-id]')
-        address_element = article.query_selector('button.result-list-entry__map-link')
-
-        if link_element and address_element:
-            href = link_element.get_attribute('href')
-            address = address_element.inner_text().strip()
-
-            if href and is_valid_address(address):
-                if href.startswith('/expose/'):
-                    full_url = f"{BASE_URL}{href}"
-                    # Associate parking and balcony info with the link here
-                    extracted_links.add((full_url, has_parking, has_balcony))
-                elif href.startswith('https://www.immobilienscout24.de/expose/'):
-                    # Associate parking and balcony info with the link here
-                    extracted_links.add((href, has_parking, has_balcony))
-
-        if len(extracted_links) >= LIMIT_INT:
-            break
-
-    return list(extracted_links)[:LIMIT_INT]
+    # All result cards come back from a single evaluation. Returns the links that pass the card filters
+    # and the IDs of every exposé on the page.
+    cards = page.evaluate(EXTRACT_CARDS_JS, CARD_FIELDS_TO_FETCH)
+    return links_from_cards(cards, has_parking, has_balcony), card_expose_ids(cards)
 
 def debug_page_content(page):
     print("Current URL:", page.url)
     print("Page title:", page.title())
     print("All article elements:")
-    articles = page.query_selector_all('article[data-item="result"]')
-    for i, article in enumerate(articles):
+    cards = page.evaluate(EXTRACT_CARDS_JS, CARD_FIELDS_TO_FETCH)
+    for i, card in enumerate(cards):
         print(f"Article {i + 1}:")
-        link_element = article.query_selector('a[data-exp-id]')
-        if link_element:
-            print(f"  Link: {link_element.get_attribute('href')}")
+        if card["href"]:
+            print(f"  Link: {card['href']}")
+            print(f"  Card: {card_values(card)}")
         else:
             print("  No link found in this article")
     print("\nFull page content:")
     print(page.content())
 
 def scrape_listing(page, url):
-    page.goto(url)
-    if not wait_for_page_load(page):
-        print(f"Page load timeout for {url}. Proceeding anyway.")
-
-    if is_captcha_present(page):
-        print("CAPTCHA detected. Please solve the CAPTCHA manually.")
-        input("Press Enter when you've solved the CAPTCHA...")
-        page.reload()
-        if not wait_for_page_load(page):
-            print("Page reload timeout after CAPTCHA. Proceeding anyway.")
-
-    # Wait for the title to appear, with a timeout
-    try:
-        page.wait_for_selector("#expose-title", timeout=30000)
-    except PlaywrightTimeoutError:
-        print("Timeout while waiting for #expose-title. The page might not have loaded correctly.")
+    # Single navigation; returns as soon as the title or a CAPTCHA shows up
+    ready = navigate(page, url, EXPOSE_READY_SELECTOR)
+
+    if not ready:
+        state = classify_page(page, EXPOSE_READY_SELECTOR)
+        if state.verdict == "captcha":
+            if CAPTCHA_MODE == "park":
+                raise CaptchaChallenge(url)
+            print("CAPTCHA detected. Please solve the CAPTCHA manually.")
+            input("Press Enter when you've solved the CAPTCHA...")
+            ready = navigate(page, url, EXPOSE_READY_SELECTOR, reload=True)
+        elif state.verdict == "consent":
+            accept_cookies(page)
+            ready = wait_until_ready(page, EXPOSE_READY_SELECTOR)
+        elif state.verdict in ("blocked", "error"):
+            print(f"Page {url} is in state '{state.verdict}' ({state.title}).")
+
+    if not ready:
+        print(f"Timeout while waiting for {EXPOSE_READY_SELECTOR}. The page might not have loaded correctly.")
         page.screenshot(path='error_screenshot.png')
         print("Screenshot saved as 'error_screenshot.png'")
         return None
 
-    data = {"url": url}
-    for field, selector in FIELDS_TO_FETCH.items():
+    return read_listing(page, url)
+
+def read_listing(page, url):
+    if ARCHIVE_PAGES:
+        page_archive.store(url, page.content(), 'expose')
+
+    # Pull every field in one evaluation, then normalise the payload in Python
+    with run_metrics.span("extraction"):
+        raw = extract_raw_fields(page)
+    with run_metrics.span("parsing"):
+        return normalise_listing(url, raw)
+
+def finish_listing(link, info, data, store, sink, all_data):
+    if data:
+        # Add parking and balcony info to the scraped data
+        data['parking'] = info['parking']
+        data['balcony'] = info['balcony']
+        if store:
+            store.mark_scraped(link, data)
+        # With a sink the record streams out immediately instead of piling up in memory
+        if sink:
+            with run_metrics.span("output"):
+                sink.write(data)
+        else:
+            all_data.append(data)
+        run_metrics.count("listings_scraped")
+        print(f"Scraped {link}: {data.get('title')} ({data.get('total_rent')} EUR warm)")
+    else:
+        if store:
+            store.mark_skipped(link)
+        run_metrics.count("listings_skipped")
+        print(f"Skipped or failed to scrape data for {link}")
+
+def page_outcome(page, ready_selector):
+    # What a page that did not deliver looked like, for the rate controller and the circuit breakers
+    try:
+        verdict = classify_page(page, ready_selector).verdict
+    except Exception:
+        return "error"
+    return verdict if verdict in BLOCK_OUTCOMES else "error"
+
+def record_outcome(key, started, outcome):
+    rate_controller.record((time.perf_counter() - started) * 1000, outcome)
+    circuit_breaker.record(key, outcome)
+
+def fail_listing(link, error, store):
+    run_metrics.count("listings_failed")
+    if store:
+        store.mark_failed(link, error)
+
+def collect_solved_tabs(store, sink, all_data):
+    # Parked tabs in which a human got past the CAPTCHA now show the exposé and are read in place
+    for entry in captcha_queue.tabs():
+        page = entry.page
+        if page.is_closed():
+            # Closed by hand: retry right away in a new tab
+            entry.page = None
+            entry.due_at = 0
+            continue
+        if page.query_selector(EXPOSE_READY_SELECTOR) is None:
+            continue
+        captcha_queue.resolve(entry)
+        link, info = entry.payload
         try:
-            element = page.query_selector(selector)
-            if element:
-                if field == "size":
-                    size_text = element.inner_text().strip()
-                    # Extract numeric value and unit using regex
-                    size_match = re.search(r'(\d+(?:,\d+)?)\s*(\S+)?', size_text)
-                    if size_match:
-                        # Replace comma with dot and convert to float
-                        data[field] = float(size_match.group(1).replace(',', '.'))
-                        # Store the unit in a separate field
-                        data['size_unit'] = size_match.group(2) if size_match.group(2) else "N/A"
-                    else:
-                        data[field] = None
-                        data['size_unit'] = "N/A"
-                elif field == "address":
-                    address = element.inner_text().replace("\n", ", ").strip()
-                    # Remove any duplicate commas and extra spaces
-                    address = ", ".join(part.strip() for part in address.split(",") if part.strip())
-                    data[field] = address
-                elif field == "heating_expenses_excluded":
-                    heizkosten_text = element.inner_text().strip().lower()
-                    data[field] = "nicht in nebenkosten enthalten" in heizkosten_text
-                    if data[field]:
-                        data['heating_costs'] = None
-                    else:
-                        # Extract numeric value if present
-                        numeric_value = ''.join(filter(lambda x: x.isdigit() or x in [',', '.'], heizkosten_text))
-                        data['heating_costs'] = numeric_value if numeric_value else None
-                elif field in ["price", "additional_costs", "total_rent", "deposit"]:
-                    text = element.inner_text().strip()
-                    # Remove any non-numeric characters except , and .
-                    numeric_value = ''.join(filter(lambda x: x.isdigit() or x in [',', '.'], text))
-                    data[field] = numeric_value if numeric_value else None
-                    if field == "total_rent":
-                        data["total_rent_estimated"] = "~" in text
-                elif field == "stories":
-                    stories_text = element.inner_text().strip()
-                    if "von" in stories_text:
-                        story, total_stories = stories_text.split("von")
-                        data["story"] = story.strip()
-                        data["total_stories"] = total_stories.strip()
-                    else:
-                        data["story"] = stories_text
-                        data["total_stories"] = None
-                else:
-                    data[field] = element.inner_text().strip()
-            else:
-                data[field] = None
+            finish_listing(link, info, read_listing(page, link), store, sink, all_data)
         except Exception as e:
-            print(f"Error extracting {field} from {url}: {e}")
-            data[field] = "Error"
-
-    # Convert price and other numeric fields to float
-    for field in ["price", "additional_costs", "total_rent", "deposit", "heating_costs"]:
-        if field in data and data[field] not in [None, "Error"]:
-            try:
-                data[field] = float(data[field].replace('.', '').replace(',', '.'))
-            except ValueError:
-                print(f"Error converting {field}: {data[field]}")
-                data[field] = None
-
-    # Convert story and total_stories to integers if possible
-    for field in ["story", "total_stories"]:
-        if data.get(field) and data[field] != "Error":
-            try:
-                data[field] = int(data[field])
-            except ValueError:
-                print(f"Could not convert {field} to integer: {data[field]}")
-
-    # Check if the listing should be skipped based on the "stories" field
-    if data.get("story") is None or data.get("total_stories") is None:
-        print(f"Skipping listing {url} due to invalid 'stories' field: {data.get('stories')}")
-        return None
-
-    return data
+            print(f"An unexpected error occurred while reading the solved tab of {link}: {e}")
+            fail_listing(link, e, store)
+        finally:
+            page.close()
 
-def scrape_data_stage(context, links_with_info):
+def renew_context(context, action):
+    # Parked CAPTCHA tabs live in the context; a recycle waits until they are gone, a restart drops
+    # them and their listings come back at their regular retry time
+    if action == "recycle" and captcha_queue.tabs():
+        return context
+    if action == "restart":
+        for entry in captcha_queue.tabs():
+            entry.page = None
+    return browser_governor.renew(context, action) if action else context
+
+def scrape_data_stage(context, links_with_info, store=None, sink=None):
     all_data = []
     seen_links = set()
+    pending = deque()
     for link, info in links_with_info:
         if link in seen_links:
             print(f"Duplicate link detected: {link}")
             continue
         seen_links.add(link)
+        pending.append((link, info))
+
+    delayed = []  # Heap of (due time, sequence, link, info) for retries and paused browser work
+    sequence = itertools.count()
+    retries = {}
+    while pending or delayed or len(captcha_queue):
+        collect_solved_tabs(store, sink, all_data)
+        for entry in captcha_queue.pop_due():
+            if entry.page and not entry.page.is_closed():
+                entry.page.close()
+            pending.append(entry.payload)
+        while delayed and delayed[0][0] <= time.time():
+            _, _, link, info = heapq.heappop(delayed)
+            pending.append((link, info))
+        if not pending:
+            # Only parked or delayed listings are left; wait for a solved tab or the next retry
+            waits = [POLL_SECONDS, delayed[0][0] - time.time() if delayed else POLL_SECONDS]
+            if len(captcha_queue):
+                waits.append(captcha_queue.next_due_in())
+            time.sleep(max(0.0, min(waits)))
+            continue
+
+        link, info = pending.popleft()
+        page = None
+        outcome = "ok"
+        rate_controller.pace()
+        started = time.perf_counter()
         try:
-            page = context.new_page()
-            page.goto(link, timeout=30000)
-
-            if is_captcha_present(page):
-                print(f"CAPTCHA detected on {link}. Please solve it manually.")
-                input("Press Enter when you've solved the CAPTCHA...")
-                page.reload()
-
-            data = scrape_listing(page, link)
-            if data:
-                # Add parking and balcony info to the scraped data
-                data['parking'] = info['parking']
-                data['balcony'] = info['balcony']
-                all_data.append(data)
-                print(f"Scraped data for {link}:")
-                print(json.dumps(data, indent=2, ensure_ascii=False))
-            else:
-                print(f"Skipped or failed to scrape data for {link}")
+            # Plain HTTP first; the browser only gets the listings the fast path cannot handle
+            handled, data = fast_path.scrape_listing(link) if fast_path_active() else (False, None)
+            if not handled:
+                pause = max(captcha_queue.cooldown_remaining("browser"), circuit_breaker.remaining("browser"))
+                if pause:
+                    # The browser is cooling down or its breaker is open; come back to this one afterwards
+                    heapq.heappush(delayed, (time.time() + pause, next(sequence), link, info))
+                    outcome = None
+                    continue
+                page = context.new_page()
+                data = scrape_listing(page, link)
+                if not data and page_outcome(page, EXPOSE_READY_SELECTOR) in BLOCK_OUTCOMES:
+                    outcome = "blocked"
+            finish_listing(link, info, data, store, sink, all_data)
+        except CaptchaChallenge:
+            outcome = "captcha"
+            captcha_queue.cool_down("browser")
+            keep_tab = captcha_queue.can_keep_tab()
+            if captcha_queue.park(link, (link, info), page if keep_tab else None) is None:
+                fail_listing(link, "captcha", store)
+            elif keep_tab:
+                # The tab stays open on the challenge
+                page = None
         except Exception as e:
+            outcome = "error"
             print(f"An unexpected error occurred while scraping {link}: {e}")
-            page.screenshot(path=f'error_screenshot_{link.split("/")[-1]}.png')
-            print(f"Screenshot saved as 'error_screenshot_{link.split('/')[-1]}.png'")
+            retry = retries.get(link, 0) + 1
+            if retry <= MAX_RETRIES:
+                retries[link] = retry
+                delay = retry_delay(retry)
+                run_metrics.count("retries")
+                print(f"Retrying {link} in {delay:.1f} s (retry {retry}/{MAX_RETRIES}).")
+                heapq.heappush(delayed, (time.time() + delay, next(sequence), link, info))
+            else:
+                fail_listing(link, e, store)
+            if page:
+                page.screenshot(path=f'error_screenshot_{link.split("/")[-1]}.png')
+                print(f"Screenshot saved as 'error_screenshot_{link.split('/')[-1]}.png'")
         finally:
-            page.close()
+            if outcome:
+                rate_controller.record((time.perf_counter() - started) * 1000, outcome)
+                if page or outcome == "captcha":
+                    circuit_breaker.record("browser", outcome)
+            if page:
+                action = browser_governor.after_page(page)
+                page.close()
+                context = renew_context(context, action)
 
     return all_data
 
 
-def extract_links_for_config(page, base_url, start_page=1):
+def load_search_page(page, page_url, page_number):
+    ready = navigate(page, page_url, SEARCH_READY_SELECTOR)
+
+    if not ready:
+        state = classify_page(page, SEARCH_READY_SELECTOR)
+        if state.verdict == "captcha" and CAPTCHA_MODE == "park":
+            ready = wait_out_search_captcha(page, page_url)
+        elif state.verdict == "captcha":
+            print(f"CAPTCHA detected on search page {page_number}. Please solve the CAPTCHA manually.")
+            input("Press Enter when you've solved the CAPTCHA...")
+            ready = navigate(page, page_url, SEARCH_READY_SELECTOR, reload=True)
+            accept_cookies(page)
+        elif state.verdict == "consent":
+            accept_cookies(page)
+            ready = wait_until_ready(page, SEARCH_READY_SELECTOR)
+        elif state.verdict in ("blocked", "error"):
+            raise Exception(f"Search page {page_number} is in state '{state.verdict}' ({state.title})")
+
+    if not ready:
+        raise PlaywrightTimeoutError(f"No search result articles appeared on {page_url}")
+
+    if ARCHIVE_PAGES:
+        page_archive.store(page_url, page.content(), 'search')
+
+
+def wait_out_search_captcha(page, page_url):
+    # Pagination depends on this page, so instead of parking it the tab stays on the challenge for the
+    # cool-down. A human solving it ends the wait early; otherwise the page is reloaded afterwards.
+    for attempt in range(1, CAPTCHA_MAX_ATTEMPTS + 1):
+        captcha_queue.notify(page_url, attempt, captcha_queue.cooldown, True)
+        if wait_for_solution(page, SEARCH_READY_SELECTOR, captcha_queue.cooldown):
+            run_metrics.count("captchas_solved")
+            return True
+        if navigate(page, page_url, SEARCH_READY_SELECTOR, reload=True):
+            return True
+        if not classify_page(page, SEARCH_READY_SELECTOR).captcha:
+            return False
+    return False
+
+def extract_links_for_config(page, base_url, start_page=1, limit=LIMIT_INT):
     all_links = {}  # Dictionary to store link info
+    seen_ids = set()
     current_page = start_page
-    wait_time = 5000  # Wait time in milliseconds (5 seconds)
+    page_count = None  # Last page worth loading, known once the first page has been read
+    failures = 0
+    retries = 0
 
     # Parse the base_url to get the search parameters
-    parsed_url = urlparse(base_url)
-    query_params = parse_qs(parsed_url.query)
-    equipment = query_params.get('equipment', [])
-    has_parking = 'parking' in equipment
-    has_balcony = 'balcony' in equipment
+    info = equipment_info(base_url)
+    has_parking = info['parking']
+    has_balcony = info['balcony']
 
-    while len(all_links) < LIMIT_INT:
-        page_url = f"{base_url}&pagenumber={current_page}" if '?' in base_url else f"{base_url}?pagenumber={current_page}"
+    while len(all_links) < limit and (page_count is None or current_page <= page_count):
+        page_url = search_page_url(base_url, current_page)
+        circuit_breaker.wait(base_url)
+        rate_controller.pace()
 
         print(f"Navigating to page {current_page}: {page_url}")
+        started = time.perf_counter()
         try:
-            page.goto(page_url, wait_until="networkidle", timeout=60000)
-            print(f"Waiting for {wait_time / 1000} seconds for the page to settle...")
-            page.wait_for_timeout(wait_time)
-
-            if is_captcha_present(page):
-                print(f"CAPTCHA detected on search page {current_page}. Please solve the CAPTCHA manually.")
-                input("Press Enter when you've solved the CAPTCHA...")
-                page.reload(wait_until="networkidle", timeout=60000)
-                print("Page reloaded after CAPTCHA. Waiting for 5 seconds...")
-                page.wait_for_timeout(wait_time)
-                accept_cookies(page)
+            with run_metrics.span("search_page", base_url):
+                load_search_page(page, page_url, current_page)
+
+            if page_count is None:
+                meta = page.evaluate(SEARCH_META_JS, RESULT_COUNT_SELECTOR)
+                pages = pages_to_fetch(meta)
+                if pages:
+                    page_count = start_page + pages - 1
+                print(f"Search reports {meta.get('totalHits')} hits; loading up to page {page_count or '?'}.")
 
             print(f"Extracting links from page {current_page}...")
-            page.wait_for_selector('article[data-item="result"]', timeout=60000)
-            print("Search result articles found.")
-
-            links = extract_links(page, has_parking, has_balcony)
-            for link, parking, balcony in links:
-                if link not in all_links:
-                    all_links[link] = {"parking": parking, "balcony": balcony}
-                else:
-                    all_links[link]["parking"] |= parking
-                    all_links[link]["balcony"] |= balcony
+
+            with run_metrics.span("card_extraction", base_url):
+                links, page_ids = extract_links(page, has_parking, has_balcony)
+            run_metrics.count("cards_found", len(links), base_url)
+            # Filtered cards count too: a page whose cards all fail CARD_FILTERS is not the end of the results
+            new_ids = page_ids - seen_ids
+            seen_ids |= new_ids
+            merge_link_info(all_links, links)
+            failures = 0
+            # Once per page, after everything that can still fail; the except branch records failures
+            record_outcome(base_url, started, "ok")
             print(f"Found {len(links)} links on page {current_page}. Total unique links: {len(all_links)}")
 
-            if not links:
-                print("No more results found. Stopping pagination.")
+            if not new_ids:
+                print("No new exposés on this page. Stopping pagination.")
                 break
 
-        except PlaywrightTimeoutError as e:
-            print(f"Timeout error on page {current_page}: {e}")
-            print("Attempting to proceed to the next page...")
         except Exception as e:
-            print(f"An error occurred on page {current_page}: {e}")
+            record_outcome(base_url, started, page_outcome(page, SEARCH_READY_SELECTOR))
+            if isinstance(e, PlaywrightTimeoutError):
+                print(f"Timeout error on page {current_page}: {e}")
+            else:
+                print(f"An error occurred on page {current_page}: {e}")
+            retries += 1
+            if retries <= MAX_RETRIES:
+                delay = retry_delay(retries)
+                run_metrics.count("retries")
+                print(f"Retrying page {current_page} in {delay:.1f} s (retry {retries}/{MAX_RETRIES}).")
+                time.sleep(delay)
+                continue
+            failures += 1
+            run_metrics.count("search_page_failures", config=base_url)
+        retries = 0
+
+        if failures >= MAX_SEARCH_PAGE_FAILURES:
+            print(f"{failures} result pages failed in a row. Stopping pagination.")
+            break
+        elif failures:
             print("Attempting to proceed to the next page...")
 
         current_page += 1
 
-    return list(all_links.items())[:LIMIT_INT]  # Convert back to list of tuples at the end
+    return list(all_links.items())[:limit]  # Convert back to list of tuples at the end
+
+def discover_or_resume(search_page, store):
+    # An interrupted run leaves pending or failed listings behind; offer to finish those first
+    pending = store.pending_links(FRESHNESS_WINDOW_HOURS)
+    if pending:
+        user_input = input(f"\n{len(pending)} listings from a previous run were not scraped yet. "
+                           f"Resume them without running discovery again? (y/n): ").lower().strip()
+        if user_input == 'y':
+            return pending
+
+    if CONCURRENT_SCRAPING:
+        links_list = run_async(run_concurrent_discovery(get_cdp_endpoint()))
+        print(f"\nTotal {len(links_list)} unique links found across all configurations.")
+    else:
+        links_list = discover_links(search_page)
+    store.record_discovered(links_list)
+    return links_list
+
+def collect_config_links(search_page, config):
+    print(f"\nExtracting links for configuration: {config}")
+    try:
+        links_with_info = extract_links_for_config(search_page, config)
+        print(f"Found {len(links_with_info)} links for this configuration.")
+        return links_with_info
+    except Exception as e:
+        print(f"An error occurred while processing configuration {config}: {e}")
+        print("Proceeding to the next configuration...")
+        return []
+
+def discover_links(search_page):
+    plan = plan_search_configs(SEARCH_CONFIGS) if DERIVE_EQUIPMENT_FLAGS else None
+
+    if plan:
+        # One broad search plus one search per equipment flag; combined filters follow from the ID sets
+        broad_config, flag_configs = plan
+        broad_links = collect_config_links(search_page, broad_config)
+        flag_links = {flag: collect_config_links(search_page, config) for flag, config in flag_configs.items()}
+        links_list = derive_equipment_flags(broad_links, flag_links)
+    else:
+        all_unique_links = {}
+        for config in SEARCH_CONFIGS:
+            merge_link_info(all_unique_links, collect_config_links(search_page, config))
+            print(f"Total unique links so far: {len(all_unique_links)}")
+        links_list = list(all_unique_links.items())
+
+    print(f"\nTotal {len(links_list)} unique links found across all configurations:")
+    for link, info in links_list:
+        print(f"{link} (Parking: {info['parking']}, Balcony: {info['balcony']})")
+    return links_list
 
 def main():
     logging.debug("Starting main function")
@@ -338,33 +470,21 @@ def main():
     browser = None
     context = None
     search_page = None
+    store = None
 
     try:
+        if METRICS_PORT:
+            run_metrics.serve(METRICS_PORT)
         playwright, browser, context = connect_to_browser()
         search_page = context.new_page()
+        store = CrawlStore(CRAWL_DB_PATH)
 
-        all_unique_links = {}
+        links_list = discover_or_resume(search_page, store)
 
-        for config in SEARCH_CONFIGS:
-            print(f"\nExtracting links for configuration: {config}")
-            try:
-                links_with_info = extract_links_for_config(search_page, config)
-                for link, info in links_with_info:
-                    if link not in all_unique_links:
-                        all_unique_links[link] = info
-                    else:
-                        all_unique_links[link]["parking"] |= info["parking"]
-                        all_unique_links[link]["balcony"] |= info["balcony"]
-                print(f"Found {len(links_with_info)} links for this configuration.")
-                print(f"Total unique links so far: {len(all_unique_links)}")
-            except Exception as e:
-                print(f"An error occurred while processing configuration {config}: {e}")
-                print("Proceeding to the next configuration...")
-
-        links_list = list(all_unique_links.items())
-        print(f"\nTotal {len(links_list)} unique links found across all configurations:")
-        for link, info in links_list:
-            print(f"{link} (Parking: {info['parking']}, Balcony: {info['balcony']})")
+        # Only fetch listings that are new, unfinished or older than the freshness window
+        to_scrape, fresh_records = store.split_by_freshness(links_list, FRESHNESS_WINDOW_HOURS)
+        print(f"{len(fresh_records)} listings are fresher than {FRESHNESS_WINDOW_HOURS}h and will be reused; "
+              f"{len(to_scrape)} need to be scraped.")
 
         # Ask user if they want to continue with scraping
         user_input = input("\nContinue with web scraping? (y/n): ").lower().strip()
@@ -372,26 +492,65 @@ def main():
             print("Scraping cancelled by user.")
             return
 
-        # Stage 2: Scrape data
-        all_data = scrape_data_stage(context, links_list)
-
-        # Save all scraped data to a JSON file
-        with open('scraped_data.json', 'w', encoding='utf-8') as f:
-            json.dump(all_data, f, ensure_ascii=False, indent=2)
-        print("All scraped data saved to 'scraped_data.json'")
+        # Stage 2: Scrape data, streaming every record to the configured sinks
+        sink = build_sink()
+        try:
+            reused = set(fresh_records)
+            if DISTRIBUTED:
+                # The workers keep their records in the crawl store, so everything they finished is fresh now
+                print(f"Distributed scraping finished: {run_distributed_scrape(to_scrape)}")
+                _, fresh_records = store.split_by_freshness(links_list, FRESHNESS_WINDOW_HOURS)
+
+            for link, _ in links_list:
+                if link in reused:
+                    sink.write_reused(fresh_records[link])
+                elif link in fresh_records:
+                    sink.write(fresh_records[link])
+
+            if CONCURRENT_SCRAPING and not DISTRIBUTED:
+                run_async(run_concurrent_scrape(get_cdp_endpoint(), to_scrape, store=store, sink=sink))
+            elif not DISTRIBUTED:
+                scrape_data_stage(context, to_scrape, store=store, sink=sink)
+        finally:
+            sink.close()
+        print(f"All scraped data written to: {', '.join(OUTPUT_SINKS)}")
+
+        navigation_log.save(NAVIGATION_TIMINGS_PATH)
+        print(f"Navigation timings saved to '{NAVIGATION_TIMINGS_PATH}': {navigation_log.summary()}")
+        if BLOCK_RESOURCES:
+            resource_blocker.print_summary()
+        if fast_path_active():
+            print(f"HTTP fast path: {fast_path.summary()}")
+        if ARCHIVE_PAGES:
+            print(f"Page archive: {page_archive.summary()}")
+        if captcha_queue.parked_total:
+            print(f"CAPTCHAs: {captcha_queue.summary()}")
+        print(f"Rate control: {rate_controller.summary()}, circuit breaker trips: {circuit_breaker.trips}")
+        print(f"Browser memory: {browser_governor.summary()}")
 
     except KeyboardInterrupt:
         print("Script execution cancelled.")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-        if search_page:
+        if search_page and not search_page.is_closed():
             print(f"Current URL when error occurred: {search_page.url}")
             search_page.screenshot(path='error_screenshot.png')
             print("Screenshot saved as 'error_screenshot.png'")
     finally:
         print("Script execution finished.")
+        # Written for failed and cancelled runs too; those are the ones worth looking into
+        run_metrics.save(RUN_REPORT_PATH)
+        run_metrics.print_summary()
+        print(f"Run report saved to '{RUN_REPORT_PATH}'")
+        if store:
+            store.close()
+        fast_path.close()
+        page_archive.close()
         if search_page:
             search_page.close()
+        # The memory watchdog may have replaced the context or the whole browser during the run
+        context = browser_governor.context or context
+        browser = browser_governor.browser or browser
         if context:
             logging.debug("Closing context")
             context.close()
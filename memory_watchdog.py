@@ -0,0 +1,220 @@
+# memory_watchdog.py
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from browser_registry import register_browser, registry_entry, is_alive
+from config import MEMORY_SAMPLE_INTERVAL, CONTEXT_MAX_PAGES, MEMORY_SOFT_LIMIT_MB, MEMORY_HARD_LIMIT_MB
+from metrics import run_metrics
+from network_routes import install_network_routes
+from session_pool import load_storage_state
+
+MB = 1024 * 1024
+# Process memory can only be read for browsers on this machine
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+# How long a browser gets to shut down and to open its CDP port again when it is restarted (seconds)
+RESTART_TIMEOUT = 30
+
+
+def process_rss(pid):
+    # Resident memory of one process from /proc; None where there is no /proc or the process is gone
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+def browser_rss(process_info):
+    # Sum over the browser, GPU, utility and renderer processes listed by SystemInfo.getProcessInfo
+    sizes = [process_rss(process['id']) for process in process_info]
+    sizes = [size for size in sizes if size is not None]
+    return sum(sizes) if sizes else None
+
+
+def detached_process_options():
+    # The restarted browser has to outlive this run, just like the one browser_manager launched
+    if os.name == 'nt':
+        return {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+class BrowserGovernor:
+    # Watches the memory of the CDP browser over a long crawl. Memory is the RSS of all browser
+    # processes where it can be read and the JS heap of the sampled page otherwise. The scraping
+    # context is replaced after max_pages exposés or past the soft limit; past the hard limit the
+    # browser itself is restarted on its CDP port and the session cookies are carried over.
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL, max_pages=CONTEXT_MAX_PAGES, soft_mb=MEMORY_SOFT_LIMIT_MB,
+                 hard_mb=MEMORY_HARD_LIMIT_MB):
+        self.interval = interval
+        self.max_pages = max_pages
+        self.soft_mb = soft_mb
+        self.hard_mb = hard_mb
+        self.browser = None
+        self.context = None
+        self.endpoint = None
+        self.pages = 0
+        self.context_pages = 0
+        self.memory_mb = None
+        self.profile = []
+        self.recycles = 0
+        self.restarts = 0
+        self.started = time.time()
+        run_metrics.add_section("memory_profile", self.report)
+
+    def attach(self, browser, context, endpoint):
+        # The scraping context of the sequential crawl; renew() swaps it out
+        self.browser = browser
+        self.context = context
+        self.endpoint = endpoint
+
+    def is_local(self):
+        return bool(self.endpoint) and urlparse(self.endpoint).hostname in LOCAL_HOSTS
+
+    def _record(self, heap_values, process_info):
+        rss = browser_rss(process_info) if process_info and self.is_local() else None
+        heap = heap_values.get("JSHeapTotalSize") if heap_values else None
+        run_metrics.gauge("browser_rss_bytes", rss)
+        memory = rss if rss is not None else heap
+        self.memory_mb = memory / MB if memory is not None else None
+        self.profile.append({
+            "at_s": round(time.time() - self.started, 1),
+            "pages": self.pages,
+            "rss_mb": round(rss / MB, 1) if rss is not None else None,
+            "js_heap_mb": round(heap / MB, 1) if heap is not None else None,
+            "processes": len(process_info or []),
+        })
+
+    def measure(self, page, browser=None):
+        heap_values = run_metrics.sample_browser_memory(page)
+        try:
+            session = (browser or page.context.browser).new_browser_cdp_session()
+            process_info = session.send("SystemInfo.getProcessInfo")["processInfo"]
+            session.detach()
+        except Exception as e:
+            print(f"Could not list the browser processes: {e}")
+            process_info = None
+        self._record(heap_values, process_info)
+
+    async def measure_async(self, page, browser):
+        heap_values = await run_metrics.sample_browser_memory_async(page)
+        try:
+            session = await browser.new_browser_cdp_session()
+            process_info = (await session.send("SystemInfo.getProcessInfo"))["processInfo"]
+            await session.detach()
+        except Exception as e:
+            print(f"Could not list the browser processes: {e}")
+            process_info = None
+        self._record(heap_values, process_info)
+
+    def over_limit(self, limit_mb):
+        return self.memory_mb is not None and bool(limit_mb) and self.memory_mb >= limit_mb
+
+    def verdict(self):
+        # None, "recycle" (new context) or "restart" (new browser); the last measurement counts until
+        # the context is replaced
+        if self.over_limit(self.hard_mb):
+            return "restart" if self.is_local() else "recycle"
+        if self.over_limit(self.soft_mb):
+            return "recycle"
+        if self.max_pages and self.context_pages >= self.max_pages:
+            return "recycle"
+        return None
+
+    def after_page(self, page):
+        # Called with every exposé page opened in the browser, before the page is closed
+        self.pages += 1
+        self.context_pages += 1
+        if self.interval and self.pages % self.interval == 0:
+            self.measure(page)
+        return self.verdict()
+
+    def renew(self, context, action):
+        # Replaces the context, and for "restart" the browser first; returns the new context
+        reason = (f"{self.memory_mb:.0f} MB in use" if self.over_limit(self.soft_mb)
+                  else f"{self.context_pages} pages served")
+        try:
+            storage_state = context.storage_state()
+        except Exception:
+            storage_state = load_storage_state()
+        if action == "restart":
+            self.restart_browser()
+            self.restarts += 1
+            run_metrics.count("browser_restarts")
+            browser = self.browser
+        else:
+            browser = context.browser
+            context.close()
+            self.recycles += 1
+            run_metrics.count("context_recycles")
+        new_context = browser.new_context(storage_state=storage_state)
+        install_network_routes(new_context)
+        print(f"{'Restarted the browser' if action == 'restart' else 'Replaced the browser context'} ({reason}).")
+        self.profile.append({"at_s": round(time.time() - self.started, 1), "pages": self.pages, "action": action})
+        self.context = new_context
+        self.context_pages = 0
+        self.memory_mb = None
+        return new_context
+
+    def restart_browser(self):
+        browser_type = self.browser.browser_type
+        port = urlparse(self.endpoint).port
+        try:
+            self.browser.new_browser_cdp_session().send("Browser.close")
+        except Exception:
+            pass  # The connection drops while the browser shuts down
+        deadline = time.time() + RESTART_TIMEOUT
+        while is_alive(self.endpoint, timeout=1) and time.time() < deadline:
+            time.sleep(0.5)
+        try:
+            # Drops the dead connection, so the Playwright driver does not keep it around
+            self.browser.close()
+        except Exception:
+            pass
+
+        # The profile of the browser an earlier restart started is not needed once that browser is gone
+        entry = registry_entry(self.endpoint)
+        if entry.get("profile_dir"):
+            shutil.rmtree(entry["profile_dir"], ignore_errors=True)
+
+        profile_dir = tempfile.mkdtemp(prefix='scraper-browser-')
+        subprocess.Popen([browser_type.executable_path, f'--remote-debugging-port={port}',
+                          f'--user-data-dir={profile_dir}', '--no-first-run', '--no-default-browser-check',
+                          '--no-sandbox', '--disable-setuid-sandbox', 'about:blank'],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **detached_process_options())
+        deadline = time.time() + RESTART_TIMEOUT
+        while not is_alive(self.endpoint, timeout=1):
+            if time.time() >= deadline:
+                shutil.rmtree(profile_dir, ignore_errors=True)
+                raise Exception(f"The restarted browser did not open {self.endpoint} within {RESTART_TIMEOUT} s.")
+            time.sleep(0.5)
+
+        # Same port, so the flag file stays valid; the registry entry gets the new owner and the profile,
+        # which browser_manager removes when it closes the browser
+        register_browser(self.endpoint, entry.get("name"), profile_dir=profile_dir)
+        self.browser = browser_type.connect_over_cdp(self.endpoint)
+
+    def report(self):
+        measured = [sample for sample in self.profile if "action" not in sample]
+        peaks = [sample["rss_mb"] or sample["js_heap_mb"] for sample in measured
+                 if sample["rss_mb"] or sample["js_heap_mb"]]
+        return {
+            "peak_mb": max(peaks) if peaks else None,
+            "context_recycles": self.recycles,
+            "browser_restarts": self.restarts,
+            "samples": self.profile,
+        }
+
+    def summary(self):
+        report = self.report()
+        return {key: value for key, value in report.items() if key != "samples"}
+
+
+browser_governor = BrowserGovernor()
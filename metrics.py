@@ -0,0 +1,237 @@
+# metrics.py
+
+import contextlib
+import json
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import RUN_REPORT_PATH
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def stage_summary(durations):
+    return {
+        "count": len(durations),
+        "total_ms": round(sum(durations), 1),
+        "avg_ms": round(sum(durations) / len(durations), 1),
+        "p50_ms": round(percentile(durations, 0.50), 1),
+        "p95_ms": round(percentile(durations, 0.95), 1),
+        "max_ms": round(max(durations), 1),
+    }
+
+
+def metric_name(name):
+    return "scraper_" + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def sample_value(value):
+    # Exact integers for counters and byte gauges; "{:g}" would round 12345678 to 1.23457e+07
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    if value != value:
+        return "NaN"
+    if value in (float('inf'), float('-inf')):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class RunMetrics:
+    # Durations per stage (and per search configuration where one applies), counters and gauges
+    # for one run. Thread-safe, since the HTTP fast path records from worker threads.
+    def __init__(self):
+        self.started = time.time()
+        self._durations = defaultdict(list)
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._peaks = {}
+        self._sections = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def observe(self, stage, duration_ms, config=None):
+        with self._lock:
+            self._durations[(stage, config)].append(duration_ms)
+
+    @contextlib.contextmanager
+    def span(self, stage, config=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - started) * 1000, config)
+
+    def count(self, name, value=1, config=None):
+        with self._lock:
+            self._counters[(name, config)] += value
+
+    def gauge(self, name, value):
+        if value is None:
+            return
+        with self._lock:
+            self._gauges[name] = value
+            self._peaks[name] = max(value, self._peaks.get(name, value))
+
+    def add_section(self, name, provider):
+        # provider() returns extra JSON data for the report, e.g. the browser memory profile
+        self._sections[name] = provider
+
+    def _on_response(self, response):
+        # Transfer size as announced by the server; chunked responses without a length are not counted
+        self.count("browser_responses")
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            self.count("browser_bytes", int(length))
+
+    def watch_context(self, context):
+        context.on("response", self._on_response)
+
+    def _record_memory(self, metrics):
+        values = {metric["name"]: metric["value"] for metric in metrics}
+        self.gauge("browser_js_heap_used_bytes", values.get("JSHeapUsedSize"))
+        self.gauge("browser_js_heap_total_bytes", values.get("JSHeapTotalSize"))
+        self.gauge("browser_dom_nodes", values.get("Nodes"))
+        self.count("memory_samples")
+        return values
+
+    def sample_browser_memory(self, page):
+        # Renderer heap of the page via the CDP Performance domain (Chromium only); returns the raw values
+        try:
+            session = page.context.new_cdp_session(page)
+            session.send("Performance.enable")
+            metrics = session.send("Performance.getMetrics")["metrics"]
+            session.detach()
+        except Exception as e:
+            print(f"Could not sample browser memory: {e}")
+            return None
+        return self._record_memory(metrics)
+
+    async def sample_browser_memory_async(self, page):
+        try:
+            session = await page.context.new_cdp_session(page)
+            await session.send("Performance.enable")
+            metrics = (await session.send("Performance.getMetrics"))["metrics"]
+            await session.detach()
+        except Exception as e:
+            print(f"Could not sample browser memory: {e}")
+            return None
+        return self._record_memory(metrics)
+
+    def report(self):
+        with self._lock:
+            durations = {key: list(values) for key, values in self._durations.items()}
+            counters = dict(self._counters)
+            gauges = {name: {"last": value, "peak": self._peaks[name]} for name, value in self._gauges.items()}
+
+        stages = defaultdict(list)
+        configs = defaultdict(lambda: {"stages": {}, "counters": {}})
+        for (stage, config), values in durations.items():
+            stages[stage].extend(values)
+            if config is not None:
+                configs[config]["stages"][stage] = stage_summary(values)
+        totals = defaultdict(float)
+        for (name, config), value in counters.items():
+            totals[name] += value
+            if config is not None:
+                configs[config]["counters"][name] = value
+
+        stage_summaries = {stage: stage_summary(values) for stage, values in stages.items()}
+        report = {
+            "started_at": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            "duration_s": round(time.time() - self.started, 1),
+            "stages": dict(sorted(stage_summaries.items(), key=lambda item: -item[1]["total_ms"])),
+            "configs": dict(configs),
+            "counters": dict(totals),
+            "gauges": gauges,
+        }
+        for name, provider in self._sections.items():
+            report[name] = provider()
+        return report
+
+    def save(self, path=RUN_REPORT_PATH):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def print_summary(self):
+        report = self.report()
+        print(f"Run took {report['duration_s']} s. Time per stage:")
+        for stage, summary in report["stages"].items():
+            print(f"  {stage}: {summary['total_ms'] / 1000:.1f} s over {summary['count']} spans "
+                  f"(p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms)")
+
+    def prometheus_text(self):
+        with self._lock:
+            durations = {key: list(values) for key, values in self._durations.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        lines = ["# TYPE scraper_stage_seconds summary"]
+        for (stage, config), values in sorted(durations.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+            labels = f'stage="{label_value(stage)}"'
+            if config is not None:
+                labels += f',config="{label_value(config)}"'
+            for quantile in (0.5, 0.95):
+                lines.append(f'scraper_stage_seconds{{{labels},quantile="{quantile}"}} '
+                             f'{percentile(values, quantile) / 1000:.6f}')
+            lines.append(f'scraper_stage_seconds_sum{{{labels}}} {sum(values) / 1000:.6f}')
+            lines.append(f'scraper_stage_seconds_count{{{labels}}} {len(values)}')
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {metric_name(name)}_total counter")
+            for (counter, config), value in counters.items():
+                if counter != name:
+                    continue
+                labels = f'{{config="{label_value(config)}"}}' if config is not None else ''
+                lines.append(f"{metric_name(name)}_total{labels} {sample_value(value)}")
+
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE {metric_name(name)} gauge")
+            lines.append(f"{metric_name(name)} {sample_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port):
+        # Live metrics at http://localhost:<port>/metrics for a Prometheus scraper or a quick curl
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Metrics served at http://localhost:{port}/metrics")
+
+    def stop_serving(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+run_metrics = RunMetrics()
@@ -0,0 +1,284 @@
+# mock_site.py
+
+import argparse
+import hashlib
+import random
+import re
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+SEARCH_PATH = "/Suche/de/baden-wuerttemberg/stuttgart/wohnung-mieten"
+STREETS = ["Königstraße", "Rotebühlstraße", "Hauptstätter Straße", "Olgastraße", "Neckarstraße", "Tübinger Straße"]
+CONSENT_COOKIE = "uc_consent=accepted"
+DISTRICTS = [("70173", "Mitte"), ("70176", "West"), ("70180", "Süd"), ("70190", "Ost"), ("70191", "Nord")]
+
+
+def german_number(value, decimals=0):
+    # 1234.5 -> "1.234,50"
+    text = f"{value:,.{decimals}f}"
+    return text.replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+class MockListing:
+    def __init__(self, number, rng):
+        self.expose_id = str(150000000 + number)
+        self.parking = number % 2 == 0
+        self.balcony = number % 3 == 0
+        self.size = round(rng.uniform(25, 140), 1)
+        self.rooms = max(1, round(self.size / 28 * 2) / 2)
+        self.price = round(self.size * rng.uniform(11, 19))
+        self.additional_costs = round(self.size * rng.uniform(2, 4))
+        self.heating_included = rng.random() < 0.6
+        self.heating_costs = 0 if self.heating_included else round(self.size * rng.uniform(0.8, 1.5))
+        self.total_rent = self.price + self.additional_costs + self.heating_costs
+        self.deposit = self.price * 3
+        self.total_stories = rng.randint(2, 8)
+        self.story = rng.randint(0, self.total_stories)
+        postcode, district = DISTRICTS[number % len(DISTRICTS)]
+        self.street = f"{STREETS[number % len(STREETS)]} {rng.randint(1, 120)}"
+        self.district = f"{postcode} Stuttgart, {district}"
+        self.title = f"Helle {german_number(self.rooms, 1 if self.rooms % 1 else 0)}-Zimmer-Wohnung in Stuttgart-{district}"
+
+
+class MockListingSite:
+    # Generates search-result and exposé pages with the markup the scraper's selectors expect.
+    # Latency, failures, CAPTCHAs and consent overlays are configurable and seeded, so two runs
+    # against the same settings see the same site.
+    def __init__(self, listings=200, per_page=20, latency_ms=50, jitter_ms=20, failure_rate=0.0,
+                 captcha_rate=0.0, consent=False, validators=True, seed=1):
+        rng = random.Random(seed)
+        self.listings = [MockListing(number, rng) for number in range(listings)]
+        self.by_id = {listing.expose_id: listing for listing in self.listings}
+        self.per_page = per_page
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.captcha_rate = captcha_rate
+        self.consent = consent
+        # Without validators the site sends no ETag and never answers 304, like servers that do not
+        self.validators = validators
+        self._rng = random.Random(seed + 1)
+        self._lock = threading.Lock()
+        # A CAPTCHA is shown at most once per URL; the reload after "solving" it gets the page
+        self._challenged = set()
+        self.requests = 0
+        self.failures = 0
+        self.captchas = 0
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def search_url(self, equipment=None):
+        query = f"?equipment={equipment}" if equipment else ""
+        return f"{self.base_url}{SEARCH_PATH}{query}"
+
+    def _roll(self, rate):
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _delay(self):
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+
+    def respond(self, path, query, cookie=''):
+        # Returns (status, html)
+        with self._lock:
+            self.requests += 1
+        self._delay()
+        if self._roll(self.failure_rate):
+            with self._lock:
+                self.failures += 1
+            return 500, self.error_page()
+
+        match = re.fullmatch(r'/expose/(\d+)/?', path)
+        if match:
+            listing = self.by_id.get(match.group(1))
+            if listing is None:
+                return 404, self.not_found_page()
+            if self._challenge(path):
+                return 200, self.captcha_page()
+            if self.consent and CONSENT_COOKIE not in cookie:
+                return 200, self.consent_page()
+            return 200, self.expose_page(listing)
+        if path.rstrip('/') == SEARCH_PATH:
+            page_number = int(query.get('pagenumber', ['1'])[0])
+            equipment = {item for value in query.get('equipment', []) for item in value.split(',') if item}
+            if self._challenge(f"{path}?{sorted(equipment)}&{page_number}"):
+                return 200, self.captcha_page()
+            if self.consent and CONSENT_COOKIE not in cookie:
+                return 200, self.consent_page()
+            return 200, self.search_page(page_number, equipment)
+        return 404, self.not_found_page()
+
+    def reprice(self, expose_id, price):
+        # Changes the cold rent of one listing, as a landlord would
+        listing = self.by_id[expose_id]
+        listing.total_rent += price - listing.price
+        listing.price = price
+
+    def delist(self, expose_id):
+        # The exposé answers 404 from now on
+        listing = self.by_id.pop(expose_id)
+        self.listings.remove(listing)
+
+    def _challenge(self, key):
+        if not self.captcha_rate:
+            return False
+        with self._lock:
+            if key in self._challenged:
+                return False
+            self._challenged.add(key)
+        if self._roll(self.captcha_rate):
+            with self._lock:
+                self.captchas += 1
+            return True
+        return False
+
+    def matching(self, equipment):
+        return [listing for listing in self.listings
+                if ("parking" not in equipment or listing.parking) and ("balcony" not in equipment or listing.balcony)]
+
+    def document(self, title, body):
+        return (f"<!DOCTYPE html>\n<html lang=\"de\"><head><meta charset=\"utf-8\"><title>{escape(title)}</title>"
+                f"</head>\n<body>{body}\n</body></html>")
+
+    def search_page(self, page_number, equipment):
+        matching = self.matching(equipment)
+        page_count = max(1, -(-len(matching) // self.per_page))
+        start = (page_number - 1) * self.per_page
+        query = f"equipment={','.join(sorted(equipment))}&" if equipment else ""
+        cards = []
+        for listing in matching[start:start + self.per_page]:
+            cards.append(f"""
+<article data-item="result" data-obid="{listing.expose_id}">
+  <h2><a class="result-list-entry__brand-title-container" data-exp-id="{listing.expose_id}"
+         href="/expose/{listing.expose_id}">{escape(listing.title)}</a></h2>
+  <button class="result-list-entry__map-link">{escape(listing.street)}, {escape(listing.district)}</button>
+  <dl class="result-list-entry__primary-criterion"><dd>{german_number(listing.price)} €</dd><dt>Kaltmiete</dt></dl>
+  <dl class="result-list-entry__primary-criterion"><dd>{german_number(listing.size, 1)} m²</dd><dt>Wohnfläche</dt></dl>
+  <dl class="result-list-entry__primary-criterion"><dd>{german_number(listing.rooms, 1)}</dd><dt>Zimmer</dt></dl>
+</article>""")
+        pagination = "".join(f'<a href="{SEARCH_PATH}?{query}pagenumber={number}">{number}</a>'
+                             for number in range(1, page_count + 1))
+        body = (f'<h1><span data-is24-qa="resultlist-resultCount">{german_number(len(matching))}</span> '
+                f'Wohnungen zur Miete in Stuttgart</h1>\n<main>{"".join(cards)}\n</main>\n<nav>{pagination}</nav>')
+        return self.document("Wohnung mieten in Stuttgart", body)
+
+    def expose_page(self, listing):
+        if listing.heating_included:
+            heating = "in Nebenkosten enthalten"
+        else:
+            heating = f"{german_number(listing.heating_costs)} € nicht in Nebenkosten enthalten"
+        body = f"""
+<h1 id="expose-title">{escape(listing.title)}</h1>
+<div class="address-block"><span>{escape(listing.street)},</span>
+<span>{escape(listing.district)}</span></div>
+<dl><dt>Kaltmiete</dt><dd class="is24qa-kaltmiete">{german_number(listing.price)} €</dd></dl>
+<dl><dt>Wohnfläche</dt><dd class="is24qa-flaeche-main">{german_number(listing.size, 1)} m²</dd></dl>
+<dl><dt>Zimmer</dt><dd class="is24qa-zimmer">{german_number(listing.rooms, 1)}</dd></dl>
+<dl><dt>Etage</dt><dd class="is24qa-etage">{listing.story} von {listing.total_stories}</dd></dl>
+<dl><dt>Nebenkosten</dt><dd class="is24qa-nebenkosten">{german_number(listing.additional_costs)} €</dd></dl>
+<dl><dt>Heizkosten</dt><dd class="is24qa-heizkosten">{heating}</dd></dl>
+<dl><dt>Gesamtmiete</dt><dd class="is24qa-warmmiete-main">{german_number(listing.total_rent)} €</dd></dl>
+<dl><dt>Kaution</dt><dd class="is24qa-kaution-o-genossenschaftsanteile">{german_number(listing.deposit)} €</dd></dl>
+<p>{"Tiefgaragenstellplatz. " if listing.parking else ""}{"Südbalkon. " if listing.balcony else ""}
+Die Wohnung liegt ruhig und ist gut an den öffentlichen Nahverkehr angebunden.</p>"""
+        return self.document(listing.title, body)
+
+    def consent_page(self):
+        # The content only renders once the consent cookie is set, like behind the real banner
+        body = f"""
+<div id="uc-fading-wrapper" style="position:fixed;inset:0;background:rgba(0,0,0,.4)">
+  <button onclick="document.cookie='{CONSENT_COOKIE}; path=/'; location.reload()">Alle akzeptieren</button>
+</div>"""
+        return self.document("Wohnungen in Stuttgart - ImmobilienScout24", body)
+
+    def captcha_page(self):
+        body = """
+<h1>Ich bin kein Roboter</h1>
+<div id="captcha-box" class="g-recaptcha" style="width:300px;height:80px"></div>"""
+        return self.document("Ich bin kein Roboter - ImmobilienScout24", body)
+
+    def error_page(self):
+        return self.document("Internal Server Error", "<h1>Internal Server Error</h1>")
+
+    def not_found_page(self):
+        return self.document("Seite nicht gefunden", "<h1>Seite nicht gefunden</h1>")
+
+    def start(self, host='127.0.0.1', port=0):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                status, html = site.respond(parsed.path, parse_qs(parsed.query), self.headers.get('Cookie', ''))
+                body = html.encode('utf-8')
+                # Strong validator over the body, so conditional requests get a 304 for unchanged pages
+                etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+                if site.validators and status == 200 and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if site.validators and status == 200:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def stats(self):
+        return {"requests": self.requests, "failures": self.failures, "captchas": self.captchas}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve a synthetic listing site for local testing.")
+    parser.add_argument('--port', type=int, default=8024)
+    parser.add_argument('--listings', type=int, default=200)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--captcha-rate', type=float, default=0.0)
+    parser.add_argument('--consent', action='store_true')
+    parser.add_argument('--no-validators', dest='validators', action='store_false',
+                        help="send no ETag, so conditional requests always get the full page")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    site = MockListingSite(args.listings, args.per_page, args.latency_ms, args.jitter_ms, args.failure_rate,
+                           args.captcha_rate, args.consent, args.validators).start(port=args.port)
+    print(f"Mock listing site running at {site.search_url()}. Press Ctrl+C to stop.")
+    try:
+        site.thread.join()
+    except KeyboardInterrupt:
+        site.stop()
@@ -0,0 +1,322 @@
+# monitor.py
+#
+# Watches exposés for changes. Each pass sends one conditional request per exposé
+# (If-None-Match / If-Modified-Since); only a changed page is parsed, and only an actual change in
+# the extracted fields is reported. Exposés served without validators are first compared with their
+# search result cards, so only the ones whose card differs are downloaded. Events go to a JSONL stream:
+#   python monitor.py                 # exposés from watchlist.txt, every MONITOR_INTERVAL_SECONDS
+#   python monitor.py --all --once    # one pass over every scraped exposé in the crawl store
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from config import (BASE_URL, CRAWL_DB_PATH, FIELDS_TO_FETCH, EXPOSE_READY_SELECTOR, WATCHLIST_PATH,
+                    MONITOR_INTERVAL_SECONDS, MONITOR_EVENTS_PATH, MONITOR_CONCURRENCY, SEARCH_CONFIGS,
+                    SEARCH_READY_SELECTOR, CARD_FIELDS_TO_FETCH, MONITOR_CARD_PAGES, MONITOR_FULL_CHECK_HOURS)
+from crawl_store import CrawlStore, content_hash
+from discovery import card_values, search_page_url
+from extraction import normalise_listing, expose_id_from_url, parse_german_number
+from http_fetcher import HttpClient
+from metrics import run_metrics
+from output_sinks import JsonlSink, RECORD_COLUMNS
+from rate_control import rate_controller
+from session_pool import load_storage_state
+from static_html import parse_html, extract_raw_fields_html, extract_cards_html, classify_html, query_selector_all
+
+# Pages saying the exposé is gone, even though they come back with status 200
+DELISTED_KEYWORDS = ["nicht mehr verfügbar", "wurde deaktiviert", "seite nicht gefunden", "page not found"]
+# Fields with an event of their own; other changed fields are reported as "field_change"
+RENT_FIELDS = ("total_rent", "additional_costs", "heating_costs")
+# Fields a search result card shows, compared by the card probe
+CARD_FIELDS = ("price", "size", "rooms")
+
+
+class ProbeResult:
+    # What one conditional request found: "not_modified", "page" (with a record), "delisted" or
+    # "inconclusive" (CAPTCHA, block, JavaScript shell, network error)
+    def __init__(self, expose_id, url, kind, record=None, etag=None, last_modified=None, reason=None):
+        self.expose_id = expose_id
+        self.url = url
+        self.kind = kind
+        self.record = record
+        self.etag = etag
+        self.last_modified = last_modified
+        self.reason = reason
+
+
+def expose_url(expose_id):
+    return f"{BASE_URL}/expose/{expose_id}"
+
+
+def load_watchlist(path=WATCHLIST_PATH):
+    # One exposé ID or URL per line; blank lines and # comments are ignored
+    if not os.path.exists(path):
+        raise Exception(f"Watchlist '{path}' not found. Add one exposé ID or URL per line.")
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line.split('#')[0].strip() for line in f]
+    return [expose_id_from_url(line) for line in lines if line]
+
+
+def is_delisted(response, root):
+    # A removed exposé may redirect to the search results
+    if '/expose/' not in urlparse(response.url).path:
+        return True
+    headline = " ".join(element.text_content() for element in query_selector_all(root, 'title, h1')).lower()
+    return any(keyword in headline for keyword in DELISTED_KEYWORDS)
+
+
+def probe(client, expose_id, url, etag=None, last_modified=None):
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    rate_controller.pace()
+    started = time.perf_counter()
+    try:
+        with run_metrics.span("monitor_probe"):
+            response = client.request(url, headers=headers)
+    except Exception as e:
+        rate_controller.record((time.perf_counter() - started) * 1000, "error")
+        return ProbeResult(expose_id, url, "inconclusive", reason=str(e))
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    if response.status == 304:
+        rate_controller.record(latency_ms, "ok")
+        return ProbeResult(expose_id, url, "not_modified", etag=etag, last_modified=last_modified)
+    if response.status in (404, 410):
+        rate_controller.record(latency_ms, "ok")
+        return ProbeResult(expose_id, url, "delisted")
+    if response.status != 200:
+        rate_controller.record(latency_ms, "error")
+        return ProbeResult(expose_id, url, "inconclusive", reason=f"status {response.status}")
+
+    root = parse_html(response.text)
+    if is_delisted(response, root):
+        rate_controller.record(latency_ms, "ok")
+        return ProbeResult(expose_id, url, "delisted")
+    state = classify_html(url, root, EXPOSE_READY_SELECTOR)
+    if state.verdict != "normal":
+        rate_controller.record(latency_ms, state.verdict if state.verdict in ("captcha", "blocked") else "error")
+        return ProbeResult(expose_id, url, "inconclusive", reason=state.verdict)
+    rate_controller.record(latency_ms, "ok")
+    with run_metrics.span("extraction"):
+        raw = extract_raw_fields_html(root, FIELDS_TO_FETCH)
+    with run_metrics.span("parsing"):
+        record = normalise_listing(url, raw)
+    return ProbeResult(expose_id, url, "page", record, response.headers.get('etag'),
+                       response.headers.get('last-modified'))
+
+
+def stored_number(value):
+    # Records keep money fields as floats and rooms as the page text
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return parse_german_number(value) if isinstance(value, str) else None
+
+
+def card_matches(card, record):
+    # An unknown value on either side cannot confirm anything, so the exposé is fetched
+    values = card_values(card)
+    return all(values[field] is not None and values[field] == stored_number(record.get(field))
+               for field in CARD_FIELDS)
+
+
+def needs_card_probe(row, now):
+    # Scraped exposés without validators whose full record is recent enough to lean on the cards
+    return (row['status'] == 'scraped' and row['data'] and not row['etag'] and not row['last_modified']
+            and (row['last_extracted_at'] or 0) >= now - MONITOR_FULL_CHECK_HOURS * 3600)
+
+
+def search_cards(client, search_url, page_number):
+    # The result cards of one search page, or None when the page could not be read without a browser
+    url = search_page_url(search_url, page_number)
+    rate_controller.pace()
+    started = time.perf_counter()
+    try:
+        with run_metrics.span("monitor_card_probe"):
+            response = client.request(url)
+    except Exception:
+        rate_controller.record((time.perf_counter() - started) * 1000, "error")
+        return None
+    latency_ms = (time.perf_counter() - started) * 1000
+    if response.status != 200:
+        rate_controller.record(latency_ms, "error")
+        return None
+    root = parse_html(response.text)
+    state = classify_html(url, root, SEARCH_READY_SELECTOR)
+    rate_controller.record(latency_ms, state.verdict if state.verdict in ("captcha", "blocked") else "ok")
+    if state.verdict != "normal":
+        return None
+    return extract_cards_html(root, response.url, CARD_FIELDS_TO_FETCH)
+
+
+def diff_records(old, new):
+    # (field, old value, new value) for every field whose value changed
+    return [(field, old.get(field), new.get(field)) for field in RECORD_COLUMNS
+            if field != "url" and old.get(field) != new.get(field)]
+
+
+def change_events(expose_id, url, changes):
+    events = []
+    for field, old, new in changes:
+        if field == "price" and isinstance(old, (int, float)) and isinstance(new, (int, float)):
+            event = "price_drop" if new < old else "price_increase"
+        elif field in RENT_FIELDS:
+            event = "rent_change"
+        else:
+            event = "field_change"
+        events.append({"event": event, "expose_id": expose_id, "url": url, "field": field, "old": old, "new": new})
+    return events
+
+
+class Monitor:
+    def __init__(self, store, events, client=None, concurrency=MONITOR_CONCURRENCY, search_urls=SEARCH_CONFIGS,
+                 card_pages=MONITOR_CARD_PAGES):
+        self.store = store
+        self.events = events
+        self.client = client or HttpClient(load_storage_state())
+        self.concurrency = concurrency
+        self.search_urls = search_urls
+        self.card_pages = card_pages
+
+    def emit(self, event):
+        event["at"] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.events.write(event)
+        run_metrics.count(f"monitor_{event['event']}")
+        print(f"{event['event']}: {event['url']}" + (f" {event['field']} {event['old']} -> {event['new']}"
+                                                    if "field" in event else ""))
+
+    def watch(self, expose_ids):
+        # Exposés the crawl has never seen are added without equipment flags
+        known = self.store.watched_listings(expose_ids)
+        missing = [(expose_url(expose_id), {"parking": False, "balcony": False})
+                   for expose_id in expose_ids if expose_id not in known]
+        if missing:
+            self.store.record_discovered(missing)
+            known = self.store.watched_listings(expose_ids)
+        return known
+
+    def card_probe(self, rows):
+        # IDs of the given exposés whose search result card still shows the stored values. Pages are
+        # read until every exposé has been seen or a configuration runs out of results; exposés that
+        # are not found, or whose card differs, get the full probe.
+        unseen = dict(rows)
+        confirmed = set()
+        for search_url in self.search_urls:
+            for page_number in range(1, self.card_pages + 1):
+                if not unseen:
+                    return confirmed
+                cards = search_cards(self.client, search_url, page_number)
+                if not cards:
+                    break
+                for card in cards:
+                    row = unseen.pop(card.get("expose_id"), None)
+                    if row is not None and card_matches(card, json.loads(row['data'])):
+                        confirmed.add(row['expose_id'])
+        return confirmed
+
+    def run_pass(self, expose_ids=None):
+        # Probes run in threads; all store writes and events happen here, on the store's thread
+        rows = self.watch(expose_ids) if expose_ids is not None else self.store.watched_listings()
+        counts = {"not_modified": 0, "card_unchanged": 0, "unchanged": 0, "changed": 0, "new": 0, "delisted": 0,
+                  "relisted": 0, "inconclusive": 0}
+        started = time.perf_counter()
+        bytes_before = self.client.bytes_received
+
+        now = time.time()
+        unvalidated = {expose_id: row for expose_id, row in rows.items() if needs_card_probe(row, now)}
+        if unvalidated and self.card_pages:
+            for expose_id in self.card_probe(unvalidated):
+                self.store.record_check(rows.pop(expose_id)['url'])
+                counts["card_unchanged"] += 1
+
+        def run_probe(row):
+            return probe(self.client, row['expose_id'], row['url'], row['etag'], row['last_modified'])
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for result in executor.map(run_probe, rows.values()):
+                counts[self.apply(rows[result.expose_id], result)] += 1
+
+        elapsed = time.perf_counter() - started
+        print(f"Checked {sum(counts.values())} exposés in {elapsed:.1f}s "
+              f"({(self.client.bytes_received - bytes_before) / 1024:.0f} KB): {counts}")
+        return counts
+
+    def apply(self, row, result):
+        link = row['url']
+        if result.kind == "inconclusive":
+            print(f"Could not check {link} ({result.reason}). Trying again next pass.")
+            return "inconclusive"
+        if result.kind == "delisted":
+            if row['status'] != 'delisted':
+                self.store.mark_delisted(link)
+                self.emit({"event": "delisted", "expose_id": result.expose_id, "url": link})
+                return "delisted"
+            return "unchanged"
+        if result.kind == "not_modified":
+            self.store.record_check(link, result.etag, result.last_modified)
+            return "not_modified"
+
+        record = result.record
+        if record is None:
+            # Page loaded but no usable record (normalise_listing rejected it); keep the stored one
+            self.store.record_check(link, result.etag, result.last_modified)
+            return "unchanged"
+        record['parking'] = bool(row['parking'])
+        record['balcony'] = bool(row['balcony'])
+        old = json.loads(row['data']) if row['data'] else None
+        relisted = row['status'] == 'delisted'
+        if relisted:
+            self.emit({"event": "relisted", "expose_id": result.expose_id, "url": link})
+        if old is None:
+            self.store.mark_checked(link, record, result.etag, result.last_modified)
+            self.emit({"event": "new", "expose_id": result.expose_id, "url": link, "record": record})
+            return "new"
+        if content_hash(record) == row['content_hash'] and not relisted:
+            self.store.record_check(link, result.etag, result.last_modified)
+            return "unchanged"
+        # Also stores a relisted exposé as scraped again, so that its next removal is reported
+        self.store.mark_checked(link, record, result.etag, result.last_modified)
+        events = change_events(result.expose_id, link, diff_records(old, record))
+        for event in events:
+            self.emit(event)
+        return "changed" if events else "relisted"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch exposés for price changes and removals.")
+    parser.add_argument('--watchlist', default=WATCHLIST_PATH, help="file with one exposé ID or URL per line")
+    parser.add_argument('--all', action='store_true', help="watch every scraped exposé in the crawl store")
+    parser.add_argument('--once', action='store_true', help="run a single pass and exit")
+    parser.add_argument('--interval', type=float, default=MONITOR_INTERVAL_SECONDS, help="seconds between passes")
+    parser.add_argument('--events', default=MONITOR_EVENTS_PATH, help="JSONL file the events are appended to")
+    args = parser.parse_args()
+
+    expose_ids = None if args.all else load_watchlist(args.watchlist)
+    store = CrawlStore(CRAWL_DB_PATH)
+    events = JsonlSink(args.events, rotate_bytes=None)
+    monitor = Monitor(store, events)
+    try:
+        while True:
+            started = time.time()
+            monitor.run_pass(expose_ids)
+            if args.once:
+                break
+            wait = max(0.0, args.interval - (time.time() - started))
+            print(f"Next pass in {wait:.0f}s.")
+            time.sleep(wait)
+    except KeyboardInterrupt:
+        print("Monitoring stopped.")
+    finally:
+        events.close()
+        store.close()
+        monitor.client.close()
+
+
+if __name__ == "__main__":
+    main()
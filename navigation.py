@@ -0,0 +1,120 @@
+# navigation.py
+
+import json
+import time
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+from config import NAVIGATION_TIMEOUT, READY_TIMEOUT, CAPTCHA_MARKER_SELECTOR
+from metrics import run_metrics
+
+
+class NavigationLog:
+    # Per-URL record of how long the navigation and the readiness wait took
+    def __init__(self):
+        self.entries = []
+
+    def record(self, url, load_ms, ready_ms, ready):
+        self.entries.append({
+            "url": url,
+            "load_ms": round(load_ms, 1),
+            "ready_ms": round(ready_ms, 1),
+            "ready": ready,
+        })
+
+    def summary(self):
+        if not self.entries:
+            return {"navigations": 0}
+        load = [entry["load_ms"] for entry in self.entries]
+        ready = [entry["ready_ms"] for entry in self.entries]
+        return {
+            "navigations": len(self.entries),
+            "not_ready": sum(1 for entry in self.entries if not entry["ready"]),
+            "total_wait_s": round((sum(load) + sum(ready)) / 1000, 1),
+            "avg_load_ms": round(sum(load) / len(load), 1),
+            "avg_ready_ms": round(sum(ready) / len(ready), 1),
+            "max_ready_ms": max(ready),
+        }
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"summary": self.summary(), "entries": self.entries}, f, ensure_ascii=False, indent=2)
+
+
+navigation_log = NavigationLog()
+
+
+def record_navigation(url, started, loaded, finished, ready, reload):
+    navigation_log.record(url, (loaded - started) * 1000, (finished - loaded) * 1000, ready)
+    run_metrics.observe("navigation", (loaded - started) * 1000)
+    run_metrics.observe("ready_wait", (finished - loaded) * 1000)
+    if reload:
+        run_metrics.count("retries")
+    if not ready:
+        run_metrics.count("not_ready")
+
+
+def ready_or_captcha(ready_selector):
+    # Resolves as soon as either the content or a CAPTCHA marker is attached
+    return f"{ready_selector}, {CAPTCHA_MARKER_SELECTOR}"
+
+
+def wait_until_ready(page, ready_selector, timeout=READY_TIMEOUT):
+    try:
+        page.wait_for_selector(ready_or_captcha(ready_selector), state="attached", timeout=timeout)
+    except PlaywrightTimeoutError:
+        return False
+    return page.query_selector(ready_selector) is not None
+
+
+def wait_for_solution(page, ready_selector, seconds):
+    # Waits across navigations for the content, i.e. for a human to get past a challenge in this tab
+    if seconds > 0:
+        try:
+            page.wait_for_selector(ready_selector, state="attached", timeout=seconds * 1000)
+        except PlaywrightTimeoutError:
+            return False
+    return page.query_selector(ready_selector) is not None
+
+
+def navigate(page, url, ready_selector, reload=False):
+    started = time.perf_counter()
+    if reload:
+        page.reload(wait_until="domcontentloaded", timeout=NAVIGATION_TIMEOUT)
+    else:
+        page.goto(url, wait_until="domcontentloaded", timeout=NAVIGATION_TIMEOUT)
+    loaded = time.perf_counter()
+    ready = wait_until_ready(page, ready_selector)
+    finished = time.perf_counter()
+    record_navigation(url, started, loaded, finished, ready, reload)
+    return ready
+
+
+async def wait_until_ready_async(page, ready_selector, timeout=READY_TIMEOUT):
+    try:
+        await page.wait_for_selector(ready_or_captcha(ready_selector), state="attached", timeout=timeout)
+    except PlaywrightTimeoutError:
+        return False
+    return await page.query_selector(ready_selector) is not None
+
+
+async def wait_for_solution_async(page, ready_selector, seconds):
+    if seconds > 0:
+        try:
+            await page.wait_for_selector(ready_selector, state="attached", timeout=seconds * 1000)
+        except PlaywrightTimeoutError:
+            return False
+    return await page.query_selector(ready_selector) is not None
+
+
+async def navigate_async(page, url, ready_selector, reload=False):
+    started = time.perf_counter()
+    if reload:
+        await page.reload(wait_until="domcontentloaded", timeout=NAVIGATION_TIMEOUT)
+    else:
+        await page.goto(url, wait_until="domcontentloaded", timeout=NAVIGATION_TIMEOUT)
+    loaded = time.perf_counter()
+    ready = await wait_until_ready_async(page, ready_selector)
+    finished = time.perf_counter()
+    record_navigation(url, started, loaded, finished, ready, reload)
+    return ready
@@ -0,0 +1,65 @@
+# network_routes.py
+
+import glob
+import itertools
+import os
+import time
+
+from config import NETWORK_MODE, HAR_DIR, BLOCK_RESOURCES, FAST_PATH_ENABLED
+from metrics import run_metrics
+from resource_blocker import resource_blocker
+
+_har_counter = itertools.count(1)
+
+
+def recording_path():
+    # One HAR per context; contexts are written out when they close
+    os.makedirs(HAR_DIR, exist_ok=True)
+    return os.path.join(HAR_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_har_counter)}.har")
+
+
+def recorded_hars():
+    hars = sorted(glob.glob(os.path.join(HAR_DIR, '*.har')))
+    if not hars:
+        raise Exception(f"NETWORK_MODE is 'replay' but there are no recordings in '{HAR_DIR}'.")
+    return hars
+
+
+def fast_path_active():
+    # Plain HTTP bypasses the browser, so it would neither be recorded nor be served from a replay
+    return FAST_PATH_ENABLED and NETWORK_MODE == "live"
+
+
+def abort_route(route):
+    route.abort()
+
+
+async def abort_route_async(route):
+    await route.abort()
+
+
+def install_network_routes(context):
+    run_metrics.watch_context(context)
+    # Handlers registered later run first, so the catch-all abort goes in before the recordings
+    if NETWORK_MODE == "replay":
+        context.route("**/*", abort_route)
+        for har in recorded_hars():
+            context.route_from_har(har, not_found="fallback")
+        return
+    if BLOCK_RESOURCES:
+        resource_blocker.install(context)
+    if NETWORK_MODE == "record":
+        context.route_from_har(recording_path(), update=True)
+
+
+async def install_network_routes_async(context):
+    run_metrics.watch_context(context)
+    if NETWORK_MODE == "replay":
+        await context.route("**/*", abort_route_async)
+        for har in recorded_hars():
+            await context.route_from_har(har, not_found="fallback")
+        return
+    if BLOCK_RESOURCES:
+        await resource_blocker.install_async(context)
+    if NETWORK_MODE == "record":
+        await context.route_from_har(recording_path(), update=True)
@@ -0,0 +1,188 @@
+# output_sinks.py
+
+import csv
+import gzip
+import json
+import os
+import shutil
+import time
+
+from config import (OUTPUT_SINKS, JSONL_OUTPUT_PATH, JSONL_ROTATE_BYTES, JSON_OUTPUT_PATH, CSV_OUTPUT_PATH,
+                    PARQUET_OUTPUT_PATH, PARQUET_BATCH_SIZE)
+
+# Column order for the tabular exports, with the type each value is coerced to
+RECORD_COLUMNS = {
+    "url": str,
+    "title": str,
+    "price": float,
+    "size": float,
+    "size_unit": str,
+    "rooms": str,
+    "story": int,
+    "total_stories": int,
+    "address": str,
+    "additional_costs": float,
+    "heating_expenses_excluded": bool,
+    "heating_costs": float,
+    "total_rent": float,
+    "total_rent_estimated": bool,
+    "deposit": float,
+    "parking": bool,
+    "balcony": bool,
+}
+
+
+class JsonlSink:
+    # Append-only, one record per line, flushed after every record. It keeps the records of earlier
+    # runs, so listings reused from the crawl store are not written to it again.
+    snapshot = False
+
+    def __init__(self, path=JSONL_OUTPUT_PATH, rotate_bytes=JSONL_ROTATE_BYTES):
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        if self.rotate_bytes and self.file.tell() >= self.rotate_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        archive_path = f"{self.path}.{stamp}.gz"
+        suffix = 1
+        while os.path.exists(archive_path):
+            archive_path = f"{self.path}.{stamp}-{suffix}.gz"
+            suffix += 1
+        with open(self.path, 'rb') as source, gzip.open(archive_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(self.path)
+        print(f"Rotated '{self.path}' into '{archive_path}'")
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        self.file.close()
+
+
+class JsonArraySink:
+    # Writes the classic pretty-printed list, streamed record by record
+    snapshot = True
+
+    def __init__(self, path=JSON_OUTPUT_PATH):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+        self.file.write("[")
+        self.count = 0
+
+    def write(self, record):
+        separator = ",\n" if self.count else "\n"
+        self.file.write(separator + json.dumps(record, ensure_ascii=False, indent=2))
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        self.file.write("\n]" if self.count else "]")
+        self.file.close()
+
+
+def coerce(value, column_type):
+    # Tabular columns are typed; "Error" markers and unparsable values become empty cells
+    if value is None or isinstance(value, column_type):
+        return value
+    if column_type is bool or isinstance(value, str):
+        # bool("Error") and float("720") would turn a marker or raw text into a plausible value
+        return None
+    try:
+        return column_type(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CsvSink:
+    snapshot = True
+
+    def __init__(self, path=CSV_OUTPUT_PATH):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=list(RECORD_COLUMNS), extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow({column: coerce(record.get(column), column_type)
+                              for column, column_type in RECORD_COLUMNS.items()})
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    # Buffers a bounded batch of rows and writes it as one Parquet row group
+    snapshot = True
+
+    def __init__(self, path=PARQUET_OUTPUT_PATH, batch_size=PARQUET_BATCH_SIZE):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception("The parquet output sink needs pyarrow. Install it with 'pip install pyarrow'.")
+        self.pa = pyarrow
+        arrow_types = {str: pyarrow.string(), float: pyarrow.float64(), int: pyarrow.int64(), bool: pyarrow.bool_()}
+        self.schema = pyarrow.schema([(column, arrow_types[column_type])
+                                      for column, column_type in RECORD_COLUMNS.items()])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.batch_size = batch_size
+        self.rows = []
+
+    def write(self, record):
+        self.rows.append({column: coerce(record.get(column), column_type)
+                          for column, column_type in RECORD_COLUMNS.items()})
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class MultiSink:
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def write(self, record):
+        for sink in self.sinks:
+            sink.write(record)
+
+    def write_reused(self, record):
+        # Records reused from the crawl store only go to the sinks that are rewritten every run
+        for sink in self.sinks:
+            if sink.snapshot:
+                sink.write(record)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+SINK_TYPES = {
+    "jsonl": JsonlSink,
+    "json": JsonArraySink,
+    "csv": CsvSink,
+    "parquet": ParquetSink,
+}
+
+
+def build_sink(names=OUTPUT_SINKS):
+    sinks = []
+    for name in names:
+        if name not in SINK_TYPES:
+            raise Exception(f"Unknown output sink '{name}'. Choose from: {', '.join(SINK_TYPES)}")
+        sinks.append(SINK_TYPES[name]())
+    return MultiSink(sinks)
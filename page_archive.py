@@ -0,0 +1,90 @@
+# page_archive.py
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from config import ARCHIVE_DIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetches (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fetches_url ON fetches (url, fetched_at);
+"""
+
+
+def object_path(root, sha256):
+    return os.path.join(root, 'objects', sha256[:2], f"{sha256}.html.gz")
+
+
+def load_object(root, sha256):
+    with gzip.open(object_path(root, sha256), 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+class PageArchive:
+    # Content-addressed: bodies are stored once per SHA-256, the index keeps every (url, time) fetch
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self.conn = None
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+
+    def _open(self):
+        if self.conn is None:
+            os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+            # Fast-path fetches store from worker threads, hence the shared connection behind a lock
+            self.conn = sqlite3.connect(os.path.join(self.root, 'index.db'), check_same_thread=False)
+            self.conn.executescript(SCHEMA)
+        return self.conn
+
+    def store(self, url, html, kind):
+        body = html.encode('utf-8')
+        sha256 = hashlib.sha256(body).hexdigest()
+        path = object_path(self.root, sha256)
+        with self._lock:
+            conn = self._open()
+            if os.path.exists(path):
+                self.deduplicated += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temporary_path = f"{path}.tmp"
+                with gzip.open(temporary_path, 'wb') as f:
+                    f.write(body)
+                os.replace(temporary_path, path)
+                self.stored += 1
+            with conn:
+                conn.execute("INSERT INTO fetches (url, kind, fetched_at, sha256, size) VALUES (?, ?, ?, ?, ?)",
+                             (url, kind, time.time(), sha256, len(body)))
+        return sha256
+
+    def latest(self, kind):
+        # Most recent fetch per URL: [(url, sha256, fetched_at)]
+        with self._lock:
+            rows = self._open().execute(
+                "SELECT url, sha256, MAX(fetched_at) FROM fetches WHERE kind = ? GROUP BY url ORDER BY url",
+                (kind,),
+            ).fetchall()
+        return rows
+
+    def summary(self):
+        return {"stored": self.stored, "deduplicated": self.deduplicated}
+
+    def close(self):
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+page_archive = PageArchive()
@@ -0,0 +1,130 @@
+# page_state.py
+
+from collections import namedtuple
+
+from config import CAPTCHA_MARKER_SELECTOR
+from metrics import run_metrics
+
+CAPTCHA_SELECTOR = CAPTCHA_MARKER_SELECTOR + ", [id*='captcha']:not([style*='display: none'])"
+CONSENT_SELECTOR = "#uc-fading-wrapper, [data-testid='uc-header-wrapper'], #usercentrics-root"
+CONSENT_BUTTON_TEXT = "Alle akzeptieren"
+CAPTCHA_KEYWORDS = ["captcha", "verify you're not a robot", "human verification", "ich bin kein roboter"]
+BLOCKED_KEYWORDS = ["access denied", "zugriff verweigert", "403 forbidden", "too many requests"]
+ERROR_KEYWORDS = ["seite nicht gefunden", "page not found", "internal server error", "service unavailable"]
+
+# One small probe instead of a selector round trip per check. Keywords are only matched against
+# the document title and headings, so the full body text is never serialised.
+PAGE_STATE_JS = """
+(probe) => {
+    const visible = (element) => {
+        const style = window.getComputedStyle(element);
+        if (style.display === 'none' || style.visibility === 'hidden') return false;
+        const rect = element.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0;
+    };
+    const headline = [document.title, ...Array.from(document.querySelectorAll('h1, h2, h3'), h => h.textContent)]
+        .join(' ').toLowerCase();
+    const mentions = (keywords) => keywords.some(keyword => headline.includes(keyword));
+    const consentButton = Array.from(document.querySelectorAll('button'))
+        .some(button => button.textContent.includes(probe.consentButtonText));
+    return {
+        ready: probe.readySelector ? document.querySelector(probe.readySelector) !== null : false,
+        captcha: Array.from(document.querySelectorAll(probe.captchaSelector)).some(visible)
+            || mentions(probe.captchaKeywords),
+        consent: document.querySelector(probe.consentSelector) !== null || consentButton,
+        blocked: mentions(probe.blockedKeywords),
+        error: mentions(probe.errorKeywords),
+        title: document.title,
+    };
+}
+"""
+
+PageState = namedtuple('PageState', ['verdict', 'url', 'title', 'ready', 'captcha', 'consent', 'blocked', 'error'])
+
+
+def probe_arguments(ready_selector):
+    return {
+        "readySelector": ready_selector,
+        "captchaSelector": CAPTCHA_SELECTOR,
+        "captchaKeywords": CAPTCHA_KEYWORDS,
+        "consentSelector": CONSENT_SELECTOR,
+        "consentButtonText": CONSENT_BUTTON_TEXT,
+        "blockedKeywords": BLOCKED_KEYWORDS,
+        "errorKeywords": ERROR_KEYWORDS,
+    }
+
+
+def page_state_from_probe(url, probe):
+    # A consent banner can sit on top of a normal page, so it ranks below the hard failures
+    if probe["captcha"]:
+        verdict = "captcha"
+    elif probe["blocked"]:
+        verdict = "blocked"
+    elif probe["error"]:
+        verdict = "error"
+    elif probe["consent"]:
+        verdict = "consent"
+    else:
+        verdict = "normal"
+    return PageState(verdict, url, probe["title"], probe["ready"], probe["captcha"], probe["consent"],
+                     probe["blocked"], probe["error"])
+
+
+class PageStateClassifier:
+    # Caches one verdict per page and navigation; main-frame navigations invalidate the entry
+    def __init__(self):
+        self._navigation = {}
+        self._cache = {}
+
+    def _track(self, page):
+        if page in self._navigation:
+            return
+        self._navigation[page] = 0
+
+        def on_navigated(frame):
+            if frame == page.main_frame:
+                self._navigation[page] = self._navigation.get(page, 0) + 1
+
+        def on_close(_):
+            self._navigation.pop(page, None)
+            self._cache.pop(page, None)
+
+        page.on("framenavigated", on_navigated)
+        page.on("close", on_close)
+
+    def _cached(self, page, ready_selector):
+        entry = self._cache.get(page)
+        if entry and entry[0] == (self._navigation.get(page), ready_selector):
+            return entry[1]
+        return None
+
+    def _store(self, page, ready_selector, probe):
+        state = page_state_from_probe(page.url, probe)
+        run_metrics.count(f"page_state_{state.verdict}")
+        self._cache[page] = ((self._navigation.get(page), ready_selector), state)
+        return state
+
+    def invalidate(self, page):
+        # For DOM changes that do not navigate, e.g. a dismissed consent banner
+        self._cache.pop(page, None)
+
+    def classify(self, page, ready_selector=None):
+        self._track(page)
+        state = self._cached(page, ready_selector)
+        if state is None:
+            with run_metrics.span("page_state"):
+                probe = page.evaluate(PAGE_STATE_JS, probe_arguments(ready_selector))
+            state = self._store(page, ready_selector, probe)
+        return state
+
+    async def classify_async(self, page, ready_selector=None):
+        self._track(page)
+        state = self._cached(page, ready_selector)
+        if state is None:
+            with run_metrics.span("page_state"):
+                probe = await page.evaluate(PAGE_STATE_JS, probe_arguments(ready_selector))
+            state = self._store(page, ready_selector, probe)
+        return state
+
+
+page_state_classifier = PageStateClassifier()
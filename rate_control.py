@@ -0,0 +1,150 @@
+# rate_control.py
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+from config import (ADAPTIVE_RATE, PER_HOST_RATE, PER_HOST_CONCURRENCY, MIN_RATE, MAX_RATE, RATE_INCREASE,
+                    RATE_DECREASE_FACTOR, SLOW_PAGE_MS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, BREAKER_WINDOW,
+                    BREAKER_MIN_SAMPLES, BREAKER_BLOCK_RATE, BREAKER_OPEN_SECONDS)
+from metrics import run_metrics
+
+# Outcomes reported per page: "ok", "error", "captcha" or "blocked"
+BLOCK_OUTCOMES = ("captcha", "blocked")
+
+
+def retry_delay(attempt, base=RETRY_BASE_DELAY, maximum=RETRY_MAX_DELAY):
+    # Exponential backoff with full jitter for the given retry (1 = first retry)
+    return random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
+
+
+class AdaptiveRateController:
+    # AIMD: every fast, clean page adds a little to the rate and the concurrency; an error, a block
+    # or a slow page cuts both by a factor. The crawl settles just below the point where the site
+    # starts pushing back.
+    def __init__(self, rate=PER_HOST_RATE, concurrency=PER_HOST_CONCURRENCY, adaptive=ADAPTIVE_RATE,
+                 min_rate=MIN_RATE, max_rate=MAX_RATE, increase=RATE_INCREASE, decrease=RATE_DECREASE_FACTOR,
+                 slow_ms=SLOW_PAGE_MS):
+        self.rate = rate
+        self.max_concurrency = concurrency
+        self.concurrency = float(concurrency)
+        self.adaptive = adaptive
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_ms = slow_ms
+        self.decreases = 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def concurrency_limit(self):
+        return max(1, int(self.concurrency))
+
+    @property
+    def interval(self):
+        return 1.0 / self.rate if self.rate else 0.0
+
+    def record(self, latency_ms, outcome):
+        if not self.adaptive:
+            return
+        with self._lock:
+            if outcome == "ok" and latency_ms < self.slow_ms:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency_limit)
+            else:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self.concurrency = max(1.0, self.concurrency * self.decrease)
+                self.decreases += 1
+                run_metrics.count("rate_decreases")
+            run_metrics.gauge("rate_per_second", self.rate)
+            run_metrics.gauge("concurrency_limit", self.concurrency_limit)
+
+    def pace(self):
+        # For the sequential loop: blocks until the next request may start
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot)
+            self._next_slot = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def summary(self):
+        return {
+            "rate_per_second": round(self.rate, 2),
+            "concurrency_limit": self.concurrency_limit,
+            "decreases": self.decreases,
+        }
+
+
+class CircuitBreaker:
+    # Tracks the last `window` outcomes per key (a session, a search configuration, the browser).
+    # When the share of CAPTCHAs and blocks crosses the threshold the key is paused for
+    # open_seconds; afterwards one trial page decides whether it closes again or stays open twice as long.
+    def __init__(self, window=BREAKER_WINDOW, min_samples=BREAKER_MIN_SAMPLES, block_rate=BREAKER_BLOCK_RATE,
+                 open_seconds=BREAKER_OPEN_SECONDS):
+        self.window = window
+        self.min_samples = min_samples
+        self.block_rate = block_rate
+        self.open_seconds = open_seconds
+        self._outcomes = {}
+        self._open_until = {}
+        self._open_for = {}
+        self._half_open = set()
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def _trip(self, key, seconds):
+        self._open_until[key] = time.time() + seconds
+        self._open_for[key] = seconds
+        self._outcomes[key].clear()
+        self.trips += 1
+        run_metrics.count("breaker_trips")
+        print(f"Circuit breaker opened for {key}: pausing it for {seconds:.0f} s.")
+
+    def record(self, key, outcome):
+        with self._lock:
+            outcomes = self._outcomes.setdefault(key, deque(maxlen=self.window))
+            blocked = outcome in BLOCK_OUTCOMES
+            if key in self._half_open:
+                self._half_open.discard(key)
+                if blocked:
+                    self._trip(key, self._open_for[key] * 2)
+                    return
+                self._open_for.pop(key, None)
+                print(f"Circuit breaker closed for {key}.")
+            outcomes.append(blocked)
+            if len(outcomes) >= self.min_samples and sum(outcomes) / len(outcomes) >= self.block_rate:
+                self._trip(key, self.open_seconds)
+
+    def remaining(self, key):
+        # Seconds the key stays paused; 0 once it may be tried again
+        with self._lock:
+            open_until = self._open_until.get(key)
+            if open_until is None:
+                return 0.0
+            remaining = open_until - time.time()
+            if remaining > 0:
+                return remaining
+            del self._open_until[key]
+            self._half_open.add(key)
+            return 0.0
+
+    def wait(self, key):
+        remaining = self.remaining(key)
+        if remaining:
+            time.sleep(remaining)
+            self.remaining(key)
+
+    async def wait_async(self, key):
+        remaining = self.remaining(key)
+        if remaining:
+            await asyncio.sleep(remaining)
+            self.remaining(key)
+
+
+rate_controller = AdaptiveRateController()
+circuit_breaker = CircuitBreaker()
@@ -0,0 +1,74 @@
+# reextract.py
+#
+# Re-runs the exposé field extraction over the raw page archive, without touching the network.
+# Useful after changing FIELDS_TO_FETCH or a normaliser: python reextract.py --workers 8
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config import ARCHIVE_DIR, FIELDS_TO_FETCH, EXPOSE_READY_SELECTOR, CRAWL_DB_PATH, REEXTRACT_OUTPUT_PATH
+from crawl_store import CrawlStore
+from extraction import normalise_listing, expose_id_from_url
+from output_sinks import JsonlSink
+from page_archive import PageArchive, load_object
+from static_html import parse_html, extract_raw_fields_html, classify_html
+
+
+def reextract_page(job):
+    url, sha256, archive_root = job
+    root = parse_html(load_object(archive_root, sha256))
+    state = classify_html(url, root, EXPOSE_READY_SELECTOR)
+    if state.verdict != "normal":
+        return url, None, state.verdict
+    return url, normalise_listing(url, extract_raw_fields_html(root, FIELDS_TO_FETCH)), state.verdict
+
+
+def load_equipment_flags():
+    if not os.path.exists(CRAWL_DB_PATH):
+        return {}
+    store = CrawlStore(CRAWL_DB_PATH)
+    try:
+        return store.equipment_flags()
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-extract exposé fields from the raw page archive.")
+    parser.add_argument('--archive', default=ARCHIVE_DIR, help="archive directory")
+    parser.add_argument('--output', default=REEXTRACT_OUTPUT_PATH, help="JSONL file to write the records to")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args()
+
+    archive = PageArchive(args.archive)
+    jobs = [(url, sha256, args.archive) for url, sha256, _ in archive.latest('expose')]
+    archive.close()
+    print(f"Re-extracting {len(jobs)} archived exposés with {args.workers} workers...")
+
+    flags = load_equipment_flags()
+    started = time.perf_counter()
+    written = 0
+    skipped = {}
+    # Truncate first; the JSONL sink appends
+    open(args.output, 'w').close()
+    sink = JsonlSink(args.output, rotate_bytes=None)
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for url, data, verdict in executor.map(reextract_page, jobs, chunksize=16):
+                if data is None:
+                    skipped[verdict] = skipped.get(verdict, 0) + 1
+                    continue
+                data.update(flags.get(expose_id_from_url(url), {}))
+                sink.write(data)
+                written += 1
+    finally:
+        sink.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {written} records to '{args.output}' in {elapsed:.1f}s. Skipped: {skipped or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# resource_blocker.py
+
+from collections import Counter
+
+from config import (BLOCKED_RESOURCE_TYPES, BLOCKED_URL_PATTERNS, ALLOWED_URL_PATTERNS,
+                    BLOCKED_BYTES_ESTIMATE)
+
+
+class ResourceBlocker:
+    # Aborts requests the scraper never needs and counts what it saved
+    def __init__(self, resource_types=BLOCKED_RESOURCE_TYPES, deny_patterns=BLOCKED_URL_PATTERNS,
+                 allow_patterns=ALLOWED_URL_PATTERNS, bytes_estimate=BLOCKED_BYTES_ESTIMATE):
+        self.resource_types = set(resource_types)
+        self.deny_patterns = list(deny_patterns)
+        self.allow_patterns = list(allow_patterns)
+        self.bytes_estimate = bytes_estimate
+        self.allowed_requests = 0
+        self.blocked_by_type = Counter()
+
+    def should_block(self, resource_type, url):
+        url = url.lower()
+        if any(pattern in url for pattern in self.allow_patterns):
+            return False
+        if resource_type in self.resource_types:
+            return True
+        return any(pattern in url for pattern in self.deny_patterns)
+
+    def _count(self, request):
+        if self.should_block(request.resource_type, request.url):
+            self.blocked_by_type[request.resource_type] += 1
+            return True
+        self.allowed_requests += 1
+        return False
+
+    def handle_route(self, route):
+        if self._count(route.request):
+            route.abort()
+        else:
+            # fallback() lets other handlers registered on the context still see the request
+            route.fallback()
+
+    async def handle_route_async(self, route):
+        if self._count(route.request):
+            await route.abort()
+        else:
+            await route.fallback()
+
+    def install(self, context):
+        context.route("**/*", self.handle_route)
+
+    async def install_async(self, context):
+        await context.route("**/*", self.handle_route_async)
+
+    def estimated_bytes_saved(self):
+        default = self.bytes_estimate.get("other", 0)
+        return sum(count * self.bytes_estimate.get(resource_type, default)
+                   for resource_type, count in self.blocked_by_type.items())
+
+    def summary(self):
+        blocked = sum(self.blocked_by_type.values())
+        return {
+            "blocked_requests": blocked,
+            "allowed_requests": self.allowed_requests,
+            "blocked_by_type": dict(self.blocked_by_type),
+            "estimated_bytes_saved": self.estimated_bytes_saved(),
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"Blocked {summary['blocked_requests']} of "
+              f"{summary['blocked_requests'] + summary['allowed_requests']} requests "
+              f"(~{summary['estimated_bytes_saved'] / 1024 / 1024:.1f} MB saved): {summary['blocked_by_type']}")
+
+
+resource_blocker = ResourceBlocker()
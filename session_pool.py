@@ -0,0 +1,97 @@
+# session_pool.py
+
+import json
+import os
+
+from config import STORAGE_STATE_PATH, SESSION_MAX_PAGES
+from network_routes import install_network_routes_async
+
+
+def load_storage_state():
+    # Prefer the full storage state; fall back to the plain cookie list of older cookie-saver runs
+    if os.path.exists(STORAGE_STATE_PATH):
+        with open(STORAGE_STATE_PATH, 'r') as f:
+            return json.load(f)
+    if os.path.exists('cookies.json'):
+        with open('cookies.json', 'r') as f:
+            return {"cookies": json.load(f), "origins": []}
+    print("No saved cookies found. Contexts start without a session.")
+    return None
+
+
+class Session:
+    def __init__(self, browser, headless, name="session"):
+        self.browser = browser
+        self.headless = headless
+        self.name = name
+        self.context = None
+        self.page = None
+        self.pages_served = 0
+        self.blocked = False
+        # Set when the memory watchdog finds the browser over its soft limit
+        self.over_memory = False
+
+
+class SessionPool:
+    # Pre-warmed contexts that share one saved storage state and are recycled after
+    # SESSION_MAX_PAGES pages, as soon as they get blocked or when the browser runs short of memory
+    def __init__(self, storage_state=None, max_pages=SESSION_MAX_PAGES):
+        self.storage_state = storage_state
+        self.max_pages = max_pages
+        self.sessions = []
+        self.rotations = 0
+
+    async def _open(self, session):
+        session.context = await session.browser.new_context(storage_state=self.storage_state)
+        await install_network_routes_async(session.context)
+        session.page = await session.context.new_page()
+        session.pages_served = 0
+        session.blocked = False
+        session.over_memory = False
+
+    async def start(self, headful_browser, headless_browser, size, headless_count=0):
+        headless_count = min(headless_count, size) if headless_browser else 0
+        for number in range(size):
+            headless = number < headless_count
+            session = Session(headless_browser if headless else headful_browser, headless,
+                              f"{'headless' if headless else 'headful'} session {number + 1}")
+            await self._open(session)
+            self.sessions.append(session)
+        print(f"Session pool ready: {size - headless_count} headful and {headless_count} headless sessions.")
+        return self.sessions
+
+    def has_headful(self):
+        return any(not session.headless for session in self.sessions)
+
+    async def rotate(self, session):
+        if session.blocked:
+            reason = "blocked"
+        elif session.over_memory:
+            reason = "memory limit"
+        else:
+            reason = f"{session.pages_served} pages served"
+        await session.context.close()
+        await self._open(session)
+        self.rotations += 1
+        print(f"Rotated a {'headless' if session.headless else 'headful'} session ({reason}).")
+
+    async def release(self, session):
+        session.pages_served += 1
+        if session.blocked or session.over_memory or session.pages_served >= self.max_pages:
+            await self.rotate(session)
+
+    async def replace_page(self, session):
+        # For pages that crashed or got stuck mid-navigation
+        try:
+            await session.page.close()
+        except Exception:
+            pass
+        session.page = await session.context.new_page()
+
+    async def close(self):
+        for session in self.sessions:
+            try:
+                await session.context.close()
+            except Exception:
+                pass
+        self.sessions = []
@@ -0,0 +1,393 @@
+# static_html.py
+
+import re
+from functools import lru_cache
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from page_state import (PageState, CAPTCHA_KEYWORDS, BLOCKED_KEYWORDS, ERROR_KEYWORDS, CONSENT_SELECTOR,
+                        CONSENT_BUTTON_TEXT)
+from config import CAPTCHA_MARKER_SELECTOR
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source",
+             "track", "wbr"}
+# Tags whose boundaries become line breaks in the approximated innerText
+BLOCK_TAGS = {"address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption", "figure",
+              "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p",
+              "pre", "section", "table", "tr", "ul"}
+HIDDEN_TAGS = {"script", "style", "noscript", "template", "head"}
+
+# HTML's implied end tags: a start tag closes the nearest open element of the listed tags, unless one
+# of the boundary tags is open in between (<li> closes the previous <li> of the same list, not of the
+# outer one). Start tag -> [(closed tags, boundary tags)]
+LIST_BOUNDARIES = {"ul", "ol", "menu", "dl", "table", "td", "th"}
+P_BOUNDARIES = {"button", "table", "td", "th", "caption", "template", "object"}
+P_CLOSERS = {"address", "article", "aside", "blockquote", "dd", "details", "div", "dl", "dt", "fieldset",
+             "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li",
+             "main", "menu", "nav", "ol", "p", "pre", "section", "table", "ul"}
+IMPLIED_END_TAGS = {
+    "li": [({"li"}, LIST_BOUNDARIES)],
+    "dt": [({"dt", "dd"}, LIST_BOUNDARIES)],
+    "dd": [({"dt", "dd"}, LIST_BOUNDARIES)],
+    "option": [({"option"}, {"select", "datalist", "optgroup"})],
+    "optgroup": [({"optgroup", "option"}, {"select", "datalist"})],
+    "tr": [({"tr", "td", "th"}, {"table", "thead", "tbody", "tfoot"})],
+    "td": [({"td", "th"}, {"tr", "table"})],
+    "th": [({"td", "th"}, {"tr", "table"})],
+    "thead": [({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"})],
+    "tbody": [({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"})],
+    "tfoot": [({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"})],
+}
+for _tag in P_CLOSERS:
+    IMPLIED_END_TAGS.setdefault(_tag, []).append(({"p"}, P_BOUNDARIES))
+
+# Without layout there is no visibility check, so any captcha element counts
+CAPTCHA_SELECTOR = CAPTCHA_MARKER_SELECTOR + ", [id*='captcha']"
+# Below this much visible text a page without the ready element is treated as a JS-only shell
+SHELL_TEXT_LENGTH = 500
+
+
+class Element:
+    __slots__ = ('tag', 'attrs', 'children', 'parent', 'index')
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+        self.index = None
+
+    @property
+    def classes(self):
+        return self.attrs.get('class', '').split()
+
+    def iter(self):
+        # Descendant elements in document order
+        stack = [child for child in reversed(self.children) if isinstance(child, Element)]
+        while stack:
+            element = stack.pop()
+            yield element
+            stack.extend(child for child in reversed(element.children) if isinstance(child, Element))
+
+    def inner_text(self):
+        parts = []
+        collect_text(self, parts)
+        text = "".join(parts)
+        lines = (re.sub(r'[ \t\r\f\v]+', ' ', line).strip() for line in text.split("\n"))
+        return "\n".join(line for line in lines if line)
+
+    def text_content(self):
+        return "".join(child if isinstance(child, str) else child.text_content() for child in self.children)
+
+
+def collect_text(element, parts):
+    for child in element.children:
+        if isinstance(child, str):
+            parts.append(child.replace("\n", " "))
+        elif child.tag not in HIDDEN_TAGS:
+            block = child.tag in BLOCK_TAGS
+            if block:
+                parts.append("\n")
+            collect_text(child, parts)
+            if block:
+                parts.append("\n")
+
+
+class TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element('#document', {}, None)
+        self.stack = [self.root]
+
+    def close_implied(self, tag):
+        for closed, boundaries in IMPLIED_END_TAGS.get(tag, ()):
+            # The outermost closable element before a boundary, so <tr> also closes the open <td>
+            match = None
+            for depth in range(len(self.stack) - 1, 0, -1):
+                current = self.stack[depth].tag
+                if current in closed:
+                    match = depth
+                elif current in boundaries:
+                    break
+            if match is not None:
+                del self.stack[match:]
+
+    def handle_starttag(self, tag, attrs):
+        self.close_implied(tag)
+        element = Element(tag, {name: value or '' for name, value in attrs}, self.stack[-1])
+        self.stack[-1].children.append(element)
+        if tag not in VOID_TAGS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.close_implied(tag)
+        self.stack[-1].children.append(Element(tag, {name: value or '' for name, value in attrs}, self.stack[-1]))
+
+    def handle_endtag(self, tag):
+        # Close up to the matching open element; stray end tags are ignored
+        for depth in range(len(self.stack) - 1, 0, -1):
+            if self.stack[depth].tag == tag:
+                del self.stack[depth:]
+                break
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+def parse_html(html):
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+# CSS subset used by the field maps: type, #id, .class, [attr], [attr=|*=|^=|$=value],
+# :nth-of-type(n), descendant and child combinators, and comma-separated groups
+TOKEN_RE = re.compile(r"""
+    (?P<ws>\s*>\s*|\s+)
+  | (?P<tag>[a-zA-Z][\w-]*|\*)
+  | \#(?P<id>[\w-]+)
+  | \.(?P<cls>[\w-]+)
+  | \[\s*(?P<attr>[\w-]+)\s*(?:(?P<op>[*^$]?=)\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<bare>[^\]\s]+))\s*)?\]
+  | :nth-of-type\(\s*(?P<nth>\d+)\s*\)
+""", re.VERBOSE)
+
+
+def parse_compound_chain(selector):
+    # Returns [(combinator, conditions)], leftmost compound first
+    chain = []
+    conditions = []
+    combinator = None
+    position = 0
+    selector = selector.strip()
+    while position < len(selector):
+        match = TOKEN_RE.match(selector, position)
+        if not match:
+            raise ValueError(f"Unsupported selector: {selector}")
+        position = match.end()
+        if match.group('ws') is not None:
+            chain.append((combinator, conditions))
+            conditions = []
+            combinator = '>' if '>' in match.group('ws') else ' '
+        elif match.group('tag'):
+            if match.group('tag') != '*':
+                conditions.append(('tag', match.group('tag').lower()))
+        elif match.group('id'):
+            conditions.append(('id', match.group('id')))
+        elif match.group('cls'):
+            conditions.append(('class', match.group('cls')))
+        elif match.group('attr'):
+            value = match.group('dq') if match.group('dq') is not None else (
+                match.group('sq') if match.group('sq') is not None else match.group('bare'))
+            conditions.append(('attr', (match.group('attr').lower(), match.group('op'), value)))
+        elif match.group('nth'):
+            conditions.append(('nth', int(match.group('nth'))))
+    chain.append((combinator, conditions))
+    return chain
+
+
+@lru_cache(maxsize=256)
+def parse_selector(selector):
+    # The field maps reuse a handful of selectors on every page, so each is compiled once
+    return tuple(parse_compound_chain(group) for group in split_groups(selector))
+
+
+def split_groups(selector):
+    groups = []
+    depth = 0
+    quote = None
+    current = ''
+    for char in selector:
+        if quote:
+            quote = None if char == quote else quote
+        elif char in '"\'':
+            quote = char
+        elif char in '[(':
+            depth += 1
+        elif char in '])':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            groups.append(current)
+            current = ''
+            continue
+        current += char
+    groups.append(current)
+    return [group.strip() for group in groups if group.strip()]
+
+
+def matches_compound(element, conditions):
+    for kind, value in conditions:
+        if kind == 'tag':
+            if element.tag != value:
+                return False
+        elif kind == 'id':
+            if element.attrs.get('id') != value:
+                return False
+        elif kind == 'class':
+            if value not in element.classes:
+                return False
+        elif kind == 'attr':
+            name, op, expected = value
+            if name not in element.attrs:
+                return False
+            actual = element.attrs[name]
+            if op == '=' and actual != expected:
+                return False
+            if op == '*=' and expected not in actual:
+                return False
+            if op == '^=' and not actual.startswith(expected):
+                return False
+            if op == '$=' and not actual.endswith(expected):
+                return False
+        elif kind == 'nth':
+            if element.parent is None:
+                return False
+            siblings = [child for child in element.parent.children
+                        if isinstance(child, Element) and child.tag == element.tag]
+            if siblings.index(element) + 1 != value:
+                return False
+    return True
+
+
+def matches_chain(element, chain, index=None):
+    if index is None:
+        index = len(chain) - 1
+    combinator, conditions = chain[index]
+    if not matches_compound(element, conditions):
+        return False
+    if index == 0:
+        return True
+    parent = element.parent
+    if combinator == '>':
+        return parent is not None and parent.tag != '#document' and matches_chain(parent, chain, index - 1)
+    while parent is not None and parent.tag != '#document':
+        if matches_chain(parent, chain, index - 1):
+            return True
+        parent = parent.parent
+    return False
+
+
+class DocumentIndex:
+    # Built in one walk on the first query against a document; every later query starts from the
+    # elements that carry the id, class or tag of the selector's last compound instead of the whole tree
+    def __init__(self, root):
+        self.elements = list(root.iter())
+        self.position = {}
+        self.by_tag = {}
+        self.by_id = {}
+        self.by_class = {}
+        for position, element in enumerate(self.elements):
+            self.position[element] = position
+            self.by_tag.setdefault(element.tag, []).append(element)
+            if 'id' in element.attrs:
+                self.by_id.setdefault(element.attrs['id'], []).append(element)
+            for name in set(element.classes):
+                self.by_class.setdefault(name, []).append(element)
+
+    def candidates(self, conditions):
+        for kind, lookup in (('id', self.by_id), ('class', self.by_class), ('tag', self.by_tag)):
+            for condition, value in conditions:
+                if condition == kind:
+                    return lookup.get(value, [])
+        return self.elements
+
+
+def document_index(root):
+    if root.index is None:
+        root.index = DocumentIndex(root)
+    return root.index
+
+
+def query_selector_all(root, selector):
+    groups = parse_selector(selector)
+    if root.tag != '#document':
+        # Queries scoped to an element walk its subtree
+        return [element for element in root.iter() if any(matches_chain(element, chain) for chain in groups)]
+    index = document_index(root)
+    found = {element for chain in groups for element in index.candidates(chain[-1][1])
+             if matches_chain(element, chain)}
+    return sorted(found, key=index.position.__getitem__)
+
+
+def query_selector(root, selector):
+    groups = parse_selector(selector)
+    if root.tag != '#document':
+        for element in root.iter():
+            if any(matches_chain(element, chain) for chain in groups):
+                return element
+        return None
+    index = document_index(root)
+    first = None
+    for chain in groups:
+        for element in index.candidates(chain[-1][1]):
+            if first is not None and index.position[element] >= index.position[first]:
+                break
+            if matches_chain(element, chain):
+                first = element
+                break
+    return first
+
+
+def extract_raw_fields_html(root, fields):
+    # Same payload shape as extraction.EXTRACT_FIELDS_JS, computed from static markup
+    texts = {}
+    errors = {}
+    for field, selector in fields.items():
+        try:
+            element = query_selector(root, selector)
+            texts[field] = element.inner_text() if element else None
+        except ValueError as e:
+            errors[field] = str(e)
+    return {"texts": texts, "errors": errors}
+
+
+def extract_cards_html(root, page_url, card_fields):
+    # Same payload shape as discovery.EXTRACT_CARDS_JS, computed from static markup
+    cards = []
+    for article in query_selector_all(root, 'article[data-item="result"]'):
+        link = query_selector(article, 'a[data-exp-id]')
+        address_element = query_selector(article, 'button.result-list-entry__map-link')
+        href = link.attrs.get('href') if link else None
+        card = {
+            "href": href,
+            "url": urljoin(page_url, href) if href else None,
+            "expose_id": link.attrs.get('data-exp-id') if link else None,
+            "address": address_element.inner_text().strip() if address_element else None,
+        }
+        for field, selector in card_fields.items():
+            element = query_selector(article, selector)
+            card[field] = element.inner_text().strip() if element else None
+        cards.append(card)
+    return cards
+
+
+def classify_html(url, root, ready_selector):
+    # Static counterpart of page_state.PAGE_STATE_JS; "shell" marks pages that need JavaScript to render
+    title_element = query_selector(root, 'title')
+    title = title_element.text_content().strip() if title_element else ''
+    headline = " ".join([title] + [element.text_content() for element in query_selector_all(root, 'h1, h2, h3')])
+    headline = headline.lower()
+
+    ready = query_selector(root, ready_selector) is not None
+    captcha = query_selector(root, CAPTCHA_SELECTOR) is not None or any(k in headline for k in CAPTCHA_KEYWORDS)
+    blocked = any(keyword in headline for keyword in BLOCKED_KEYWORDS)
+    error = any(keyword in headline for keyword in ERROR_KEYWORDS)
+    consent = query_selector(root, CONSENT_SELECTOR) is not None or any(
+        CONSENT_BUTTON_TEXT in button.text_content() for button in query_selector_all(root, 'button'))
+
+    if captcha:
+        verdict = "captcha"
+    elif blocked:
+        verdict = "blocked"
+    elif error:
+        verdict = "error"
+    elif consent and not ready:
+        # A consent wall; a banner over a page whose content is already there does not matter here
+        verdict = "consent"
+    elif not ready:
+        body = query_selector(root, 'body')
+        text_length = len(body.inner_text()) if body else 0
+        verdict = "shell" if text_length < SHELL_TEXT_LENGTH else "not_ready"
+    else:
+        verdict = "normal"
+    return PageState(verdict, url, title, ready, captcha, consent, blocked, error)
@@ -0,0 +1,28 @@
+# test_analytics.py
+
+import json
+
+from analytics import table_from_files, market_report
+
+
+def listing(expose_id, price, size=50.0):
+    return {"url": f"https://www.immobilienscout24.de/expose/{expose_id}", "price": price, "size": size,
+            "total_rent": price + 200, "address": "Königstraße 1, 70173 Stuttgart, Mitte",
+            "parking": False, "balcony": False}
+
+
+def test_repeated_listing_counts_once_with_latest_values(tmp_path):
+    older = tmp_path / "scraped_data.jsonl.1"
+    newer = tmp_path / "scraped_data.jsonl"
+    older.write_text(json.dumps(listing("1", 500.0)) + "\n", encoding='utf-8')
+    records = [listing("1", 600.0), listing("2", 1000.0), listing("1", 700.0)]
+    newer.write_text("".join(json.dumps(record) + "\n" for record in records), encoding='utf-8')
+
+    table = table_from_files([str(older), str(newer)], batch_size=2)
+    assert len(table) == 2
+    prices = dict(zip(table["expose_id"], table["price"]))
+    assert prices == {"1": 700.0, "2": 1000.0}
+
+    report = market_report(table, configs=[], min_listings=1)
+    assert report["listings"] == 2
+    assert report["overall"]["median_price_per_sqm"] == 17.0
@@ -0,0 +1,64 @@
+# test_columnar.py
+#
+# The columnar normalisation parses whole columns at once, so one missing value must not shift the
+# values of the listings after it.
+
+import math
+
+from columnar import RawColumns, parse_sizes, parse_stories
+from config import FIELDS_TO_FETCH
+from extraction import normalise_listing
+from mock_site import MockListingSite
+from static_html import parse_html, extract_raw_fields_html
+
+COMPARED_FIELDS = ["price", "size", "story", "total_stories", "additional_costs", "total_rent", "deposit"]
+# Fields cleared per listing, cycling through the listings
+MISSING = [(), ("size", "deposit"), ("stories",), ("price",), ("additional_costs", "total_rent")]
+
+
+def missing_texts(number, texts):
+    texts = dict(texts)
+    for field in MISSING[number % len(MISSING)]:
+        texts[field] = None if number % 2 else ""
+    return texts
+
+
+def as_number(value):
+    return None if value in (None, "Error") else float(value)
+
+
+def test_parsers_keep_one_value_per_row():
+    sizes, units = parse_sizes(['65,5 m²', None, '', '80m²', 'N/A'])
+    assert len(sizes) == len(units) == 5
+    assert sizes[3] == 80.0 and units[3] == 'm²'
+    story, total = parse_stories(['3 von 5', None, '', 'EG', '2', 'von 4', ' ', '1 von 2'])
+    assert len(story) == len(total) == 8
+    assert (story[7], total[7]) == (1.0, 2.0)
+
+
+def test_missing_fields_stay_on_their_listing():
+    site = MockListingSite(listings=20)
+    raw = RawColumns()
+    expected = []
+    for number, listing in enumerate(site.listings):
+        url = f"http://127.0.0.1/expose/{listing.expose_id}"
+        texts = extract_raw_fields_html(parse_html(site.expose_page(listing)), FIELDS_TO_FETCH)["texts"]
+        texts = missing_texts(number, texts)
+        raw.append(url, texts, listing.parking, listing.balcony)
+        expected.append(normalise_listing(url, {"texts": texts}))
+
+    table = raw.normalise()
+    rows = list(table.rows())
+    assert len(rows) == len(site.listings)
+    for row, record in zip(rows, expected):
+        if record is None:
+            # Skipped by normalise_listing for its missing floors; the table keeps it without them
+            assert math.isnan(row["story"])
+            continue
+        assert row["url"] == record["url"]
+        for field in COMPARED_FIELDS:
+            value = as_number(record[field])
+            if value is None:
+                assert math.isnan(row[field]), (row["url"], field)
+            else:
+                assert row[field] == value, (row["url"], field)
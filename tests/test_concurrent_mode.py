@@ -0,0 +1,74 @@
+# test_concurrent_mode.py
+#
+# The concurrent stages run while main.py holds a sync Playwright connection. The sync driver keeps an
+# event loop running on the main thread, so the async stages have to run on a loop of their own.
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from playwright.sync_api import sync_playwright
+
+import network_routes
+from async_scraper import run_async, run_concurrent_scrape
+from benchmark import free_port
+from crawl_store import CrawlStore
+from mock_site import MockListingSite
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+async def answer():
+    await asyncio.sleep(0)
+    return 42
+
+
+async def fail():
+    raise ValueError("stage failed")
+
+
+def test_run_async_next_to_the_sync_driver():
+    playwright = sync_playwright().start()
+    try:
+        assert run_async(answer()) == 42
+        with pytest.raises(ValueError, match="stage failed"):
+            run_async(fail())
+    finally:
+        playwright.stop()
+
+
+def test_concurrent_scrape_while_connected(tmp_path, monkeypatch):
+    # The exposés have to go through the browser sessions, not the HTTP fast path
+    monkeypatch.setattr(network_routes, "FAST_PATH_ENABLED", False)
+    monkeypatch.chdir(tmp_path)
+    site = MockListingSite(listings=6, latency_ms=5, jitter_ms=1).start()
+    links = [(f"{site.base_url}/expose/{listing.expose_id}", {"parking": listing.parking, "balcony": listing.balcony})
+             for listing in site.listings]
+    store = CrawlStore(str(tmp_path / "crawl_state.db"))
+    store.record_discovered(links)
+    sink = ListSink()
+    try:
+        with sync_playwright() as playwright:
+            port = free_port()
+            try:
+                browser = playwright.chromium.launch(args=[f"--remote-debugging-port={port}", "--no-sandbox"])
+            except Exception as e:
+                pytest.skip(f"No Chromium to run the concurrent stage with: {e}")
+            run_async(run_concurrent_scrape(f"http://127.0.0.1:{port}", links, concurrency=2, store=store,
+                                            sink=sink))
+            browser.close()
+    finally:
+        store.close()
+        site.stop()
+
+    assert [record["url"] for record in sink.records] == [link for link, _ in links]
+    assert all(record["parking"] == info["parking"] for record, (_, info) in zip(sink.records, links))
+
@@ -0,0 +1,101 @@
+# test_crawl_store.py
+
+import json
+
+import pytest
+
+import crawl_store
+from crawl_store import CrawlStore
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(crawl_store, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CrawlStore(str(tmp_path / "crawl_state.db"))
+    yield store
+    store.close()
+
+
+def link(expose_id):
+    return f"https://www.immobilienscout24.de/expose/{expose_id}"
+
+
+def row(store, expose_id):
+    return store.watched_listings([str(expose_id)])[str(expose_id)]
+
+
+def test_freshness_split(store, clock):
+    links = [(link(n), {"parking": True, "balcony": False}) for n in (1, 2, 3, 4)]
+    store.record_discovered(links)
+    store.mark_scraped(link(1), {"url": link(1), "price": 700.0, "parking": False, "balcony": False})
+    store.mark_skipped(link(2))
+    store.mark_failed(link(3), "timeout")
+
+    clock.advance(1800)
+    to_scrape, fresh = store.split_by_freshness(links, freshness_hours=1)
+    # Skipped exposés count as done but have no record to reuse; failed and pending ones are fetched
+    assert to_scrape == [links[2], links[3]]
+    assert list(fresh) == [link(1)]
+    # Equipment flags come from the latest discovery, not from the stored record
+    assert fresh[link(1)]["parking"] is True and fresh[link(1)]["price"] == 700.0
+
+    clock.advance(3600)
+    to_scrape, fresh = store.split_by_freshness(links, freshness_hours=1)
+    assert to_scrape == links and fresh == {}
+
+
+def test_pending_links_skip_listings_gone_from_the_results(store, clock):
+    store.record_discovered([(link(1), {"parking": False, "balcony": True})])
+    clock.advance(7200)
+    store.record_discovered([(link(2), {"parking": False, "balcony": False})])
+    store.mark_failed(link(2), "timeout")
+    assert store.pending_links(freshness_hours=1) == [(link(2), {"parking": False, "balcony": False})]
+    assert [url for url, _ in store.pending_links(freshness_hours=3)] == [link(1), link(2)]
+
+
+def test_monitor_status_transitions(store, clock):
+    record = {"url": link(1), "price": 700.0}
+    store.record_discovered([(link(1), {"parking": False, "balcony": False})])
+    store.mark_checked(link(1), record, etag='"a"')
+    checked = row(store, 1)
+    assert (checked["status"], checked["etag"], checked["last_checked_at"]) == ("scraped", '"a"', clock.now)
+    assert checked["last_extracted_at"] == clock.now
+
+    # An unchanged probe keeps the record and only moves the timestamps
+    clock.advance(60)
+    store.record_check(link(1), etag='"b"', last_modified="Tue, 01 Sep 2026 10:00:00 GMT")
+    unchanged = row(store, 1)
+    assert json.loads(unchanged["data"]) == record and unchanged["content_hash"] == checked["content_hash"]
+    assert (unchanged["etag"], unchanged["last_modified"]) == ('"b"', "Tue, 01 Sep 2026 10:00:00 GMT")
+    assert unchanged["last_checked_at"] == unchanged["last_scraped_at"] == clock.now
+    assert unchanged["last_extracted_at"] == checked["last_extracted_at"]
+
+    # Delisting drops the validators so the next probe fetches the page in full
+    clock.advance(60)
+    store.mark_delisted(link(1))
+    delisted = row(store, 1)
+    assert (delisted["status"], delisted["etag"], delisted["last_modified"]) == ("delisted", None, None)
+    assert delisted["data"] == unchanged["data"]
+
+    clock.advance(60)
+    store.mark_checked(link(1), dict(record, price=650.0))
+    relisted = row(store, 1)
+    assert relisted["status"] == "scraped" and json.loads(relisted["data"])["price"] == 650.0
+    assert relisted["content_hash"] != checked["content_hash"] and relisted["last_extracted_at"] == clock.now
@@ -0,0 +1,76 @@
+# test_monitor.py
+
+import monitor
+from crawl_store import CrawlStore
+from http_fetcher import HttpClient
+from mock_site import MockListingSite
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+def test_relisted_expose_can_be_delisted_again(tmp_path, monkeypatch):
+    site = MockListingSite(listings=2, latency_ms=1, jitter_ms=0).start()
+    monkeypatch.setattr(monitor, "BASE_URL", site.base_url)
+    store = CrawlStore(str(tmp_path / "crawl_state.db"))
+    events = ListSink()
+    client = HttpClient(None)
+    watcher = monitor.Monitor(store, events, client, concurrency=2)
+    expose_ids = [listing.expose_id for listing in site.listings]
+    listing = site.by_id[expose_ids[0]]
+    try:
+        watcher.run_pass(expose_ids)
+        site.delist(listing.expose_id)
+        watcher.run_pass(expose_ids)
+        # Back online with the same content
+        site.by_id[listing.expose_id] = listing
+        site.listings.append(listing)
+        assert watcher.run_pass(expose_ids)["relisted"] == 1
+        assert store.watched_listings([listing.expose_id])[listing.expose_id]["status"] == "scraped"
+        site.delist(listing.expose_id)
+        assert watcher.run_pass(expose_ids)["delisted"] == 1
+    finally:
+        client.close()
+        store.close()
+        site.stop()
+
+    assert [event["event"] for event in events.records if event["expose_id"] == listing.expose_id] == [
+        "new", "delisted", "relisted", "delisted"]
+
+
+def test_card_probe_without_validators(tmp_path, monkeypatch):
+    site = MockListingSite(listings=6, per_page=4, latency_ms=1, jitter_ms=0, validators=False).start()
+    monkeypatch.setattr(monitor, "BASE_URL", site.base_url)
+    store = CrawlStore(str(tmp_path / "crawl_state.db"))
+    events = ListSink()
+    client = HttpClient(None)
+    watcher = monitor.Monitor(store, events, client, concurrency=2, search_urls=[site.search_url()], card_pages=3)
+    expose_ids = [listing.expose_id for listing in site.listings]
+    listing = site.listings[0]
+    try:
+        assert watcher.run_pass(expose_ids)["new"] == 6
+        # Two result pages answer for all six exposés
+        requests = site.requests
+        assert watcher.run_pass(expose_ids)["card_unchanged"] == 6
+        assert site.requests - requests == 2
+        # Only the exposé whose card changed is downloaded again
+        site.reprice(listing.expose_id, listing.price - 50)
+        requests = site.requests
+        counts = watcher.run_pass(expose_ids)
+        assert (counts["card_unchanged"], counts["changed"]) == (5, 1)
+        assert site.requests - requests == 3
+        # Once the records are older than MONITOR_FULL_CHECK_HOURS every exposé is extracted again
+        monkeypatch.setattr(monitor, "MONITOR_FULL_CHECK_HOURS", -1)
+        assert watcher.run_pass(expose_ids)["unchanged"] == 6
+    finally:
+        client.close()
+        store.close()
+        site.stop()
+
+    assert [event["event"] for event in events.records if event["expose_id"] == listing.expose_id] == [
+        "new", "price_drop", "rent_change"]
@@ -0,0 +1,30 @@
+# test_output_sinks.py
+
+import json
+
+from output_sinks import MultiSink, JsonlSink, JsonArraySink, coerce
+
+
+def test_reused_records_are_not_appended_again(tmp_path):
+    jsonl_path = str(tmp_path / "scraped_data.jsonl")
+    json_path = str(tmp_path / "scraped_data.json")
+    for run in range(3):
+        sink = MultiSink([JsonlSink(jsonl_path, rotate_bytes=None), JsonArraySink(json_path)])
+        if run:
+            sink.write_reused({"url": "reused"})
+        else:
+            sink.write({"url": "reused"})
+        sink.write({"url": f"new {run}"})
+        sink.close()
+
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        assert [json.loads(line)["url"] for line in f] == ["reused", "new 0", "new 1", "new 2"]
+    with open(json_path, 'r', encoding='utf-8') as f:
+        assert [record["url"] for record in json.load(f)] == ["reused", "new 2"]
+
+
+def test_error_markers_become_empty_cells():
+    assert coerce("Error", bool) is None
+    assert coerce("Error", float) is None
+    assert coerce(True, bool) is True
+    assert coerce(3, float) == 3.0
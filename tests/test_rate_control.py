@@ -0,0 +1,118 @@
+# test_rate_control.py
+
+import pytest
+
+import rate_control
+from rate_control import AdaptiveRateController, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_control, "time", clock)
+    return clock
+
+
+def controller():
+    return AdaptiveRateController(rate=2.0, concurrency=4, adaptive=True, min_rate=0.5, max_rate=3.0,
+                                  increase=0.5, decrease=0.5, slow_ms=1000)
+
+
+def test_additive_increase_up_to_the_maximum():
+    control = controller()
+    control.concurrency = 1.0
+    control.record(200, "ok")
+    assert control.rate == 2.5 and control.concurrency == 2.0
+    control.record(200, "ok")
+    assert control.rate == 3.0 and control.concurrency == 2.5
+    for _ in range(10):
+        control.record(200, "ok")
+    assert control.rate == 3.0 and control.concurrency_limit == 4
+    assert control.decreases == 0
+
+
+def test_multiplicative_decrease_down_to_the_minimum():
+    control = controller()
+    # A slow page counts like an error
+    control.record(1500, "ok")
+    assert control.rate == 1.0 and control.concurrency == 2.0
+    control.record(200, "captcha")
+    assert control.rate == 0.5 and control.concurrency == 1.0
+    control.record(200, "error")
+    assert control.rate == 0.5 and control.concurrency_limit == 1
+    assert control.decreases == 3
+
+
+def test_fixed_rate_when_not_adaptive(clock):
+    control = AdaptiveRateController(rate=2.0, concurrency=4, adaptive=False)
+    control.record(200, "error")
+    assert control.rate == 2.0 and control.decreases == 0
+    started = clock.now
+    for _ in range(3):
+        control.pace()
+    # The first request starts at once, the next ones one interval apart
+    assert clock.now - started == 1.0
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker(window=4, min_samples=4, block_rate=0.5, open_seconds=60)
+    for outcome in ("ok", "ok", "captcha"):
+        breaker.record("session", outcome)
+    assert breaker.remaining("session") == 0.0 and breaker.trips == 0
+
+    breaker.record("session", "blocked")
+    assert breaker.trips == 1 and breaker.remaining("session") == 60
+    # Other keys are not affected
+    assert breaker.remaining("other") == 0.0
+
+    clock.sleep(30)
+    assert breaker.remaining("session") == 30
+    breaker.wait("session")
+    assert clock.now == 1_000_060.0 and breaker.remaining("session") == 0.0
+
+    # Half open: one clean trial page closes it, and the window starts empty
+    breaker.record("session", "ok")
+    for outcome in ("captcha", "ok", "ok"):
+        breaker.record("session", outcome)
+    assert breaker.trips == 1 and breaker.remaining("session") == 0.0
+
+
+def test_failed_trial_reopens_for_twice_as_long(clock):
+    breaker = CircuitBreaker(window=4, min_samples=2, block_rate=1.0, open_seconds=60)
+    breaker.record("session", "captcha")
+    breaker.record("session", "captcha")
+    assert breaker.remaining("session") == 60
+
+    clock.sleep(60)
+    assert breaker.remaining("session") == 0.0
+    breaker.record("session", "captcha")
+    assert breaker.trips == 2 and breaker.remaining("session") == 120
+
+    clock.sleep(120)
+    assert breaker.remaining("session") == 0.0
+    breaker.record("session", "captcha")
+    assert breaker.remaining("session") == 240
+
+    # After a clean trial the next trip is back at the base duration, once the window is all blocks again
+    clock.sleep(240)
+    breaker.remaining("session")
+    breaker.record("session", "ok")
+    for _ in range(3):
+        breaker.record("session", "captcha")
+    assert breaker.remaining("session") == 0.0
+    breaker.record("session", "captcha")
+    assert breaker.trips == 4 and breaker.remaining("session") == 60
@@ -0,0 +1,79 @@
+# test_static_html.py
+
+import time
+
+import pytest
+
+from config import EXPOSE_READY_SELECTOR, SEARCH_READY_SELECTOR, FIELDS_TO_FETCH, CARD_FIELDS_TO_FETCH
+from extraction import EXTRACT_FIELDS_JS
+from mock_site import MockListingSite
+from page_state import PAGE_STATE_JS, CONSENT_SELECTOR, probe_arguments
+from static_html import (parse_html, parse_selector, matches_chain, query_selector, query_selector_all,
+                         classify_html, extract_raw_fields_html, CAPTCHA_SELECTOR)
+
+
+def texts(html, selector):
+    return [element.inner_text() for element in query_selector_all(parse_html(html), selector)]
+
+
+def test_implied_end_tags():
+    assert texts("<ul><li>one<li>two</ul>", "ul > li") == ["one", "two"]
+    assert texts("<ul><li>one<li>two</ul>", "li:nth-of-type(2)") == ["two"]
+    assert texts("<ul><li>a<ul><li>b<li>c</ul><li>d</ul>", "ul > li") == ["a\nb\nc", "b", "c", "d"]
+    assert texts("<p>a<p>b<div>c</div>", "p") == ["a", "b"]
+    assert texts("<dl><dt>a<dd>b<dt>c</dl>", "dl > dt") == ["a", "c"]
+    assert texts("<select><option>a<option>b</select>", "select > option") == ["a", "b"]
+    assert texts("<table><tr><td>1<td>2<tr><td>3</table>", "tr > td") == ["1", "2", "3"]
+    assert texts("<table><tr><td>1<td>2<tr><td>3</table>", "table > tr") == ["12", "3"]
+
+
+def test_consent_wall_falls_back():
+    site = MockListingSite(listings=1)
+    assert classify_html("u", parse_html(site.consent_page()), EXPOSE_READY_SELECTOR).verdict == "consent"
+    assert classify_html("u", parse_html(site.expose_page(site.listings[0])), EXPOSE_READY_SELECTOR).verdict == "normal"
+
+
+def test_indexed_queries_match_a_tree_walk():
+    site = MockListingSite(listings=25)
+    selectors = list(FIELDS_TO_FETCH.values()) + list(CARD_FIELDS_TO_FETCH.values()) + [
+        SEARCH_READY_SELECTOR, CAPTCHA_SELECTOR, CONSENT_SELECTOR, 'h1, h2, h3', 'title', 'body', 'button']
+    for html in (site.expose_page(site.listings[0]), site.search_page(1, []), site.consent_page()):
+        root = parse_html(html)
+        for selector in selectors:
+            walked = [element for element in root.iter()
+                      if any(matches_chain(element, chain) for chain in parse_selector(selector))]
+            assert query_selector_all(root, selector) == walked
+            assert query_selector(root, selector) is (walked[0] if walked else None)
+
+
+def test_static_path_is_faster_than_the_browser():
+    # Parse, classify and extract per exposé, against loading the same markup into Chromium and
+    # running the page-state and field scripts there
+    sync_api = pytest.importorskip("playwright.sync_api")
+    site = MockListingSite(listings=20)
+    pages = [site.expose_page(listing) for listing in site.listings]
+
+    started = time.perf_counter()
+    for html in pages:
+        root = parse_html(html)
+        assert classify_html("u", root, EXPOSE_READY_SELECTOR).verdict == "normal"
+        extract_raw_fields_html(root, FIELDS_TO_FETCH)
+    static_seconds = time.perf_counter() - started
+
+    with sync_api.sync_playwright() as playwright:
+        try:
+            browser = playwright.chromium.launch(args=["--no-sandbox"])
+        except Exception as e:
+            pytest.skip(f"No Chromium to compare against: {e}")
+        page = browser.new_page()
+        started = time.perf_counter()
+        for html in pages:
+            page.set_content(html)
+            page.evaluate(PAGE_STATE_JS, probe_arguments(EXPOSE_READY_SELECTOR))
+            page.evaluate(EXTRACT_FIELDS_JS, FIELDS_TO_FETCH)
+        browser_seconds = time.perf_counter() - started
+        browser.close()
+
+    print(f"static: {1000 * static_seconds / len(pages):.2f} ms/page, "
+          f"browser: {1000 * browser_seconds / len(pages):.2f} ms/page")
+    assert static_seconds < browser_seconds
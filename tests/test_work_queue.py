@@ -0,0 +1,132 @@
+# test_work_queue.py
+
+import threading
+
+import pytest
+
+import work_queue
+from work_queue import WorkQueue
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(work_queue, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "work_queue.db")
+
+
+def jobs(count):
+    return [(f"https://www.immobilienscout24.de/expose/{n}", {"parking": False, "balcony": n % 2 == 0})
+            for n in range(count)]
+
+
+def status(queue, url):
+    return queue.conn.execute("SELECT status, worker, attempts FROM jobs WHERE url = ?", (url,)).fetchone()
+
+
+def test_expired_lease_goes_to_another_worker(path, clock):
+    queue = WorkQueue(path, lease_seconds=60, max_attempts=3)
+    queue.enqueue(jobs(3))
+    leased = queue.lease("a", 2)
+    assert leased == jobs(3)[:2]
+    assert queue.counts() == {"queued": 1, "leased": 2, "done": 0, "failed": 0}
+
+    # A heartbeat keeps the lease alive past its first expiry
+    clock.advance(50)
+    queue.extend("a")
+    clock.advance(50)
+    assert queue.lease("b", 5) == jobs(3)[2:]
+
+    # Worker a stopped extending; once its leases run out b gets its jobs with a second attempt
+    clock.advance(11)
+    assert queue.lease("b", 5) == jobs(3)[:2]
+    url = jobs(3)[0][0]
+    assert tuple(status(queue, url)) == ("leased", "b", 2)
+
+    # a comes back too late: its acknowledgement is ignored, b's counts
+    queue.ack(url, "a")
+    assert status(queue, url)["status"] == "leased"
+    queue.ack(url, "b")
+    assert status(queue, url)["status"] == "done"
+    queue.close()
+
+
+def test_attempts_run_out(path, clock):
+    queue = WorkQueue(path, lease_seconds=60, max_attempts=2)
+    queue.enqueue(jobs(2))
+    first, second = [url for url, _ in jobs(2)]
+    queue.lease("a", 2)
+    queue.nack(first, "a", "timeout")
+    clock.advance(61)
+    # first was handed back, second expired; both go out for their second and last attempt
+    assert [url for url, _ in queue.lease("b", 2)] == [first, second]
+    queue.nack(first, "b", "timeout")
+    clock.advance(61)
+    assert queue.requeue_expired() == 1
+    assert queue.counts() == {"queued": 0, "leased": 0, "done": 0, "failed": 2}
+    assert queue.lease("c", 2) == []
+
+    # Enqueueing again gives failed jobs a fresh set of attempts
+    queue.enqueue(jobs(2))
+    assert len(queue.lease("c", 2)) == 2 and status(queue, first)["attempts"] == 1
+    queue.close()
+
+
+def test_release_does_not_count_an_attempt(path, clock):
+    queue = WorkQueue(path, lease_seconds=60, max_attempts=1)
+    queue.enqueue(jobs(1))
+    queue.lease("a", 1)
+    queue.release("a")
+    assert tuple(status(queue, jobs(1)[0][0])) == ("queued", None, 0)
+    # A leased job is not reset by enqueueing it again
+    queue.lease("b", 1)
+    queue.enqueue(jobs(1))
+    assert status(queue, jobs(1)[0][0])["worker"] == "b"
+    queue.close()
+
+
+def test_concurrent_workers_never_share_a_job(path):
+    # Each worker has its own connection, as the worker processes do; BEGIN IMMEDIATE serialises the leases
+    coordinator = WorkQueue(path)
+    coordinator.enqueue(jobs(200))
+    leased = {}
+
+    def work(worker):
+        queue = WorkQueue(path, lease_seconds=600)
+        taken = []
+        while True:
+            batch = queue.lease(worker, 3)
+            if not batch:
+                break
+            for url, _ in batch:
+                taken.append(url)
+                queue.ack(url, worker)
+        leased[worker] = taken
+        queue.close()
+
+    threads = [threading.Thread(target=work, args=(f"worker-{n}",)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    taken = [url for urls in leased.values() for url in urls]
+    assert sorted(taken) == sorted(url for url, _ in jobs(200))
+    assert coordinator.counts()["done"] == 200
+    coordinator.close()
@@ -0,0 +1,160 @@
+# work_queue.py
+
+import json
+import sqlite3
+import time
+
+from config import WORK_QUEUE_PATH, LEASE_SECONDS, MAX_JOB_ATTEMPTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    url TEXT PRIMARY KEY,
+    info TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, enqueued_at);
+"""
+
+# queued: waiting for a worker; leased: a worker holds it until lease_expires; done: acknowledged;
+# failed: gave up after MAX_JOB_ATTEMPTS leases that ended in an error or expired
+
+
+class WorkQueue:
+    # Durable exposé queue shared by the coordinator and the worker processes. A job is leased to one
+    # worker at a time; a lease that is neither acknowledged nor extended in time goes back to the
+    # queue, so the URLs of a crashed worker are picked up by the others.
+    def __init__(self, path=WORK_QUEUE_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_JOB_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Several processes write to the file; WAL lets readers go on while one of them writes
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never lease the same job
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def enqueue(self, links_with_info):
+        # New URLs are queued; URLs that are already known are queued again unless a worker holds them
+        now = time.time()
+        conn = self._transaction()
+        try:
+            conn.executemany(
+                """
+                INSERT INTO jobs (url, info, enqueued_at, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    info = excluded.info,
+                    status = 'queued',
+                    worker = NULL,
+                    lease_expires = NULL,
+                    attempts = 0,
+                    error = NULL,
+                    updated_at = excluded.updated_at
+                WHERE jobs.status != 'leased'
+                """,
+                [(link, json.dumps(info), now, now) for link, info in links_with_info],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _expire_leases(self, conn, now):
+        expired = conn.execute(
+            "SELECT url, worker, attempts FROM jobs WHERE status = 'leased' AND lease_expires < ?", (now,),
+        ).fetchall()
+        for row in expired:
+            status = 'failed' if row['attempts'] >= self.max_attempts else 'queued'
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, lease_expires = NULL, updated_at = ?, "
+                "error = ? WHERE url = ?",
+                (status, now, f"lease of {row['worker']} expired", row['url']),
+            )
+        if expired:
+            print(f"Requeued {len(expired)} jobs whose lease expired.")
+        return len(expired)
+
+    def requeue_expired(self):
+        conn = self._transaction()
+        try:
+            count = self._expire_leases(conn, time.time())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    def lease(self, worker, count):
+        # Returns up to count (url, info) pairs, now leased to worker
+        now = time.time()
+        conn = self._transaction()
+        try:
+            self._expire_leases(conn, now)
+            rows = conn.execute(
+                "SELECT url, info FROM jobs WHERE status = 'queued' ORDER BY enqueued_at, url LIMIT ?", (count,),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE url = ?",
+                [(worker, now + self.lease_seconds, now, row['url']) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(row['url'], json.loads(row['info'])) for row in rows]
+
+    def extend(self, worker):
+        # Heartbeat: pushes out every lease the worker still holds
+        now = time.time()
+        self.conn.execute(
+            "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE status = 'leased' AND worker = ?",
+            (now + self.lease_seconds, now, worker),
+        )
+
+    def ack(self, url, worker):
+        self.conn.execute(
+            "UPDATE jobs SET status = 'done', lease_expires = NULL, error = NULL, updated_at = ? "
+            "WHERE url = ? AND worker = ? AND status = 'leased'",
+            (time.time(), url, worker),
+        )
+
+    def nack(self, url, worker, error):
+        # A failed job goes back to the queue until it has used up its attempts
+        self.conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "worker = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+            "WHERE url = ? AND worker = ? AND status = 'leased'",
+            (self.max_attempts, str(error), time.time(), url, worker),
+        )
+
+    def release(self, worker):
+        # Hands back every job the worker still holds without counting an attempt, e.g. on shutdown
+        self.conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, lease_expires = NULL, attempts = attempts - 1, "
+            "updated_at = ? WHERE status = 'leased' AND worker = ?",
+            (time.time(), worker),
+        )
+
+    def counts(self):
+        rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {"queued": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update({row['status']: row['n'] for row in rows})
+        return counts
+
+    def unfinished(self):
+        counts = self.counts()
+        return counts['queued'] + counts['leased']
@@ -0,0 +1,95 @@
+# worker.py
+
+import argparse
+import os
+import threading
+import time
+
+from config import CRAWL_DB_PATH, LEASE_SECONDS, LEASE_BATCH
+from crawl_store import CrawlStore
+from main import connect_to_browser, scrape_data_stage
+from metrics import run_metrics
+from memory_watchdog import browser_governor
+from http_fetcher import fast_path
+from page_archive import page_archive
+from work_queue import WorkQueue
+
+# How long a worker without jobs waits before asking again while other workers still hold leases (seconds)
+IDLE_SECONDS = 5
+
+
+class LeasedStore:
+    # Passed to scrape_data_stage in place of the crawl store: every outcome is stored as usual and
+    # settles the lease, so a finished exposé is never handed to another worker
+    def __init__(self, store, queue, worker):
+        self.store = store
+        self.queue = queue
+        self.worker = worker
+
+    def mark_scraped(self, link, data):
+        self.store.mark_scraped(link, data)
+        self.queue.ack(link, self.worker)
+
+    def mark_skipped(self, link):
+        self.store.mark_skipped(link)
+        self.queue.ack(link, self.worker)
+
+    def mark_failed(self, link, error):
+        self.store.mark_failed(link, error)
+        self.queue.nack(link, self.worker, error)
+
+
+def keep_leases(worker, stop):
+    # SQLite connections stay in the thread that opened them, so the heartbeat has its own
+    queue = WorkQueue()
+    try:
+        while not stop.wait(LEASE_SECONDS / 3):
+            queue.extend(worker)
+    finally:
+        queue.close()
+
+
+def run_worker(endpoint, name):
+    worker = f"{name} ({os.getpid()})"
+    queue = WorkQueue()
+    store = CrawlStore(CRAWL_DB_PATH)
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=keep_leases, args=(worker, stop), daemon=True)
+    heartbeat.start()
+    # The context comes from the memory watchdog, which may replace it (or the browser) between batches
+    playwright, _, _ = connect_to_browser(endpoint)
+    leased_store = LeasedStore(store, queue, worker)
+    try:
+        while True:
+            batch = queue.lease(worker, LEASE_BATCH)
+            if not batch:
+                if not queue.unfinished():
+                    break
+                # Other workers still hold leases; theirs come back here if they stop answering
+                time.sleep(IDLE_SECONDS)
+                continue
+            print(f"[{worker}] Leased {len(batch)} exposés.")
+            # Records reach the output sinks through the crawl store once the coordinator is done
+            scrape_data_stage(browser_governor.context, batch, store=leased_store)
+    finally:
+        stop.set()
+        queue.release(worker)
+        print(f"[{worker}] Finished.")
+        run_metrics.print_summary()
+        print(f"[{worker}] Browser memory: {browser_governor.summary()}")
+        queue.close()
+        store.close()
+        fast_path.close()
+        page_archive.close()
+        browser_governor.context.close()
+        # For a browser attached over CDP, close() only drops the connection; the browser keeps running
+        browser_governor.browser.close()
+        playwright.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape exposés leased from the work queue in one browser.")
+    parser.add_argument('--endpoint', required=True, help="CDP endpoint of the browser, e.g. http://localhost:9223")
+    parser.add_argument('--name', default=None, help="Name used in the logs and the lease records")
+    args = parser.parse_args()
+    run_worker(args.endpoint, args.name or args.endpoint)